@@ -1,95 +1,79 @@
-import json
-import pandas as pd
+import argparse
 import os
+import sys
 from datetime import datetime
 
-def load_headers():
-    """Load documented headers from data_headers.json."""
-    try:
-        with open('data_headers.json', 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print("Error: data_headers.json not found. Please ensure the file exists.")
-        return {}
-    except json.JSONDecodeError:
-        print("Error: data_headers.json is not a valid JSON file.")
-        return {}
+# Share the streaming profiler with the backend's /api/data-quality endpoint
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rfm_backend'))
 
-def analyze_csv(file_path, expected_headers, key_metrics=None):
-    """Analyze a CSV file, verify headers, and provide summary statistics."""
-    print(f"\nAnalyzing {file_path}...")
-    
-    if not os.path.exists(file_path):
-        print(f"Error: File {file_path} not found.")
-        return
-    
-    try:
-        df = pd.read_csv(file_path)
-        actual_headers = list(df.columns)
-        
-        # Verify headers
-        if actual_headers == expected_headers:
-            print("Headers match the documented structure.")
-        else:
-            print("Warning: Headers do not match the documented structure.")
-            print(f"Expected: {expected_headers}")
-            print(f"Actual: {actual_headers}")
-        
-        # Basic statistics
-        print("\nBasic Information:")
-        print(f"Number of rows: {len(df)}")
-        print(f"Number of columns: {len(df.columns)}")
-        print("\nMissing Values:")
-        print(df.isnull().sum().to_string())
-        
-        # Data types
-        print("\nData Types:")
-        print(df.dtypes.to_string())
-        
-        # Summary statistics for numeric columns
-        numeric_cols = df.select_dtypes(include=['float64', 'int64']).columns
-        if not numeric_cols.empty:
-            print("\nSummary Statistics for Numeric Columns:")
-            print(df[numeric_cols].describe().to_string())
-        
-        # Focus on key metrics if provided
-        if key_metrics:
-            print("\nKey Metrics Analysis:")
-            for metric, description in key_metrics.items():
-                if metric in df.columns:
-                    if df[metric].dtype in ['float64', 'int64']:
-                        total = df[metric].sum()
-                        avg = df[metric].mean()
-                        print(f"{metric} ({description}):")
-                        print(f"  Total: {total:.2f}")
-                        print(f"  Average: {avg:.2f}")
-                    else:
-                        unique_vals = df[metric].nunique()
-                        top_vals = df[metric].value_counts().head(5)
-                        print(f"{metric} ({description}):")
-                        print(f"  Unique Values: {unique_vals}")
-                        print(f"  Top 5 Most Frequent Values:\n{top_vals.to_string()}")
-                else:
-                    print(f"Warning: Key metric '{metric}' not found in data.")
-    except Exception as e:
-        print(f"Error analyzing {file_path}: {str(e)}")
+from app.services.data_profiler import (  # noqa: E402
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_TOP_K,
+    build_quality_report,
+    write_report,
+)
+
+def print_file_report(file_name, profile):
+    """Print the profile of one CSV file in a readable form."""
+    print(f"\nAnalyzing {file_name}...")
+
+    if profile['headers_match'] is None:
+        print("Warning: No documented headers found for this file.")
+    elif profile['headers_match']:
+        print("Headers match the documented structure.")
+    else:
+        print("Warning: Headers do not match the documented structure.")
+        print(f"Missing: {profile['missing_columns']}")
+        print(f"Unexpected: {profile['unexpected_columns']}")
+
+    # Basic statistics
+    print("\nBasic Information:")
+    print(f"Number of rows: {profile['rows']}")
+    print(f"Number of columns: {profile['columns']}")
+
+    print("\nMissing Values / Non-conforming Values:")
+    for column, stats in profile['column_profiles'].items():
+        print(f"{column} ({stats['declared_dtype']}): {stats['nulls']} missing, {stats['non_conforming']} non-conforming")
+
+    print("\nSummary Statistics for Numeric Columns:")
+    for column, stats in profile['column_profiles'].items():
+        if 'summary' in stats:
+            summary = stats['summary']
+            print(f"{column}: count={summary['count']} mean={summary['mean']} std={summary['std']} "
+                  f"min={summary['min']} max={summary['max']}")
+
+    print("\nTop Values:")
+    for column, stats in profile['column_profiles'].items():
+        if stats.get('top_values'):
+            values = ", ".join(f"{item['value']} ({item['count']})" for item in stats['top_values'])
+            print(f"{column}: {values}")
+
+    print("\nData Quality Issues:")
+    for issue, count in profile['issues'].items():
+        print(f"{issue}: {count}")
 
 def main():
-    """Main function to analyze data files using documented headers."""
-    headers_data = load_headers()
-    if not headers_data:
-        return
-    
-    # Analyze customer_data.csv
-    customer_file = 'data/customer_data.csv'
-    if 'customer_data.csv' in headers_data:
-        analyze_csv(customer_file, headers_data['customer_data.csv']['headers'])
-    
-    # Analyze sales_data.csv with focus on key metrics
-    sales_file = 'data/sales_data.csv'
-    if 'sales_data.csv' in headers_data:
-        sales_info = headers_data['sales_data.csv']
-        analyze_csv(sales_file, sales_info['headers'], sales_info.get('key_metrics', {}))
+    """Main function to profile data files against the documented headers."""
+    parser = argparse.ArgumentParser(description="Profile the RFM source data files.")
+    parser.add_argument('--customer-file', default='data/customer_data.csv')
+    parser.add_argument('--sales-file', default='data/sales_data.csv')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K)
+    parser.add_argument('--output', help="Write the full report to this JSON file")
+    args = parser.parse_args()
+
+    for file_path in (args.customer_file, args.sales_file):
+        if not os.path.exists(file_path):
+            print(f"Error: File {file_path} not found.")
+            return
+
+    report = build_quality_report(args.customer_file, args.sales_file, args.chunk_size, args.top_k)
+    for file_name, profile in report['files'].items():
+        print_file_report(file_name, profile)
+
+    if args.output:
+        write_report(report, args.output)
+        print(f"\nReport written to {args.output}")
 
 if __name__ == "__main__":
     print(f"Data Analysis Report - Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
@@ -1,19 +1,95 @@
-from fastapi import APIRouter, HTTPException
+import asyncio
+import json
+import logging
+from typing import Callable, Optional
+from fastapi import APIRouter, Header, HTTPException, Query, Request
 from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
 import numpy as np
 import pandas as pd
-from ..services.rfm_service import get_rfm_data
+from ..services.rfm_service import PARTITION_COLUMNS, get_partitioned_rfm_data, get_rfm_data
+from ..services.facet_service import FACET_COLUMNS, get_facet_index
+from ..services.data_profiler import get_quality_report
+from ..services.refresh_scheduler import scheduler as refresh_scheduler
+from ..services.storage_service import query_rfm_results
+from ..services.ranking_service import get_ranking_index
+from ..services.clv_model import DEFAULT_HORIZON_MONTHS, get_cached_clv, get_clv
+from ..services.cohort_service import get_cohort_matrix
+from ..services.aggregate_service import get_aggregate_index
+from ..services.geo_service import get_geo_index
+from ..services.cluster_model import cluster_summary
+from ..services.search_service import get_search_index
+from ..services.similarity_service import get_similarity_index
+from ..services.scoring_service import columnar_records, get_scoring_model, score_records
+from ..services.arrow_io import (ARROW_STREAM_MEDIA_TYPE, arrow_available, read_arrow_stream,
+                                 wants_arrow, write_arrow_stream)
+from ..services.worker_pool import WorkerPoolFull, worker_pool
+from ..core.config import RETRY_AFTER_SECONDS, WORKER_TIMEOUT_SECONDS
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api", tags=["rfm"])
 
+async def run_in_worker(fn: Callable, *args, **kwargs):
+    """
+    Run CPU-bound work in the shared worker pool without blocking the event loop.
+
+    Args:
+        fn: Synchronous callable doing the pipeline work
+        *args, **kwargs: Arguments passed to fn
+
+    Returns:
+        The callable's result
+
+    Raises:
+        HTTPException: 503 with Retry-After when the pool is full or the call times out
+    """
+    retry_headers = {"Retry-After": str(RETRY_AFTER_SECONDS)}
+    try:
+        future = worker_pool.submit(fn, *args, **kwargs)
+    except WorkerPoolFull:
+        raise HTTPException(status_code=503, detail="Server is busy, please retry shortly", headers=retry_headers)
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout=WORKER_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        # The computation keeps running in its worker and is cached for the retry
+        logger.warning(f"{getattr(fn, '__name__', fn)} did not finish within {WORKER_TIMEOUT_SECONDS}s")
+        raise HTTPException(status_code=503, detail="Request timed out, please retry shortly", headers=retry_headers)
+
 @router.get("/rfm-data")
-async def get_rfm_data_endpoint():
+async def get_rfm_data_endpoint(
+    partition_by: Optional[str] = None,
+    partition: Optional[str] = None,
+    accept: Optional[str] = Header(None),
+):
     """
     Endpoint to retrieve RFM analysis data.
-    Returns processed RFM scores for customer segmentation.
+    Returns processed RFM scores for customer segmentation. With partition_by
+    (branch, state, salesperson or customer_type) scores are computed within each
+    partition; partition selects a single partition value. Clients sending
+    Accept: application/vnd.apache.arrow.stream get an Arrow IPC stream instead of JSON.
     """
+    if partition_by and partition_by not in PARTITION_COLUMNS:
+        raise HTTPException(status_code=400, detail=f"partition_by must be one of {PARTITION_COLUMNS}")
+    respond_arrow = wants_arrow(accept)
+    if respond_arrow and not arrow_available():
+        logger.warning("Arrow IPC requested but pyarrow is not installed, responding with JSON.")
+        respond_arrow = False
+    return await run_in_worker(_rfm_data_response, partition_by, partition, respond_arrow)
+
+def _rfm_data_response(partition_by: Optional[str], partition: Optional[str], respond_arrow: bool = False):
+    """Build the /rfm-data response in a worker thread."""
     try:
-        rfm_df = get_rfm_data() # This service function should handle NaN to None
+        if partition_by:
+            rfm_df = get_partitioned_rfm_data(partition_by)
+            if partition is not None:
+                rfm_df = rfm_df[rfm_df['partition'] == partition]
+        else:
+            rfm_df = get_rfm_data() # This service function should handle NaN to None
+        
+        if respond_arrow:
+            # Columnar encoding straight from the cached frame, no per-row Python objects
+            return Response(content=write_arrow_stream(rfm_df), media_type=ARROW_STREAM_MEDIA_TYPE)
         
         # Ensure the DataFrame is properly converted to a list of dicts with JSON-compatible types
         # Replace NaN/NaT with None again, just to be absolutely sure before dict conversion
@@ -50,21 +126,156 @@ async def get_rfm_data_endpoint():
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Error retrieving RFM data: {str(e)}")
 
+@router.get("/rfm-results")
+async def get_rfm_results(
+    customer_type: Optional[str] = None,
+    salesperson: Optional[str] = None,
+    segment: Optional[str] = None,
+    customer_ranking: Optional[str] = None,
+    sort: str = 'monetary',
+    order: str = Query('desc', regex='^(asc|desc)$'),
+    limit: int = Query(100, ge=1, le=5000),
+    offset: int = Query(0, ge=0),
+):
+    """
+    Endpoint to retrieve a filtered, sorted page of RFM results.
+    With an embedded storage backend the page is queried from the materialized
+    results table instead of the in-memory frame.
+    """
+    filters = {
+        'customer_type': customer_type,
+        'salesperson': salesperson,
+        'segment': segment,
+        'customer_ranking': customer_ranking,
+    }
+    return await run_in_worker(_rfm_results_response, filters, sort, order, limit, offset)
+
+def _rfm_results_response(filters: dict, sort: str, order: str, limit: int, offset: int):
+    """Query a page of RFM results in a worker thread."""
+    try:
+        total, items = query_rfm_results(filters, limit, offset, sort, descending=(order == 'desc'))
+        return jsonable_encoder({'total': total, 'limit': limit, 'offset': offset, 'items': items})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        import traceback
+        print(f"Error in /rfm-results endpoint: {e}")
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Error retrieving RFM results: {str(e)}")
+
+@router.get("/top")
+async def get_top_customers(
+    metric: str = 'monetary',
+    n: int = Query(50, ge=1, le=5000),
+    order: str = Query('desc', regex='^(asc|desc)$'),
+    partition_by: Optional[str] = None,
+    partition: Optional[str] = None,
+):
+    """
+    Endpoint to retrieve the top (or, with order=asc, bottom) N customers by a metric.
+    Rankings can be restricted to one segment or salesperson with partition_by/partition.
+    """
+    return await run_in_worker(_top_customers_response, metric, n, order, partition_by, partition)
+
+def _top_customers_response(metric: str, n: int, order: str, partition_by: Optional[str], partition: Optional[str]):
+    """Slice the presorted ranking index in a worker thread."""
+    try:
+        top = get_ranking_index().top(metric, n, ascending=(order == 'asc'),
+                                      partition_by=partition_by, partition=partition)
+        return jsonable_encoder(top.replace({np.nan: None}).to_dict('records'))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        import traceback
+        print(f"Error in /top endpoint: {e}")
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Error ranking customers: {str(e)}")
+
+@router.get("/top/{customer_code}")
+async def get_customer_rank(customer_code: str, metric: str = 'monetary', partition_by: Optional[str] = None):
+    """
+    Endpoint to retrieve a customer's rank and percentile for a metric,
+    overall or within their own segment or salesperson.
+    """
+    return await run_in_worker(_customer_rank_response, customer_code, metric, partition_by)
+
+def _customer_rank_response(customer_code: str, metric: str, partition_by: Optional[str]):
+    """Look up a customer's percentile rank in a worker thread."""
+    try:
+        return get_ranking_index().percentile_rank(metric, customer_code, partition_by=partition_by)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Customer {customer_code} not found")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        import traceback
+        print(f"Error in /top/{{customer_code}} endpoint: {e}")
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Error ranking customer: {str(e)}")
+
+@router.get("/clv")
+async def get_customer_lifetime_value(segment: Optional[str] = None):
+    """
+    Endpoint to retrieve 12-month customer lifetime value projections.
+    Returns the fitted BG/NBD and Gamma-Gamma parameters, projected value per segment
+    and per customer (optionally for one segment only).
+    """
+    return await run_in_worker(_clv_response, segment)
+
+def _clv_response(segment: Optional[str]):
+    """Fit (or read the cached) CLV projections in a worker thread."""
+    try:
+        clv = get_clv()
+        customers = clv.customers
+        if segment is not None:
+            customers = customers[customers['segment'] == segment]
+        return jsonable_encoder({
+            'horizon_months': DEFAULT_HORIZON_MONTHS,
+            'parameters': {'bgnbd': clv.model.bgnbd, 'gamma_gamma': clv.model.gamma_gamma},
+            'segments': clv.segments,
+            'customers': customers.replace({np.nan: None}).to_dict('records'),
+        })
+    except Exception as e:
+        import traceback
+        print(f"Error in /clv endpoint: {e}")
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Error projecting customer lifetime value: {str(e)}")
+
+@router.get("/cohorts")
+async def get_cohorts():
+    """
+    Endpoint to retrieve the cohort retention matrices.
+    Customers are grouped by the month of their first purchase; rows are cohorts and
+    columns are months since acquisition, with active customers, retention percentage
+    and revenue per cell (None where a cohort has not been observed that long).
+    """
+    return await run_in_worker(_cohorts_response)
+
+def _cohorts_response():
+    """Build (or read the cached) cohort matrices in a worker thread."""
+    try:
+        return get_cohort_matrix().to_dict()
+    except Exception as e:
+        import traceback
+        print(f"Error in /cohorts endpoint: {e}")
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Error building cohort matrix: {str(e)}")
+
 @router.get("/filters")
 async def get_filters():
     """
     Endpoint to retrieve available filters for RFM analysis.
     Returns filter options for user-driven segmentation based on unique values in the dataset.
     """
+    return await run_in_worker(_filters_response)
+
+def _filters_response():
+    """Read the filter options from the facet index in a worker thread."""
     try:
-        rfm_df = get_rfm_data()
+        facet_index = get_facet_index()
         
-        # Extract unique values for filter categories from the dataset
-        filters = {
-            "customer_type": ["All"] + sorted(rfm_df['customer_type'].dropna().unique().tolist()),
-            "salesperson": ["All"] + sorted(rfm_df.get('salesperson', pd.Series([])).dropna().unique().tolist()),
-            "segment": ["All"] + sorted(rfm_df['segment'].dropna().unique().tolist())
-        }
+        # Distinct values come straight from the precomputed facet index
+        filters = {column: ["All"] + facet_index.values[column] for column in FACET_COLUMNS}
         
         return filters
     except Exception as e:
@@ -73,26 +284,263 @@ async def get_filters():
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Error retrieving filter options: {str(e)}")
 
+@router.get("/facets")
+async def get_facets(
+    customer_type: Optional[str] = None,
+    salesperson: Optional[str] = None,
+    segment: Optional[str] = None,
+    customer_ranking: Optional[str] = None,
+):
+    """
+    Endpoint to retrieve filter options with live customer counts and revenue.
+    Each facet is counted under the other selected filters, e.g. passing a segment
+    returns the number of customers per salesperson within that segment.
+    """
+    selection = {
+        'customer_type': customer_type,
+        'salesperson': salesperson,
+        'segment': segment,
+        'customer_ranking': customer_ranking,
+    }
+    return await run_in_worker(_facets_response, selection)
+
+def _facets_response(selection: dict):
+    """Count facet values under the selection in a worker thread."""
+    try:
+        facet_index = get_facet_index()
+        return {
+            column: facet_index.facet_counts(column, selection)
+            for column in FACET_COLUMNS
+        }
+    except Exception as e:
+        import traceback
+        print(f"Error in /facets endpoint: {e}")
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Error retrieving facet counts: {str(e)}")
+
+@router.get("/aggregates")
+async def get_aggregates(
+    customer_type: Optional[str] = None,
+    salesperson: Optional[str] = None,
+    segment: Optional[str] = None,
+    customer_ranking: Optional[str] = None,
+):
+    """
+    Endpoint to retrieve precomputed chart aggregates for the dashboard.
+    Returns R x F, R x M and F x M score grids with counts and revenue, per-segment
+    totals and a monetary histogram for the customers matching the filters.
+    """
+    selection = {
+        'customer_type': customer_type,
+        'salesperson': salesperson,
+        'segment': segment,
+        'customer_ranking': customer_ranking,
+    }
+    return await run_in_worker(_aggregates_response, selection)
+
+def _aggregates_response(selection: dict):
+    """Reduce the aggregate index under the selection in a worker thread."""
+    try:
+        return get_aggregate_index().aggregate(selection)
+    except Exception as e:
+        import traceback
+        print(f"Error in /aggregates endpoint: {e}")
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Error computing chart aggregates: {str(e)}")
+
+@router.get("/search")
+async def search_customers(
+    q: str = Query(..., min_length=1, max_length=200, description="Customer name, code or suburb"),
+    limit: int = Query(20, ge=1, le=100),
+):
+    """
+    Endpoint to find customers by name, code or suburb.
+    Matches are served from a prefix and trigram index built once per data version,
+    so typos are tolerated and the full RFM table is never sent to the client.
+    """
+    return await run_in_worker(_search_response, q, limit)
+
+def _search_response(q: str, limit: int):
+    """Query the search index in a worker thread."""
+    try:
+        return {'query': q, 'results': get_search_index().search(q, limit)}
+    except Exception as e:
+        import traceback
+        print(f"Error in /search endpoint: {e}")
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Error searching customers: {str(e)}")
+
+@router.get("/customers/{customer_code}/similar")
+async def get_similar_customers(customer_code: str, k: int = Query(10, ge=1, le=100)):
+    """
+    Endpoint to find the k customers that behave most like a customer.
+    Customers are compared on standardized recency, frequency, monetary value,
+    average transaction spend and their 12-month spend trend.
+    """
+    return await run_in_worker(_similar_customers_response, customer_code, k)
+
+def _similar_customers_response(customer_code: str, k: int):
+    """Search the similarity index in a worker thread."""
+    try:
+        return {'customer_code': customer_code, 'k': k,
+                'results': get_similarity_index().similar(customer_code, k)}
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Customer {customer_code} not found")
+    except Exception as e:
+        import traceback
+        print(f"Error in /customers/{{customer_code}}/similar endpoint: {e}")
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Error finding similar customers: {str(e)}")
+
+@router.get("/clusters")
+async def get_clusters():
+    """
+    Endpoint to compare the data-driven clusters with the rule-based segments.
+    Returns each cluster's size, median recency, frequency and monetary value and its
+    segment mix; the list is empty unless clustering is enabled.
+    """
+    return await run_in_worker(_clusters_response)
+
+def _clusters_response():
+    """Summarize the clusters in a worker thread."""
+    try:
+        return cluster_summary(get_rfm_data())
+    except Exception as e:
+        import traceback
+        print(f"Error in /clusters endpoint: {e}")
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Error summarizing clusters: {str(e)}")
+
+@router.get("/geo")
+async def get_geo_rollup(
+    level: str = Query('state', regex='^(state|postcode|suburb)$'),
+    state: Optional[str] = None,
+    customer_type: Optional[str] = None,
+    salesperson: Optional[str] = None,
+    segment: Optional[str] = None,
+    customer_ranking: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=10000),
+):
+    """
+    Endpoint to retrieve customer counts, revenue and segment mix per state, postcode or suburb.
+    Postcode and suburb rows carry the levels above them; results can be restricted to
+    one state and filtered like the dashboard, and are ordered by revenue.
+    """
+    selection = {
+        'customer_type': customer_type,
+        'salesperson': salesperson,
+        'segment': segment,
+        'customer_ranking': customer_ranking,
+    }
+    return await run_in_worker(_geo_rollup_response, level, selection, state, limit)
+
+def _geo_rollup_response(level: str, selection: dict, state: Optional[str], limit: Optional[int]):
+    """Reduce the geographic index under the selection in a worker thread."""
+    try:
+        return get_geo_index().rollup(level, selection, state=state, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        import traceback
+        print(f"Error in /geo endpoint: {e}")
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Error computing geographic rollups: {str(e)}")
+
+@router.get("/data-quality")
+async def get_data_quality():
+    """
+    Endpoint to retrieve the data quality report for the source CSV files.
+    Returns null counts, dtype conformance, numeric summaries, top values and
+    preprocessing issue counts, profiled once per data version.
+    """
+    return await run_in_worker(_data_quality_response)
+
+def _data_quality_response():
+    """Profile the source files (or read the cached report) in a worker thread."""
+    try:
+        return get_quality_report()
+    except Exception as e:
+        import traceback
+        print(f"Error in /data-quality endpoint: {e}")
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Error profiling data quality: {str(e)}")
+
+@router.post("/score")
+async def score_customers(request: Request):
+    """
+    Endpoint to score an external batch of customers against the current quintile cut-offs.
+    Accepts columnar JSON ({"column": [values], ...}) or an Arrow IPC stream holding either
+    recency_days/frequency/monetary summaries or raw customer_code/date/amount transactions,
+    and returns R/F/M scores and segments in the same format.
+    """
+    content_type = request.headers.get('content-type', '')
+    respond_arrow = wants_arrow(request.headers.get('accept', ''))
+    if (ARROW_STREAM_MEDIA_TYPE in content_type or respond_arrow) and not arrow_available():
+        raise HTTPException(status_code=415, detail="Arrow IPC requires pyarrow, which is not installed")
+    payload = await request.body()
+    return await run_in_worker(_score_response, payload, ARROW_STREAM_MEDIA_TYPE in content_type, respond_arrow)
+
+def _score_response(payload: bytes, arrow_input: bool, respond_arrow: bool):
+    """Parse and score a batch in a worker thread."""
+    try:
+        if arrow_input:
+            batch = read_arrow_stream(payload)
+        else:
+            body = json.loads(payload or b'{}')
+            if not isinstance(body, (dict, list)):
+                raise ValueError("Expected a JSON object of columns or a list of records")
+            batch = pd.DataFrame(body)
+        scored = score_records(get_scoring_model(), batch)
+
+        if respond_arrow:
+            return Response(content=write_arrow_stream(scored), media_type=ARROW_STREAM_MEDIA_TYPE)
+        # Columnar lists serialize directly, skipping per-value encoding of large batches
+        return JSONResponse(content=columnar_records(scored))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        import traceback
+        print(f"Error in /score endpoint: {e}")
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Error scoring customers: {str(e)}")
+
+@router.get("/refresh-status")
+async def get_refresh_status():
+    """
+    Endpoint to retrieve the status of the background data refresh.
+    Returns the last successfully computed data version, its duration and the last failure.
+    """
+    return refresh_scheduler.get_status()
+
 @router.get("/segment-analysis")
 async def get_segment_analysis():
     """
     Endpoint to retrieve comprehensive segment analysis and statistics.
     Returns segment distribution, characteristics, and actionable insights.
     """
+    return await run_in_worker(_segment_analysis_response)
+
+def _segment_analysis_response():
+    """Aggregate segment statistics in a worker thread."""
     try:
         rfm_df = get_rfm_data()
         
         # Calculate segment statistics
-        segment_stats = rfm_df.groupby('segment').agg({
-            'customer_code': 'count',
-            'monetary': ['sum', 'mean'],
-            'frequency': 'mean',
-            'recency_days': 'mean'
-        }).round(2)
-        
-        # Flatten column names
-        segment_stats.columns = ['customer_count', 'total_revenue', 'avg_revenue', 'avg_frequency', 'avg_recency_days']
+        aggregations = {
+            'customer_count': ('customer_code', 'count'),
+            'total_revenue': ('monetary', 'sum'),
+            'avg_revenue': ('monetary', 'mean'),
+            'avg_frequency': ('frequency', 'mean'),
+            'avg_recency_days': ('recency_days', 'mean'),
+        }
+        if 'total_profit' in rfm_df.columns:
+            aggregations['total_profit'] = ('total_profit', 'sum')
+            aggregations['avg_profit'] = ('total_profit', 'mean')
+        segment_stats = rfm_df.groupby('segment').agg(**aggregations).round(2)
         segment_stats = segment_stats.reset_index()
+        if 'total_profit' in segment_stats.columns:
+            # Segment margin is total profit over total revenue, not the mean of customer margins
+            segment_stats['margin_pct'] = (segment_stats['total_profit'] / segment_stats['total_revenue'].where(segment_stats['total_revenue'] != 0) * 100).round(1).fillna(0.0)
         
         # Calculate percentages
         total_customers = rfm_df.shape[0]
@@ -101,6 +549,13 @@ async def get_segment_analysis():
         segment_stats['customer_percentage'] = ((segment_stats['customer_count'] / total_customers) * 100).round(1)
         segment_stats['revenue_percentage'] = ((segment_stats['total_revenue'] / total_revenue) * 100).round(1)
         
+        # Add projected 12-month value per segment once the CLV model has been fitted;
+        # the fit itself is left to /api/clv and the refresh warmers
+        clv = get_cached_clv()
+        if clv is not None:
+            projected = {item['segment']: item['projected_value'] for item in clv.segments}
+            segment_stats['projected_value_12m'] = segment_stats['segment'].map(projected).fillna(0.0)
+        
         # Add segment characteristics and priorities
         segment_info = {
             'Champions': {'priority': 'High', 'risk': 'Low', 'action': 'Retain & Upsell'},
@@ -0,0 +1,121 @@
+"""
+Profiling Middleware
+
+Runs requests that ask for it (?profile=1 or an "X-Profile: 1" header) under the
+request profiler. The report (cumulative hotspots and RFM pipeline stage timings)
+is written to PROFILE_DIR; the response carries its file name in X-Profile-Report
+and the stage timings in a Server-Timing header, so browser dev tools show them
+without changing the body. The middleware is only installed when
+PROFILING_ENABLED and PROFILING_TOKEN are set, so it costs nothing otherwise, and only
+the newest PROFILE_MAX_FILES reports are kept.
+"""
+
+import hmac
+import json
+import logging
+import re
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+
+from ..core.config import PROFILE_DIR, PROFILE_MAX_FILES, PROFILE_TOP_N, PROFILING_TOKEN
+from ..services.profiling import collecting, start_profile, stop_profile
+
+logger = logging.getLogger(__name__)
+
+
+def wants_profile(request: Request, token: str = PROFILING_TOKEN) -> bool:
+    """
+    Check whether a request asks to be profiled and is allowed to.
+
+    Args:
+        request: Incoming request
+        token: Required X-Profile-Token value; empty allows no caller
+
+    Returns:
+        True if the request should be profiled
+    """
+    if not token:
+        return False
+    if request.query_params.get('profile') != '1' and request.headers.get('x-profile') != '1':
+        return False
+    return hmac.compare_digest(request.headers.get('x-profile-token', ''), token)
+
+
+def prune_reports(profile_dir: Path, max_files: int) -> int:
+    """
+    Delete the oldest profile reports beyond the newest max_files.
+
+    Report names start with their creation time, so name order is age order.
+
+    Args:
+        profile_dir: Directory holding the reports
+        max_files: Number of reports to keep
+
+    Returns:
+        Number of reports deleted
+    """
+    reports = sorted(profile_dir.glob('*.json'))
+    stale = reports[:max(len(reports) - max_files, 0)]
+    for path in stale:
+        path.unlink(missing_ok=True)
+    return len(stale)
+
+
+def server_timing(stages: dict, total_seconds: float) -> str:
+    """Format stage timings as a Server-Timing header value (durations in milliseconds)."""
+    metrics = [f"{re.sub(r'[^A-Za-z0-9_.-]', '-', name)};dur={entry['seconds'] * 1000:.1f}"
+               for name, entry in stages.items()]
+    metrics.append(f"total;dur={total_seconds * 1000:.1f}")
+    return ", ".join(metrics)
+
+
+class ProfilingMiddleware(BaseHTTPMiddleware):
+    """Profile opted-in requests and persist a hotspot report for each."""
+
+    def __init__(self, app, profile_dir=PROFILE_DIR, top_n: int = PROFILE_TOP_N, token: str = PROFILING_TOKEN,
+                 max_files: int = PROFILE_MAX_FILES):
+        super().__init__(app)
+        self.profile_dir = Path(profile_dir)
+        self.top_n = top_n
+        self.token = token
+        self.max_files = max_files
+
+    async def dispatch(self, request: Request, call_next):
+        if not wants_profile(request, self.token):
+            return await call_next(request)
+
+        started = time.perf_counter()
+        with collecting() as collector:
+            # The event loop thread is profiled here; worker pool calls profile themselves
+            profile = start_profile()
+            try:
+                response = await call_next(request)
+            finally:
+                stop_profile(profile)
+        duration = time.perf_counter() - started
+
+        report = {
+            'method': request.method,
+            'path': request.url.path,
+            'query': str(request.url.query),
+            'status_code': response.status_code,
+            'duration_seconds': round(duration, 6),
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            **collector.report(self.top_n),
+        }
+        name = f"{datetime.now():%Y%m%d-%H%M%S-%f}-{uuid.uuid4().hex[:8]}.json"
+        try:
+            self.profile_dir.mkdir(parents=True, exist_ok=True)
+            (self.profile_dir / name).write_text(json.dumps(report, indent=2))
+            response.headers['X-Profile-Report'] = name
+            prune_reports(self.profile_dir, self.max_files)
+        except OSError as e:
+            logger.warning(f"Could not write profile report {name}: {str(e)}")
+        response.headers['Server-Timing'] = server_timing(report['stages'], duration)
+        logger.info(f"Profiled {request.method} {request.url.path} in {duration:.3f}s")
+        return response
@@ -0,0 +1,189 @@
+"""
+RFM Batch Command Line
+
+Runs the RFM pipeline outside the API and writes the results as versioned
+artifacts with a run manifest, so the scores can be precomputed by a scheduled job
+and loaded by the API without parsing the source CSVs.
+
+Run from the rfm_backend directory:
+    python -m app.cli --format parquet --partition-by state --workers 8
+"""
+
+import argparse
+import logging
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import pandas as pd
+
+from .core.config import ARTIFACT_DIR, RFM_PARTITION_WORKERS, STORAGE_CHUNK_SIZE
+from .services import rfm_service
+from .services.arrow_io import arrow_available
+from .services.artifact_store import ARTIFACT_FORMATS, publish_run, write_artifact
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def timed(timings: Dict[str, float], stage: str) -> Iterator[None]:
+    """Record the wall-clock seconds spent in a stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = round(time.perf_counter() - start, 3)
+
+
+def load_inputs(customer_path, sales_path, chunk_size: int, as_of: Optional[pd.Timestamp],
+                counts: Dict[str, int]):
+    """
+    Read and preprocess the source CSVs, cleaning the sales file chunk by chunk.
+
+    Preprocessing filters sales rows independently, so each chunk is reduced before
+    the next is parsed and the raw file is never held in memory at once. With
+    SALES_DEDUP_ENABLED, repeats spanning chunks are found with a hash of each raw
+    source row taken before preprocessing, so they match exactly the rows load_data()
+    and preprocess_data() drop for the API.
+
+    Args:
+        customer_path: Customer CSV
+        sales_path: Sales CSV
+        chunk_size: Sales rows parsed per chunk
+        as_of: Ignore transactions after this date
+        counts: Row counts are recorded here
+
+    Returns:
+        Tuple of (preprocessed customers, preprocessed sales)
+    """
+    customer_df = rfm_service.read_csv_with_schema(customer_path, 'customer_data.csv', rfm_service.CUSTOMER_COLUMNS)
+    counts['customers'] = int(len(customer_df))
+    customer_df = rfm_service.preprocess_customers(customer_df)
+
+    cleaned = []
+    counts['sales'] = 0
+    dedup = rfm_service.SALES_DEDUP_ENABLED
+    sales_columns = rfm_service.sales_source_columns(sales_path)
+    for chunk in rfm_service.iter_csv_with_schema(sales_path, 'sales_data.csv', sales_columns, chunk_size):
+        counts['sales'] += int(len(chunk))
+        # Key every raw row before cleaning; kept rows keep their index labels through preprocessing
+        raw_keys = pd.Series(rfm_service.row_hashes(chunk), index=chunk.index) if dedup else None
+        _, chunk = rfm_service.preprocess_data(customer_df, rfm_service.key_source_rows(chunk))
+        if as_of is not None:
+            chunk = chunk[chunk['date'] <= as_of]
+        if dedup:
+            chunk = chunk.assign(**{rfm_service.ROW_HASH_COLUMN: raw_keys.loc[chunk.index].to_numpy()})
+        cleaned.append(chunk)
+    sales_df = pd.concat(cleaned, ignore_index=True)
+    if dedup:
+        # Each chunk was deduplicated on its own; drop repeats that span chunks by their raw row key
+        if len(cleaned) > 1:
+            sales_df = sales_df[~rfm_service.find_duplicate_rows(sales_df)].reset_index(drop=True)
+        sales_df = sales_df.drop(columns=rfm_service.ROW_HASH_COLUMN)
+    counts['sales_cleaned'] = int(len(sales_df))
+    if sales_df.empty:
+        raise ValueError("No sales transactions left after preprocessing")
+    return customer_df, sales_df
+
+
+def run(customer_path, sales_path, output_dir, fmt: str, as_of: Optional[pd.Timestamp] = None,
+        partition_by: Optional[List[str]] = None, workers: int = RFM_PARTITION_WORKERS,
+        chunk_size: int = STORAGE_CHUNK_SIZE) -> Path:
+    """
+    Compute the RFM artifacts and publish them as a new run.
+
+    Args:
+        customer_path: Customer CSV
+        sales_path: Sales CSV
+        output_dir: Artifact root directory
+        fmt: One of ARTIFACT_FORMATS
+        as_of: Compute the scores as of this date (transactions after it are ignored)
+        partition_by: Partition columns to also write per-partition scores for
+        workers: Threads used to score partitions in parallel
+        chunk_size: Sales rows parsed per chunk
+
+    Returns:
+        Path of the published run directory
+    """
+    data_version = rfm_service.read_data_version((customer_path, sales_path))
+    if data_version is None:
+        raise FileNotFoundError(f"Source files not found: {customer_path}, {sales_path}")
+    run_id = data_version if as_of is None else f"{data_version}-asof-{as_of:%Y%m%d}"
+
+    timings: Dict[str, float] = {}
+    counts: Dict[str, int] = {}
+    artifacts: Dict[str, Dict] = {}
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    staging_dir = Path(tempfile.mkdtemp(prefix=f".{run_id}.", dir=output_dir))
+    try:
+        with timed(timings, 'total'):
+            with timed(timings, 'load'):
+                customer_df, sales_df = load_inputs(customer_path, sales_path, chunk_size, as_of, counts)
+
+            with timed(timings, 'score'):
+                rfm_data = rfm_service.calculate_rfm_scores(customer_df, sales_df)
+            counts['rfm'] = int(len(rfm_data))
+            with timed(timings, 'write:rfm'):
+                artifacts['rfm'] = write_artifact(rfm_data, staging_dir, 'rfm', fmt)
+
+            for column in partition_by or []:
+                name = f"rfm_by_{column}"
+                with timed(timings, f"score:{name}"):
+                    partitioned = rfm_service.calculate_partitioned_rfm_scores(customer_df, sales_df, column, workers)
+                counts[name] = int(len(partitioned))
+                with timed(timings, f"write:{name}"):
+                    artifacts[name] = write_artifact(partitioned, staging_dir, name, fmt)
+
+        manifest = {
+            'run_id': run_id,
+            'data_version': data_version,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'as_of': None if as_of is None else as_of.date().isoformat(),
+            'inputs': {'customers': str(customer_path), 'sales': str(sales_path)},
+            'options': {'format': fmt, 'partition_by': partition_by or [], 'workers': workers,
+                        'chunk_size': chunk_size, **rfm_service.pipeline_settings()},
+            'timings_seconds': timings,
+            'row_counts': counts,
+            'artifacts': artifacts,
+        }
+        return publish_run(output_dir, run_id, staging_dir, manifest)
+    except Exception:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+
+
+def main(argv=None) -> None:
+    """Parse the command line and run the batch computation."""
+    parser = argparse.ArgumentParser(description="Compute RFM scores and write them as versioned artifacts.")
+    parser.add_argument('--customers', default=str(rfm_service.CUSTOMER_DATA_PATH), help="Customer CSV")
+    parser.add_argument('--sales', default=str(rfm_service.SALES_DATA_PATH), help="Sales CSV")
+    parser.add_argument('--output-dir', default=str(ARTIFACT_DIR), help="Artifact root directory")
+    parser.add_argument('--format', choices=list(ARTIFACT_FORMATS), default=None,
+                        help="Artifact format (default: parquet when pyarrow is installed, otherwise csv)")
+    parser.add_argument('--as-of', type=pd.Timestamp, default=None,
+                        help="Score as of this date (YYYY-MM-DD); later transactions are ignored")
+    parser.add_argument('--partition-by', action='append', choices=rfm_service.PARTITION_COLUMNS, default=None,
+                        help="Also write scores computed within each value of this column (repeatable)")
+    parser.add_argument('--workers', type=int, default=RFM_PARTITION_WORKERS,
+                        help="Threads used to score partitions in parallel")
+    parser.add_argument('--chunk-size', type=int, default=STORAGE_CHUNK_SIZE, help="Sales rows parsed per chunk")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ('parquet' if arrow_available() else 'csv')
+    if fmt != 'csv' and not arrow_available():
+        parser.error(f"--format {fmt} requires pyarrow")
+
+    # Resolved paths give the same data version the API computes for the same files
+    run_dir = run(Path(args.customers).resolve(), Path(args.sales).resolve(), args.output_dir, fmt, as_of=args.as_of,
+                  partition_by=args.partition_by, workers=args.workers, chunk_size=args.chunk_size)
+    print(f"RFM artifacts written to {run_dir}")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -22,3 +22,65 @@ ALLOWED_ORIGINS = [
     "http://localhost:5173",
     "http://127.0.0.1:5173",
 ]
+
+# CSV ingest settings
+DATA_HEADERS_PATH = Path(os.getenv("DATA_HEADERS_PATH", BASE_DIR.parent / "data_headers.json"))
+# "c" (default) or "pyarrow" for multithreaded parsing when pyarrow is installed
+CSV_ENGINE = os.getenv("CSV_ENGINE", "c")
+
+# Background refresh of RFM results when the source CSVs change
+REFRESH_WATCH_ENABLED = os.getenv("REFRESH_WATCH_ENABLED", "true").lower() == "true"
+REFRESH_POLL_SECONDS = float(os.getenv("REFRESH_POLL_SECONDS", "5"))
+REFRESH_DEBOUNCE_SECONDS = float(os.getenv("REFRESH_DEBOUNCE_SECONDS", "10"))
+# A data version that fails to compute is retried after REFRESH_RETRY_SECONDS, doubling per
+# failure up to REFRESH_RETRY_MAX_SECONDS
+REFRESH_RETRY_SECONDS = float(os.getenv("REFRESH_RETRY_SECONDS", "30"))
+REFRESH_RETRY_MAX_SECONDS = float(os.getenv("REFRESH_RETRY_MAX_SECONDS", "600"))
+
+# Storage backend for transactions and RFM results: "csv" (default), "sqlite" or "duckdb"
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "csv").lower()
+STORAGE_PATH = Path(os.getenv("STORAGE_PATH", BASE_DIR.parent / "data" / "rfm_store.db"))
+STORAGE_CHUNK_SIZE = int(os.getenv("STORAGE_CHUNK_SIZE", "200000"))
+
+# Worker threads used to score RFM partitions in parallel
+RFM_PARTITION_WORKERS = int(os.getenv("RFM_PARTITION_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Worker threads for CPU-bound request work, and how many calls may wait for one
+WORKER_THREADS = int(os.getenv("WORKER_THREADS", "2"))
+WORKER_QUEUE_DEPTH = int(os.getenv("WORKER_QUEUE_DEPTH", "8"))
+# Seconds a request waits for its worker call before giving up with 503
+WORKER_TIMEOUT_SECONDS = float(os.getenv("WORKER_TIMEOUT_SECONDS", "60"))
+# Retry-After hint returned with 503 responses
+RETRY_AFTER_SECONDS = int(os.getenv("RETRY_AFTER_SECONDS", "5"))
+
+# Churn model trained with `python -m app.services.churn_model`; scoring is skipped until it exists
+CHURN_MODEL_PATH = Path(os.getenv("CHURN_MODEL_PATH", BASE_DIR.parent / "data" / "churn_model.json"))
+
+# Precomputed RFM artifacts written by `python -m app.cli`, one directory per run
+ARTIFACT_DIR = Path(os.getenv("ARTIFACT_DIR", BASE_DIR.parent / "data" / "artifacts"))
+
+# Warm the RFM cache in the background on startup, from the batch artifacts for the current
+# data version when they exist, otherwise by computing it
+STARTUP_WARMUP_ENABLED = os.getenv("STARTUP_WARMUP_ENABLED", "true").lower() == "true"
+
+# Per-request profiling: when enabled, requests with ?profile=1 or an "X-Profile: 1" header and an
+# X-Profile-Token header matching PROFILING_TOKEN are run under cProfile and a report is written to
+# PROFILE_DIR. PROFILING_TOKEN is required; without it the middleware is not installed. Only the
+# newest PROFILE_MAX_FILES reports are kept.
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", BASE_DIR.parent / "data" / "profiles"))
+PROFILE_TOP_N = int(os.getenv("PROFILE_TOP_N", "30"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+
+# Frequency counts sales rows ("lines", the default) or distinct transaction numbers ("invoices"),
+# so a multi-line invoice counts once
+FREQUENCY_MODE = os.getenv("FREQUENCY_MODE", "lines").lower()
+# Drop sales rows that repeat an earlier source row in every column (e.g. from re-exported files)
+# at ingest. Off by default: identical lines can also be genuine repeat purchases on one invoice
+SALES_DEDUP_ENABLED = os.getenv("SALES_DEDUP_ENABLED", "false").lower() == "true"
+
+# Data-driven clusters next to the rule-based segments: mini-batch k-means with the number of
+# clusters chosen by silhouette between CLUSTER_K_MIN and CLUSTER_K_MAX
+CLUSTERING_ENABLED = os.getenv("CLUSTERING_ENABLED", "false").lower() == "true"
+CLUSTER_K_RANGE = list(range(int(os.getenv("CLUSTER_K_MIN", "2")), int(os.getenv("CLUSTER_K_MAX", "8")) + 1))
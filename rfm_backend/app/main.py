@@ -1,6 +1,16 @@
-from fastapi import FastAPI
+import logging
+import sys
+import threading
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.endpoints import router as api_router
+from fastapi.responses import JSONResponse
+from app.api.profiling_middleware import ProfilingMiddleware
+from app.core.config import PROFILING_ENABLED, PROFILING_TOKEN, REFRESH_WATCH_ENABLED, STARTUP_WARMUP_ENABLED
+from app.services.worker_pool import worker_pool
+
+# Configure logging for the application; service modules only create loggers
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 app = FastAPI(
     title="Adheseal RFM Analysis API",
@@ -17,9 +27,83 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Include API router
-app.include_router(api_router)
+# Opt-in per-request profiling; not installed at all unless enabled, and never without a token
+if PROFILING_ENABLED and not PROFILING_TOKEN:
+    logging.getLogger(__name__).error("PROFILING_ENABLED is set without a PROFILING_TOKEN; profiling is disabled.")
+elif PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+
+# The API router pulls in pandas, NumPy and every service (each registering its cache warmer on
+# import), so it is included lazily: by the startup thread, or by the first request that needs it.
+# The probes below answer before it is loaded.
+_api_lock = threading.Lock()
+_api_included = False
+# Set on startup when the refresh watcher will publish data versions
+_serve_published_only = False
+LIGHTWEIGHT_PATHS = {'/', '/healthz', '/readyz'}
+
+def include_api() -> None:
+    """Import the API router and add it to the app, once."""
+    global _api_included
+    with _api_lock:
+        if _api_included:
+            return
+        from app.api.endpoints import router as api_router
+        from app.services import rfm_service
+        if _serve_published_only:
+            # The watcher publishes each version once computed (retrying failures); until the first
+            # publish requests wait rather than read source files that may still be being written
+            rfm_service.require_published_version()
+        app.include_router(api_router)
+        app.openapi_schema = None
+        _api_included = True
+    logging.getLogger(__name__).info("API routes loaded.")
+
+@app.middleware("http")
+async def include_api_on_first_use(request: Request, call_next):
+    if not _api_included and request.url.path not in LIGHTWEIGHT_PATHS:
+        await run_in_threadpool(include_api)
+    return await call_next(request)
+
+def start_services() -> None:
+    """Load the API, then warm the cache and start the file watcher."""
+    include_api()
+    from app.services.refresh_scheduler import scheduler as refresh_scheduler
+    from app.services.warmup_service import start_warm_up
+    start_watcher = refresh_scheduler.start if REFRESH_WATCH_ENABLED else None
+    if STARTUP_WARMUP_ENABLED:
+        start_warm_up(on_done=start_watcher)
+    elif start_watcher is not None:
+        start_watcher()
+
+# Warm the cache in the background, then recompute RFM results whenever the source CSVs change
+@app.on_event("startup")
+async def start_background_work():
+    global _serve_published_only
+    _serve_published_only = REFRESH_WATCH_ENABLED
+    threading.Thread(target=start_services, name="rfm-startup", daemon=True).start()
+
+@app.on_event("shutdown")
+async def stop_refresh_scheduler():
+    refresh_scheduler_module = sys.modules.get('app.services.refresh_scheduler')
+    if refresh_scheduler_module is not None:
+        refresh_scheduler_module.scheduler.stop(timeout=5)
+    worker_pool.shutdown(wait=False)
 
 @app.get("/")
 async def root():
     return {"message": "Welcome to the Adheseal RFM Analysis API"}
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness probe: the process is up and serving requests."""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness probe: 200 once the RFM data for the current version is cached, 503 until then."""
+    if not _api_included:
+        return JSONResponse({'ready': False, 'data_version': None, 'warm_up': {'state': 'loading'}}, status_code=503)
+    from app.services.warmup_service import readiness
+    report = readiness()
+    return JSONResponse(report, status_code=200 if report['ready'] else 503)
@@ -0,0 +1,163 @@
+"""
+Chart Aggregate Service
+
+This module precomputes the chart aggregates for the dashboard (R x F, R x M and
+F x M score grids, per-segment totals and a monetary histogram) so charts render
+from a small payload instead of reducing the full RFM table in the browser. Score,
+segment and histogram-bin codes are stored once per data version; each request
+applies the dashboard filters as a boolean mask and reduces with np.bincount.
+"""
+
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+from .data_cache import get_or_build
+from .facet_service import FacetIndex, build_facet_index, get_facet_index
+from .refresh_scheduler import register_warmer
+from .rfm_service import get_data_version, get_rfm_data
+
+logger = logging.getLogger(__name__)
+
+# Score grids returned by the endpoint: name -> (row score, column score)
+SCORE_GRIDS = {
+    'rf': ('recency_score', 'frequency_score'),
+    'rm': ('recency_score', 'monetary_score'),
+    'fm': ('frequency_score', 'monetary_score'),
+}
+SCORE_LEVELS = 5
+
+# Number of log-spaced monetary histogram bins
+HISTOGRAM_BINS = 20
+
+
+@dataclass
+class AggregateIndex:
+    """Integer codes for every chart dimension plus the facet codes used for filtering."""
+    facets: FacetIndex = field(default_factory=FacetIndex)
+    scores: Dict[str, np.ndarray] = field(default_factory=dict)
+    segments: List[str] = field(default_factory=list)
+    segment_codes: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+    monetary: np.ndarray = field(default_factory=lambda: np.zeros(0))
+    histogram_edges: np.ndarray = field(default_factory=lambda: np.zeros(0))
+    histogram_codes: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+
+    def aggregate(self, filters: Optional[Mapping[str, Optional[str]]] = None) -> Dict:
+        """
+        Compute all chart aggregates for the customers matching the filters.
+
+        Args:
+            filters: Facet column -> selected value ("All"/None means no filter)
+
+        Returns:
+            Dict with customer_count, revenue, grids, segments and monetary_histogram
+        """
+        mask = self.facets.selection_mask(filters or {})
+        if mask is None:
+            mask = np.ones(len(self.monetary), dtype=bool)
+        monetary = self.monetary[mask]
+
+        grids = {}
+        for name, (row_score, column_score) in SCORE_GRIDS.items():
+            rows, columns = self.scores[row_score][mask], self.scores[column_score][mask]
+            valid = (rows >= 0) & (columns >= 0)
+            cells = rows[valid] * SCORE_LEVELS + columns[valid]
+            size = SCORE_LEVELS * SCORE_LEVELS
+            grids[name] = {
+                'rows': row_score,
+                'columns': column_score,
+                'counts': np.bincount(cells, minlength=size).reshape(SCORE_LEVELS, SCORE_LEVELS).tolist(),
+                'revenue': np.bincount(cells, weights=monetary[valid], minlength=size)
+                             .reshape(SCORE_LEVELS, SCORE_LEVELS).round(2).tolist(),
+            }
+
+        segment_codes = self.segment_codes[mask]
+        known = segment_codes >= 0
+        segment_counts = np.bincount(segment_codes[known], minlength=len(self.segments))
+        segment_revenue = np.bincount(segment_codes[known], weights=monetary[known], minlength=len(self.segments))
+        segments = [
+            {'segment': segment, 'customer_count': int(segment_counts[i]), 'revenue': round(float(segment_revenue[i]), 2),
+             'avg_revenue': round(float(segment_revenue[i] / segment_counts[i]), 2) if segment_counts[i] else 0.0}
+            for i, segment in enumerate(self.segments)
+            if segment_counts[i]
+        ]
+
+        n_bins = len(self.histogram_edges) - 1
+        bin_codes = self.histogram_codes[mask]
+        histogram = {
+            'edges': self.histogram_edges.round(2).tolist(),
+            'counts': np.bincount(bin_codes, minlength=n_bins).tolist(),
+            'revenue': np.bincount(bin_codes, weights=monetary, minlength=n_bins).round(2).tolist(),
+        }
+
+        return {
+            'customer_count': int(mask.sum()),
+            'revenue': round(float(monetary.sum()), 2),
+            'grids': grids,
+            'segments': segments,
+            'monetary_histogram': histogram,
+        }
+
+
+def monetary_bins(monetary: np.ndarray, n_bins: int = HISTOGRAM_BINS):
+    """
+    Log-spaced histogram edges over the positive monetary range and each value's bin.
+
+    Args:
+        monetary: Customer monetary values
+        n_bins: Number of bins
+
+    Returns:
+        Tuple of (bin edges, bin code per customer); values at or below the lowest
+        edge fall in the first bin and the maximum in the last
+    """
+    positive = monetary[monetary > 0]
+    if len(positive) == 0:
+        edges = np.array([0.0, 1.0])
+    elif positive.min() == positive.max():
+        edges = np.array([0.0, float(positive.max())])
+    else:
+        edges = np.geomspace(positive.min(), positive.max(), n_bins + 1)
+    codes = np.searchsorted(edges[1:-1], monetary, side='right')
+    return edges, codes
+
+
+def build_aggregate_index(rfm_df: pd.DataFrame, facets: Optional[FacetIndex] = None) -> AggregateIndex:
+    """
+    Encode the chart dimensions of an RFM dataset.
+
+    Args:
+        rfm_df: Final RFM dataset
+        facets: Facet index of the same dataset to share; built from rfm_df if omitted
+
+    Returns:
+        AggregateIndex over the dataset's customers
+    """
+    index = AggregateIndex(facets=facets if facets is not None else build_facet_index(rfm_df))
+    index.monetary = pd.to_numeric(rfm_df['monetary'], errors='coerce').fillna(0.0).to_numpy(dtype='float64')
+
+    for score_column in ['recency_score', 'frequency_score', 'monetary_score']:
+        scores = pd.to_numeric(rfm_df[score_column], errors='coerce').fillna(0).to_numpy(dtype=np.int64)
+        # Scores 1-5 map to codes 0-4; anything else is left out of the grids
+        index.scores[score_column] = np.where((scores >= 1) & (scores <= SCORE_LEVELS), scores - 1, -1)
+
+    codes, uniques = pd.factorize(rfm_df['segment'], sort=True)
+    index.segments = [str(segment) for segment in uniques]
+    index.segment_codes = codes.astype(np.int64)
+
+    index.histogram_edges, index.histogram_codes = monetary_bins(index.monetary)
+    logger.info(f"Built chart aggregate index for {len(rfm_df)} customers.")
+    return index
+
+
+def get_aggregate_index() -> AggregateIndex:
+    """
+    Return the chart aggregate index for the current data version, building it if needed.
+    """
+    return get_or_build("aggregates", get_data_version(), lambda: build_aggregate_index(get_rfm_data(), get_facet_index()))
+
+
+register_warmer(get_aggregate_index)
@@ -0,0 +1,134 @@
+"""
+Arrow IPC Module
+
+This module converts between DataFrames and the Arrow IPC stream format for
+clients that exchange large columnar batches. Columns holding per-row arrays (such
+as the 12-month trend_values) are written as a single fixed-size list column built
+from one stacked NumPy matrix. pyarrow is an optional dependency; callers check
+arrow_available() and fall back to JSON when it is not installed.
+"""
+
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Media type of the Arrow IPC streaming format
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+
+def arrow_available() -> bool:
+    """Return True if pyarrow can be imported."""
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def wants_arrow(accept: str) -> bool:
+    """
+    Check whether an Accept header asks for an Arrow IPC stream.
+
+    Args:
+        accept: Accept header value
+
+    Returns:
+        True if the Arrow stream media type is listed
+    """
+    return ARROW_STREAM_MEDIA_TYPE in (accept or '')
+
+
+def read_arrow_stream(payload: bytes) -> pd.DataFrame:
+    """
+    Read an Arrow IPC stream into a DataFrame.
+
+    Args:
+        payload: Serialized Arrow IPC stream
+
+    Returns:
+        DataFrame with one column per Arrow field
+    """
+    import pyarrow as pa
+
+    with pa.ipc.open_stream(payload) as reader:
+        return reader.read_all().to_pandas()
+
+
+def is_array_column(values: pd.Series) -> bool:
+    """Return True if an object column holds per-row lists or arrays."""
+    if values.dtype != object:
+        return False
+    first = values.first_valid_index()
+    return first is not None and isinstance(values[first], (list, tuple, np.ndarray))
+
+
+def stack_array_column(values: pd.Series) -> np.ndarray:
+    """
+    Stack a column of per-row arrays into a 2-D float matrix.
+
+    Args:
+        values: Object column of lists or arrays
+
+    Returns:
+        Matrix with one row per value, as wide as the longest array; shorter or
+        missing arrays are padded with NaN
+    """
+    lengths = np.fromiter((len(v) if isinstance(v, (list, tuple, np.ndarray)) else 0 for v in values),
+                          dtype=np.int64, count=len(values))
+    width = int(lengths.max()) if len(lengths) else 0
+    if width and (lengths == width).all():
+        return np.asarray(values.tolist(), dtype='float64').reshape(len(values), width)
+
+    matrix = np.full((len(values), width), np.nan)
+    for row in np.flatnonzero(lengths):
+        matrix[row, :lengths[row]] = values.iat[row]
+    return matrix
+
+
+def frame_to_arrow_table(df: pd.DataFrame):
+    """
+    Convert a DataFrame to an Arrow table, writing array columns as fixed-size lists.
+
+    Args:
+        df: DataFrame to convert
+
+    Returns:
+        pyarrow.Table with the DataFrame's columns in order
+    """
+    import pyarrow as pa
+
+    array_columns = [column for column in df.columns if is_array_column(df[column])]
+    table = pa.Table.from_pandas(df.drop(columns=array_columns), preserve_index=False)
+    for column in array_columns:
+        matrix = stack_array_column(df[column])
+        if matrix.shape[1] == 0:
+            # Every row is empty; a fixed-size list needs a non-zero width, so write empty lists
+            offsets = pa.array(np.zeros(len(df) + 1, dtype=np.int32))
+            array = pa.ListArray.from_arrays(offsets, pa.array([], type=pa.float64()))
+        else:
+            values = pa.array(matrix.ravel(), type=pa.float64(), from_pandas=True)
+            array = pa.FixedSizeListArray.from_arrays(values, matrix.shape[1])
+        table = table.add_column(df.columns.get_loc(column), column, array)
+    return table
+
+
+def write_arrow_stream(df: pd.DataFrame) -> bytes:
+    """
+    Serialize a DataFrame as an Arrow IPC stream.
+
+    Args:
+        df: DataFrame to serialize
+
+    Returns:
+        Arrow IPC stream bytes
+    """
+    import pyarrow as pa
+
+    table = frame_to_arrow_table(df)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
@@ -0,0 +1,149 @@
+"""
+Artifact Store Module
+
+This module writes and reads precomputed RFM artifacts. Each batch run writes its
+tables into its own directory next to a manifest.json describing the run (data
+version, options, timings, row counts and one entry per artifact), and a LATEST
+file in the artifact root names the most recent complete run. Runs are written to
+a temporary directory first and renamed into place, so readers never see a
+partial run.
+
+Artifacts are written as Parquet, Arrow IPC or CSV. Parquet and Arrow need the
+optional pyarrow dependency; CSV stores array columns (such as trend_values) as
+JSON lists and the manifest records which columns to decode on read.
+"""
+
+import json
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, Optional
+
+import pandas as pd
+
+from .arrow_io import frame_to_arrow_table, is_array_column, read_arrow_stream, write_arrow_stream
+
+logger = logging.getLogger(__name__)
+
+# Supported artifact formats and their file extensions
+ARTIFACT_FORMATS = {'parquet': '.parquet', 'arrow': '.arrows', 'csv': '.csv'}
+
+MANIFEST_FILE = 'manifest.json'
+LATEST_FILE = 'LATEST'
+
+
+def write_artifact(df: pd.DataFrame, directory, name: str, fmt: str) -> Dict:
+    """
+    Write a DataFrame as an artifact file.
+
+    Args:
+        df: Table to write
+        directory: Run directory
+        name: Artifact name, used as the file stem
+        fmt: One of ARTIFACT_FORMATS
+
+    Returns:
+        Manifest entry with the file name, format, row count, columns and size
+    """
+    if fmt not in ARTIFACT_FORMATS:
+        raise ValueError(f"format must be one of {list(ARTIFACT_FORMATS)}")
+    path = Path(directory) / f"{name}{ARTIFACT_FORMATS[fmt]}"
+    array_columns = [column for column in df.columns if is_array_column(df[column])]
+
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        pq.write_table(frame_to_arrow_table(df), path)
+    elif fmt == 'arrow':
+        path.write_bytes(write_arrow_stream(df))
+    else:
+        encoded = {column: df[column].map(lambda values: json.dumps(list(values))
+                                          if values is not None else None)
+                   for column in array_columns}
+        df.assign(**encoded).to_csv(path, index=False)
+
+    return {
+        'file': path.name,
+        'format': fmt,
+        'rows': int(len(df)),
+        'columns': [str(column) for column in df.columns],
+        'array_columns': array_columns,
+        'dtypes': {str(column): str(dtype) for column, dtype in df.dtypes.items()},
+        'bytes': path.stat().st_size,
+    }
+
+
+def read_artifact(directory, entry: Dict) -> pd.DataFrame:
+    """
+    Read an artifact written by write_artifact().
+
+    Args:
+        directory: Run directory
+        entry: The artifact's manifest entry
+
+    Returns:
+        The artifact as a DataFrame
+    """
+    path = Path(directory) / entry['file']
+    if entry['format'] == 'parquet':
+        return pd.read_parquet(path)
+    if entry['format'] == 'arrow':
+        return read_arrow_stream(path.read_bytes())
+    # Keep text columns as text, so codes such as '0042' are not parsed as numbers
+    text_columns = [column for column, dtype in entry.get('dtypes', {}).items()
+                    if dtype == 'object' and column not in entry.get('array_columns', [])]
+    df = pd.read_csv(path, dtype={column: 'object' for column in text_columns})
+    for column in entry.get('array_columns', []):
+        df[column] = df[column].map(lambda text: json.loads(text) if isinstance(text, str) else [])
+    return df
+
+
+def publish_run(root, run_id: str, staging_dir, manifest: Dict) -> Path:
+    """
+    Move a fully written run into place and point LATEST at it.
+
+    Args:
+        root: Artifact root directory
+        run_id: Run directory name
+        staging_dir: Temporary directory holding the run's artifacts
+        manifest: Run manifest to write next to the artifacts
+
+    Returns:
+        Path of the published run directory
+    """
+    root = Path(root)
+    with open(Path(staging_dir) / MANIFEST_FILE, 'w') as f:
+        json.dump(manifest, f, indent=2, default=str)
+
+    run_dir = root / run_id
+    if run_dir.exists():
+        shutil.rmtree(run_dir)
+    os.replace(staging_dir, run_dir)
+
+    # Replace the pointer atomically so readers see either the old or the new run
+    pointer = root / f".{LATEST_FILE}.tmp"
+    pointer.write_text(run_id)
+    os.replace(pointer, root / LATEST_FILE)
+    logger.info(f"Published artifact run {run_id} to {run_dir}")
+    return run_dir
+
+
+def latest_run(root) -> Optional[Path]:
+    """
+    Return the directory of the most recent complete run, or None if there is none.
+
+    Args:
+        root: Artifact root directory
+    """
+    try:
+        run_id = (Path(root) / LATEST_FILE).read_text().strip()
+    except OSError:
+        return None
+    run_dir = Path(root) / run_id
+    return run_dir if (run_dir / MANIFEST_FILE).exists() else None
+
+
+def read_manifest(run_dir) -> Dict:
+    """Read a run's manifest."""
+    with open(Path(run_dir) / MANIFEST_FILE) as f:
+        return json.load(f)
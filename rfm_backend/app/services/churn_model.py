@@ -0,0 +1,297 @@
+"""
+Churn Model Module
+
+This module trains and applies a churn-risk model on top of the RFM aggregates.
+Training replays the transaction history at several as-of dates: for each one the
+customer metrics are aggregated from the sales before that date, and the label is
+whether the customer bought again within the following horizon. A logistic
+regression is fitted in NumPy (Newton's method with L2 regularization) and stored
+as JSON, so scoring during get_rfm_data() is one matrix-vector product.
+
+Train from the rfm_backend directory with:
+    python -m app.services.churn_model --horizon-days 90 --snapshots 4
+"""
+
+import argparse
+import json
+import logging
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from ..core.config import CHURN_MODEL_PATH
+
+logger = logging.getLogger(__name__)
+
+# Per-customer columns the model reads from the scored RFM frame
+FEATURE_COLUMNS = ['recency_days', 'frequency', 'monetary', 'avg_transaction_spend', 'months_active', 'trend_slope']
+
+# Defaults for building the training set
+DEFAULT_HORIZON_DAYS = 90
+DEFAULT_SNAPSHOTS = 4
+DEFAULT_L2_PENALTY = 1.0
+
+
+def churn_features(rfm_data: pd.DataFrame) -> np.ndarray:
+    """
+    Build the model's feature matrix from per-customer RFM columns.
+
+    Skewed amounts and counts are log-scaled; the trend slope keeps its sign.
+
+    Args:
+        rfm_data: Frame containing FEATURE_COLUMNS
+
+    Returns:
+        Float matrix with one row per customer and one column per feature
+    """
+    columns = []
+    for column in FEATURE_COLUMNS:
+        values = pd.to_numeric(rfm_data[column], errors='coerce').fillna(0.0).to_numpy(dtype='float64')
+        if column == 'trend_slope':
+            values = np.sign(values) * np.log1p(np.abs(values))
+        elif column != 'months_active':
+            values = np.log1p(np.clip(values, 0, None))
+        columns.append(values)
+    return np.column_stack(columns)
+
+
+def sigmoid(z: np.ndarray) -> np.ndarray:
+    """Numerically stable logistic function."""
+    return np.exp(-np.logaddexp(0, -z))
+
+
+@dataclass
+class ChurnModel:
+    """Standardized logistic regression over the churn features."""
+    feature_names: List[str] = field(default_factory=lambda: list(FEATURE_COLUMNS))
+    means: List[float] = field(default_factory=list)
+    scales: List[float] = field(default_factory=list)
+    coefficients: List[float] = field(default_factory=list)
+    intercept: float = 0.0
+    horizon_days: int = DEFAULT_HORIZON_DAYS
+    trained_at: Optional[str] = None
+    metrics: Dict = field(default_factory=dict)
+
+    def decision(self, features: np.ndarray) -> np.ndarray:
+        """Linear score of a feature matrix."""
+        standardized = (features - np.asarray(self.means)) / np.asarray(self.scales)
+        return standardized @ np.asarray(self.coefficients) + self.intercept
+
+    def predict_proba(self, rfm_data: pd.DataFrame) -> np.ndarray:
+        """
+        Probability that each customer does not buy within the horizon.
+
+        Args:
+            rfm_data: Frame containing FEATURE_COLUMNS
+
+        Returns:
+            Churn probability per row
+        """
+        return sigmoid(self.decision(churn_features(rfm_data)))
+
+    def save(self, path) -> None:
+        """Write the model as JSON."""
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(asdict(self), f, indent=2)
+
+    @classmethod
+    def load(cls, path) -> 'ChurnModel':
+        """Read a model written by save()."""
+        with open(path) as f:
+            return cls(**json.load(f))
+
+
+def fit_logistic_regression(features: np.ndarray, labels: np.ndarray, l2_penalty: float = DEFAULT_L2_PENALTY,
+                            max_iterations: int = 50, tolerance: float = 1e-8) -> ChurnModel:
+    """
+    Fit an L2-regularized logistic regression with Newton's method.
+
+    Args:
+        features: Feature matrix (rows are examples)
+        labels: 1 for churned, 0 for retained
+        l2_penalty: Ridge penalty on the standardized coefficients (the intercept is not penalized)
+        max_iterations: Newton step limit
+        tolerance: Stop when the largest step falls below this
+
+    Returns:
+        ChurnModel with standardization and fitted coefficients
+    """
+    means = features.mean(axis=0)
+    scales = features.std(axis=0)
+    scales[scales == 0] = 1.0
+    design = np.column_stack([np.ones(len(features)), (features - means) / scales])
+
+    penalty = np.full(design.shape[1], l2_penalty)
+    penalty[0] = 0.0
+    weights = np.zeros(design.shape[1])
+    for _ in range(max_iterations):
+        probabilities = sigmoid(design @ weights)
+        gradient = design.T @ (probabilities - labels) + penalty * weights
+        hessian = (design * (probabilities * (1 - probabilities))[:, None]).T @ design + np.diag(penalty)
+        step = np.linalg.solve(hessian, gradient)
+        weights -= step
+        if np.abs(step).max() < tolerance:
+            break
+
+    return ChurnModel(means=means.tolist(), scales=scales.tolist(),
+                      coefficients=weights[1:].tolist(), intercept=float(weights[0]))
+
+
+def roc_auc(labels: np.ndarray, scores: np.ndarray) -> Optional[float]:
+    """Area under the ROC curve from score ranks (None when only one class is present)."""
+    positives = int(labels.sum())
+    negatives = len(labels) - positives
+    if positives == 0 or negatives == 0:
+        return None
+    ranks = pd.Series(scores).rank().to_numpy()
+    return float((ranks[labels == 1].sum() - positives * (positives + 1) / 2) / (positives * negatives))
+
+
+def build_training_set(sales_df: pd.DataFrame, horizon_days: int = DEFAULT_HORIZON_DAYS,
+                       snapshots: int = DEFAULT_SNAPSHOTS) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Build labelled examples by replaying the history at several as-of dates.
+
+    The latest as-of date is one horizon before the last transaction, so every label
+    window is fully observed; earlier as-of dates step back one horizon at a time.
+    Recency is measured from the as-of date, the exclusive end of the history, just as
+    scoring measures it from the day after the last transaction.
+
+    Args:
+        sales_df: Preprocessed sales transactions
+        horizon_days: Days after the as-of date in which a purchase counts as retained
+        snapshots: Number of as-of dates
+
+    Returns:
+        Tuple of (feature matrix, churn labels, snapshot number per example; 0 is the latest)
+    """
+    from .rfm_service import aggregate_customer_metrics, calculate_customer_trends
+
+    horizon = pd.Timedelta(days=horizon_days)
+    last_date = sales_df['date'].max()
+    features, labels, snapshot_ids = [], [], []
+    for snapshot in range(snapshots):
+        as_of = last_date - horizon * (snapshot + 1)
+        history = sales_df[sales_df['date'] < as_of]
+        if history.empty:
+            break
+        rfm_data, _ = aggregate_customer_metrics(history)
+        # Not from the history's last transaction: a quiet spell before as_of is part of recency
+        rfm_data['recency_days'] = (as_of - rfm_data['last_sale_date']).dt.days
+        rfm_data['avg_transaction_spend'] = rfm_data['monetary'] / rfm_data['frequency']
+        rfm_data = calculate_customer_trends(rfm_data, history)
+
+        future = sales_df['date'].between(as_of, as_of + horizon, inclusive='left')
+        returned = rfm_data['customer_code'].isin(sales_df['customer_code'][future])
+        features.append(churn_features(rfm_data))
+        labels.append((~returned).to_numpy(dtype='float64'))
+        snapshot_ids.append(np.full(len(rfm_data), snapshot))
+        logger.info(f"As of {as_of.date()}: {len(rfm_data)} customers, {int((~returned).sum())} churned within {horizon_days} days")
+
+    if not features:
+        raise ValueError("Not enough transaction history to build churn training examples")
+    return np.vstack(features), np.concatenate(labels), np.concatenate(snapshot_ids)
+
+
+def train_churn_model(sales_df: pd.DataFrame, horizon_days: int = DEFAULT_HORIZON_DAYS,
+                      snapshots: int = DEFAULT_SNAPSHOTS, l2_penalty: float = DEFAULT_L2_PENALTY) -> ChurnModel:
+    """
+    Train the churn model on the transaction history.
+
+    When there are at least two as-of dates, the latest one is first held out to
+    measure AUC; the returned model is refitted on all of them.
+
+    Args:
+        sales_df: Preprocessed sales transactions
+        horizon_days: Churn horizon in days
+        snapshots: Number of as-of dates to replay
+        l2_penalty: Ridge penalty
+
+    Returns:
+        Fitted ChurnModel with training metrics
+    """
+    features, labels, snapshot_ids = build_training_set(sales_df, horizon_days, snapshots)
+
+    metrics = {'examples': int(len(labels)), 'churn_rate': round(float(labels.mean()), 4)}
+    if snapshot_ids.max() > 0:
+        holdout = snapshot_ids == 0
+        holdout_model = fit_logistic_regression(features[~holdout], labels[~holdout], l2_penalty)
+        auc = roc_auc(labels[holdout], holdout_model.decision(features[holdout]))
+        metrics['holdout_auc'] = None if auc is None else round(auc, 4)
+
+    model = fit_logistic_regression(features, labels, l2_penalty)
+    auc = roc_auc(labels, model.decision(features))
+    metrics['training_auc'] = None if auc is None else round(auc, 4)
+    model.horizon_days = horizon_days
+    model.trained_at = datetime.now().isoformat(timespec='seconds')
+    model.metrics = metrics
+    logger.info(f"Trained churn model: {metrics}")
+    return model
+
+
+@lru_cache(maxsize=4)
+def _load_model(path: str, mtime_ns: int) -> ChurnModel:
+    # Keyed on the modification time so a retrained model is picked up
+    return ChurnModel.load(path)
+
+
+def get_churn_model(path=None) -> Optional[ChurnModel]:
+    """
+    Return the persisted churn model, or None if none has been trained.
+
+    Args:
+        path: Model file (defaults to CHURN_MODEL_PATH)
+    """
+    path = Path(path or CHURN_MODEL_PATH)
+    try:
+        mtime_ns = path.stat().st_mtime_ns
+    except OSError:
+        return None
+    return _load_model(str(path), mtime_ns)
+
+
+def add_churn_probability(rfm_data: pd.DataFrame, model: Optional[ChurnModel] = None) -> pd.DataFrame:
+    """
+    Score churn probabilities for a scored RFM frame in batch.
+
+    Args:
+        rfm_data: Frame containing FEATURE_COLUMNS
+        model: Model to apply (defaults to the persisted model)
+
+    Returns:
+        Frame with a churn_probability column, or unchanged if no model has been trained
+    """
+    model = model or get_churn_model()
+    if model is None:
+        return rfm_data
+    rfm_data['churn_probability'] = model.predict_proba(rfm_data).round(4)
+    return rfm_data
+
+
+def main(argv=None) -> None:
+    """Train the churn model on the current source files and persist it."""
+    from .rfm_service import load_data, preprocess_data
+
+    parser = argparse.ArgumentParser(description="Train the churn-risk model on the RFM transaction history.")
+    parser.add_argument('--horizon-days', type=int, default=DEFAULT_HORIZON_DAYS,
+                        help="A customer has churned if they do not buy within this many days")
+    parser.add_argument('--snapshots', type=int, default=DEFAULT_SNAPSHOTS, help="Number of as-of dates to replay")
+    parser.add_argument('--l2-penalty', type=float, default=DEFAULT_L2_PENALTY, help="Ridge penalty")
+    parser.add_argument('--output', default=str(CHURN_MODEL_PATH), help="Model file to write")
+    args = parser.parse_args(argv)
+
+    _, sales_df = preprocess_data(*load_data())
+    model = train_churn_model(sales_df, args.horizon_days, args.snapshots, args.l2_penalty)
+    model.save(args.output)
+    print(f"Churn model written to {args.output}: {json.dumps(model.metrics)}")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
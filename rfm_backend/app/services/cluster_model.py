@@ -0,0 +1,266 @@
+"""
+Cluster Segmentation Module
+
+This module assigns data-driven clusters next to the rule-based RFM segments, so
+the two schemes can be compared on the same customers. Customers are described by
+log-scaled recency, frequency and monetary value and their spend trend, and are
+clustered with mini-batch k-means in NumPy: centroids are seeded with k-means++ on
+a sample and then updated from small batches drawn chunk by chunk, so fitting costs
+the same for a thousand customers or millions; only the final assignment touches
+every customer, one block at a time. The number of clusters is the k in
+CLUSTER_K_RANGE with the best silhouette on a sample.
+
+Clustering is off unless CLUSTERING_ENABLED is set. Cluster ids are ordered by
+centroid monetary value, so cluster 0 is always the highest-value group.
+"""
+
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from ..core.config import CLUSTER_K_RANGE, CLUSTERING_ENABLED
+
+logger = logging.getLogger(__name__)
+
+# Per-customer columns the clustering reads from the scored RFM frame
+FEATURE_COLUMNS = ['recency_days', 'frequency', 'monetary', 'trend_slope', 'trend_cv']
+
+# Mini-batch k-means settings
+BATCH_SIZE = 1024
+MAX_BATCHES = 200
+CHUNK_SIZE = 262_144
+SILHOUETTE_SAMPLE = 2000
+RANDOM_SEED = 49
+
+
+def cluster_features(rfm_data: pd.DataFrame) -> np.ndarray:
+    """
+    Build the standardized clustering features from per-customer RFM columns.
+
+    Skewed amounts and counts are log-scaled; the trend slope keeps its sign.
+    Missing columns and values count as 0.
+
+    Args:
+        rfm_data: Scored RFM frame
+
+    Returns:
+        Float matrix with one row per customer and one column per feature
+    """
+    columns = []
+    for column in FEATURE_COLUMNS:
+        if column not in rfm_data.columns:
+            continue
+        values = pd.to_numeric(rfm_data[column], errors='coerce').fillna(0.0).to_numpy(dtype='float64')
+        if column == 'trend_slope':
+            values = np.sign(values) * np.log1p(np.abs(values))
+        else:
+            values = np.log1p(np.clip(values, 0, None))
+        columns.append(values)
+    features = np.column_stack(columns) if columns else np.zeros((len(rfm_data), 0))
+    scale = features.std(axis=0) if len(features) else np.ones(features.shape[1])
+    scale[~(scale > 0)] = 1.0
+    return (features - features.mean(axis=0)) / scale
+
+
+def squared_distances(points: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Squared Euclidean distances between every point and every centroid."""
+    distances = (np.einsum('ij,ij->i', points, points)[:, None] - 2.0 * points @ centroids.T
+                 + np.einsum('ij,ij->i', centroids, centroids)[None, :])
+    return np.maximum(distances, 0.0)
+
+
+def assign_clusters(features: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """
+    Assign every customer to its nearest centroid, one chunk at a time.
+
+    Args:
+        features: Standardized features
+        centroids: Cluster centroids
+
+    Returns:
+        Index of the nearest centroid per customer
+    """
+    labels = np.empty(len(features), dtype=np.int64)
+    for start in range(0, len(features), CHUNK_SIZE):
+        labels[start:start + CHUNK_SIZE] = squared_distances(features[start:start + CHUNK_SIZE], centroids).argmin(axis=1)
+    return labels
+
+
+def kmeans_plus_plus(points: np.ndarray, k: int, rng: np.random.Generator) -> np.ndarray:
+    """Seed k centroids from points, each drawn with probability proportional to its squared distance."""
+    centroids = [points[rng.integers(len(points))]]
+    closest = squared_distances(points, np.array(centroids))[:, 0]
+    for _ in range(1, k):
+        total = closest.sum()
+        choice = rng.choice(len(points), p=closest / total) if total > 0 else rng.integers(len(points))
+        centroids.append(points[choice])
+        closest = np.minimum(closest, squared_distances(points, points[choice][None, :])[:, 0])
+    return np.array(centroids)
+
+
+def mini_batch_kmeans(features: np.ndarray, k: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Fit k centroids with mini-batch k-means.
+
+    Each batch is drawn from one chunk of the data; every centroid moves towards the
+    batch points assigned to it with a per-centroid learning rate of 1 / points seen.
+
+    Args:
+        features: Standardized features
+        k: Number of clusters
+        rng: Random generator
+
+    Returns:
+        Array of shape (k, features)
+    """
+    seed_points = features[rng.choice(len(features), min(len(features), max(10 * k, BATCH_SIZE)), replace=False)]
+    centroids = kmeans_plus_plus(seed_points, k, rng)
+    seen = np.zeros(k)
+
+    n_chunks = -(-len(features) // CHUNK_SIZE)
+    n_batches = min(MAX_BATCHES, max(10, 10 * -(-len(features) // BATCH_SIZE)))
+    for batch_number in range(n_batches):
+        start = (batch_number % n_chunks) * CHUNK_SIZE
+        chunk = features[start:start + CHUNK_SIZE]
+        batch = chunk[rng.integers(0, len(chunk), min(BATCH_SIZE, len(chunk)))]
+
+        labels = squared_distances(batch, centroids).argmin(axis=1)
+        members = labels[None, :] == np.arange(k)[:, None]
+        counts = members.sum(axis=1)
+        sums = members @ batch
+        # Averaging the per-point updates of a batch gives the same step as applying them in turn
+        seen += counts
+        hit = counts > 0
+        centroids[hit] += (sums[hit] - counts[hit, None] * centroids[hit]) / seen[hit, None]
+    return centroids
+
+
+def silhouette_score(points: np.ndarray, labels: np.ndarray) -> float:
+    """
+    Mean silhouette of a labelled sample.
+
+    Args:
+        points: Sample of standardized features
+        labels: Cluster of each sample point
+
+    Returns:
+        Mean silhouette in [-1, 1]; points alone in their cluster count as 0
+    """
+    clusters, labels = np.unique(labels, return_inverse=True)
+    if len(clusters) < 2:
+        return -1.0
+    distances = np.sqrt(squared_distances(points, points))
+    sizes = np.bincount(labels)
+    # Mean distance from each point to each cluster, excluding the point itself from its own
+    totals = distances @ (labels[:, None] == np.arange(len(clusters))[None, :])
+    own = totals[np.arange(len(points)), labels] / np.maximum(sizes[labels] - 1, 1)
+    totals[np.arange(len(points)), labels] = np.inf
+    nearest = (totals / sizes[None, :]).min(axis=1)
+    silhouette = np.where(sizes[labels] > 1, (nearest - own) / np.maximum(np.maximum(own, nearest), 1e-12), 0.0)
+    return float(silhouette.mean())
+
+
+@dataclass
+class ClusterModel:
+    """Centroids of the chosen clustering and the silhouette of each candidate k."""
+    centroids: np.ndarray = field(default_factory=lambda: np.zeros((0, 0)))
+    silhouettes: Dict[int, float] = field(default_factory=dict)
+
+    @property
+    def k(self) -> int:
+        return len(self.centroids)
+
+
+def fit_clusters(features: np.ndarray, k_range: List[int] = CLUSTER_K_RANGE,
+                 seed: int = RANDOM_SEED) -> Optional[ClusterModel]:
+    """
+    Fit mini-batch k-means for each candidate k and keep the one with the best silhouette.
+
+    Args:
+        features: Standardized features
+        k_range: Candidate numbers of clusters
+        seed: Random seed, so the same data gives the same clusters
+
+    Returns:
+        ClusterModel, or None if there are too few customers to cluster
+    """
+    candidates = [k for k in k_range if 2 <= k < len(features)]
+    if not candidates:
+        return None
+    rng = np.random.default_rng(seed)
+    sample = features[rng.choice(len(features), min(len(features), SILHOUETTE_SAMPLE), replace=False)]
+
+    best = ClusterModel()
+    best_score = -np.inf
+    for k in candidates:
+        centroids = mini_batch_kmeans(features, k, rng)
+        score = silhouette_score(sample, assign_clusters(sample, centroids))
+        best.silhouettes[k] = round(score, 4)
+        if score > best_score:
+            best_score, best.centroids = score, centroids
+    return best
+
+
+def add_cluster_ids(rfm_data: pd.DataFrame, k_range: Optional[List[int]] = None) -> pd.DataFrame:
+    """
+    Add a cluster_id column to a scored RFM frame.
+
+    Args:
+        rfm_data: Scored RFM frame
+        k_range: Candidate numbers of clusters (defaults to CLUSTER_K_RANGE)
+
+    Returns:
+        Frame with a cluster_id column, or unchanged if clustering is disabled
+        or there are too few customers
+    """
+    if k_range is None:
+        if not CLUSTERING_ENABLED:
+            return rfm_data
+        k_range = CLUSTER_K_RANGE
+    features = cluster_features(rfm_data)
+    model = fit_clusters(features, k_range)
+    if model is None:
+        return rfm_data
+
+    labels = assign_clusters(features, model.centroids)
+    # Number clusters by mean monetary value, highest first, so ids are stable across runs
+    monetary = pd.to_numeric(rfm_data['monetary'], errors='coerce').fillna(0.0).to_numpy(dtype='float64')
+    value = np.bincount(labels, weights=monetary, minlength=model.k) / np.maximum(np.bincount(labels, minlength=model.k), 1)
+    rank = np.empty(model.k, dtype=np.int64)
+    rank[np.argsort(-value, kind='stable')] = np.arange(model.k)
+    rfm_data['cluster_id'] = rank[labels]
+    logger.info(f"Assigned {model.k} clusters to {len(rfm_data)} customers (silhouette by k: {model.silhouettes}).")
+    return rfm_data
+
+
+def cluster_summary(rfm_data: pd.DataFrame) -> List[Dict]:
+    """
+    Summarize each cluster and its mix of rule-based segments.
+
+    Args:
+        rfm_data: RFM frame with cluster_id and segment columns
+
+    Returns:
+        One dict per cluster with its size, median recency, frequency and monetary value,
+        and customer counts per segment
+    """
+    if 'cluster_id' not in rfm_data.columns:
+        return []
+    grouped = rfm_data.groupby('cluster_id', sort=True)
+    medians = grouped[['recency_days', 'frequency', 'monetary']].median()
+    mix = pd.crosstab(rfm_data['cluster_id'], rfm_data['segment']) if 'segment' in rfm_data.columns else None
+    summary = []
+    for cluster_id, size in grouped.size().items():
+        segments = {} if mix is None else {segment: int(count) for segment, count in mix.loc[cluster_id].items() if count}
+        summary.append({
+            'cluster_id': int(cluster_id),
+            'customer_count': int(size),
+            'median_recency_days': float(medians.at[cluster_id, 'recency_days']),
+            'median_frequency': float(medians.at[cluster_id, 'frequency']),
+            'median_monetary': round(float(medians.at[cluster_id, 'monetary']), 2),
+            'segments': dict(sorted(segments.items(), key=lambda item: -item[1])),
+        })
+    return summary
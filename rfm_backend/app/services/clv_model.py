@@ -0,0 +1,356 @@
+"""
+Customer Lifetime Value Module
+
+This module projects customer lifetime value from the per-customer RFM metrics.
+Purchase counts follow a BG/NBD model (Poisson purchasing while active, a
+geometric chance of dropping out after each purchase) and spend per transaction a
+Gamma-Gamma model; both likelihoods are evaluated over all customers at once and
+maximized in log-parameter space, bounded and lightly penalized so flat directions
+of the likelihood cannot drift to degenerate values. SciPy is used for the special
+functions and the optimizer when it is installed; it is optional, and the NumPy
+fallbacks are checked against closed forms in tests/test_clv_model.py. Fitted
+parameters and projections are cached per data version.
+
+Model inputs per customer, in weeks:
+    x   repeat transactions (frequency - 1)
+    t_x time from the first to the last purchase
+    T   time from the first purchase to the reference date (tenure)
+    m   average transaction spend
+"""
+
+import logging
+import importlib
+import math
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .data_cache import get_cached, get_or_build
+from .refresh_scheduler import register_warmer
+from .rfm_service import get_data_version, get_rfm_data
+
+logger = logging.getLogger(__name__)
+
+DAYS_PER_WEEK = 7.0
+WEEKS_PER_MONTH = 365.25 / 12 / DAYS_PER_WEEK
+
+# Default projection horizon
+DEFAULT_HORIZON_MONTHS = 12
+
+# Fitting: parameters are optimized as logs kept within +/- LOG_PARAM_BOUND, with a small L2
+# penalty on the logs so flat likelihood directions cannot drift to degenerate values
+LOG_PARAM_BOUND = 12.0
+LOG_PARAM_PENALTY = 1e-3
+MAX_ITERATIONS = 1000
+RELATIVE_TOLERANCE = 1e-9
+
+
+@lru_cache(maxsize=None)
+def _scipy(name: str):
+    """Import a SciPy submodule on first use; None when SciPy is not installed (it is optional)."""
+    try:
+        return importlib.import_module(f"scipy.{name}")
+    except ImportError:
+        return None
+
+
+def gammaln(values) -> np.ndarray:
+    """
+    Log-gamma of an array.
+
+    Without SciPy, math.lgamma is applied to the distinct values only; the
+    arguments here are a few parameters shifted by small integer counts, so there
+    are far fewer distinct values than customers.
+    """
+    values = np.asarray(values, dtype='float64')
+    special = _scipy('special')
+    if special is not None:
+        return special.gammaln(values)
+    uniques, inverse = np.unique(values, return_inverse=True)
+    return np.array([math.lgamma(value) for value in uniques])[inverse].reshape(values.shape)
+
+
+def hyp2f1(a, b, c, z, max_terms: int = 5000, tolerance: float = 1e-12) -> np.ndarray:
+    """
+    Gauss hypergeometric function 2F1(a, b; c; z) for 0 <= z < 1, element-wise.
+
+    Without SciPy the power series is summed for all elements together until every
+    term is negligible.
+    """
+    a, b, c, z = np.broadcast_arrays(*(np.asarray(v, dtype='float64') for v in (a, b, c, z)))
+    special = _scipy('special')
+    if special is not None:
+        return special.hyp2f1(a, b, c, z)
+    term = np.ones(z.shape)
+    total = np.ones(z.shape)
+    for k in range(max_terms):
+        term = term * (a + k) * (b + k) / ((c + k) * (k + 1)) * z
+        total += term
+        if np.all(np.abs(term) <= tolerance * np.abs(total)):
+            break
+    return total
+
+
+def nelder_mead(objective: Callable[[np.ndarray], float], x0: np.ndarray, max_iterations: int = MAX_ITERATIONS,
+                tolerance: float = RELATIVE_TOLERANCE, step: float = 0.5) -> np.ndarray:
+    """
+    Minimize a function with the Nelder-Mead simplex method.
+
+    Uses scipy.optimize.minimize when SciPy is installed.
+
+    Args:
+        objective: Function of a parameter vector
+        x0: Starting point
+        max_iterations: Iteration limit
+        tolerance: Stop when the simplex's function values differ by less than this,
+            relative to the best value, and its points by less than this times 1000
+        step: Size of the initial simplex along each axis
+
+    Returns:
+        Parameter vector at the minimum found
+    """
+    x0 = np.asarray(x0, dtype='float64')
+    n = len(x0)
+    simplex = np.vstack([x0] + [x0 + np.eye(n)[i] * step for i in range(n)])
+    optimize = _scipy('optimize')
+    if optimize is not None:
+        start_value = objective(x0)
+        scale = max(1.0, abs(start_value)) if np.isfinite(start_value) else 1.0
+        result = optimize.minimize(objective, x0, method='Nelder-Mead',
+                                   options={'maxiter': max_iterations, 'initial_simplex': simplex,
+                                            'xatol': tolerance * 1000, 'fatol': tolerance * scale})
+        return result.x
+
+    values = np.array([objective(point) for point in simplex])
+    for _ in range(max_iterations):
+        order = np.argsort(values)
+        simplex, values = simplex[order], values[order]
+        if (values[-1] - values[0] <= tolerance * max(1.0, abs(values[0]))
+                and np.abs(simplex[1:] - simplex[0]).max() <= tolerance * 1000):
+            break
+        centroid = simplex[:-1].mean(axis=0)
+        reflected = centroid + (centroid - simplex[-1])
+        reflected_value = objective(reflected)
+        if reflected_value < values[0]:
+            expanded = centroid + 2 * (centroid - simplex[-1])
+            expanded_value = objective(expanded)
+            if expanded_value < reflected_value:
+                simplex[-1], values[-1] = expanded, expanded_value
+            else:
+                simplex[-1], values[-1] = reflected, reflected_value
+        elif reflected_value < values[-2]:
+            simplex[-1], values[-1] = reflected, reflected_value
+        else:
+            contracted = centroid + 0.5 * (simplex[-1] - centroid)
+            contracted_value = objective(contracted)
+            if contracted_value < values[-1]:
+                simplex[-1], values[-1] = contracted, contracted_value
+            else:
+                # Shrink towards the best point
+                simplex[1:] = simplex[0] + 0.5 * (simplex[1:] - simplex[0])
+                values[1:] = [objective(point) for point in simplex[1:]]
+    return simplex[np.argmin(values)]
+
+
+def bgnbd_log_likelihood(params: np.ndarray, x: np.ndarray, t_x: np.ndarray, T: np.ndarray) -> np.ndarray:
+    """
+    Per-customer BG/NBD log-likelihood (Fader, Hardie & Lee, 2005).
+
+    Args:
+        params: r, alpha, a, b
+        x, t_x, T: Repeat transactions, time of last purchase and tenure per customer
+
+    Returns:
+        Log-likelihood of each customer's purchase history
+    """
+    r, alpha, a, b = params
+    a1 = gammaln(r + x) - gammaln(r) + r * np.log(alpha)
+    a2 = gammaln(a + b) + gammaln(b + x) - gammaln(b) - gammaln(a + b + x)
+    a3 = -(r + x) * np.log(alpha + T)
+    repeat = x > 0
+    a4 = np.full(len(x), -np.inf)
+    a4[repeat] = (np.log(a) - np.log(b + x[repeat] - 1)
+                  - (r + x[repeat]) * np.log(alpha + t_x[repeat]))
+    return a1 + a2 + np.logaddexp(a3, a4)
+
+
+def gamma_gamma_log_likelihood(params: np.ndarray, x: np.ndarray, m: np.ndarray) -> np.ndarray:
+    """
+    Per-customer Gamma-Gamma log-likelihood of average spend (Fader & Hardie, 2013).
+
+    Args:
+        params: p, q, gamma
+        x, m: Number of transactions and average spend per customer
+
+    Returns:
+        Log-likelihood of each customer's average spend
+    """
+    p, q, gamma = params
+    px = p * x
+    return (gammaln(px + q) - gammaln(px) - gammaln(q) + q * np.log(gamma)
+            + (px - 1) * np.log(m) + px * np.log(x) - (px + q) * np.log(gamma + x * m))
+
+
+def fit_log_params(log_likelihood: Callable[[np.ndarray], np.ndarray], start: np.ndarray,
+                   penalty: float = LOG_PARAM_PENALTY) -> np.ndarray:
+    """
+    Maximize a log-likelihood over positive parameters, optimizing their logs.
+
+    The objective is the mean negative log-likelihood per customer plus an L2 penalty
+    on the log-parameters, so its scale does not depend on the number of customers;
+    logs outside +/- LOG_PARAM_BOUND are rejected.
+
+    Args:
+        log_likelihood: Per-customer log-likelihood of a parameter vector
+        start: Starting parameters (positive)
+        penalty: L2 penalty on the log-parameters
+
+    Returns:
+        Fitted parameters
+    """
+    def objective(log_params):
+        if np.any(np.abs(log_params) > LOG_PARAM_BOUND):
+            return np.inf
+        mean = log_likelihood(np.exp(log_params)).mean()
+        return -mean + penalty * float(log_params @ log_params) if np.isfinite(mean) else np.inf
+    return np.exp(nelder_mead(objective, np.log(np.asarray(start, dtype='float64'))))
+
+
+def clv_inputs(rfm_data: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """Convert RFM columns into the model inputs (in weeks)."""
+    frequency = pd.to_numeric(rfm_data['frequency'], errors='coerce').fillna(1).to_numpy(dtype='float64')
+    tenure_days = pd.to_numeric(rfm_data['tenure_days'], errors='coerce').fillna(0).to_numpy(dtype='float64')
+    recency_days = pd.to_numeric(rfm_data['recency_days'], errors='coerce').fillna(0).to_numpy(dtype='float64')
+    return {
+        'x': np.clip(frequency - 1, 0, None),
+        't_x': np.clip(tenure_days - recency_days, 0, None) / DAYS_PER_WEEK,
+        'T': tenure_days / DAYS_PER_WEEK,
+        'm': pd.to_numeric(rfm_data['avg_transaction_spend'], errors='coerce').fillna(0).to_numpy(dtype='float64'),
+    }
+
+
+@dataclass
+class CLVModel:
+    """Fitted BG/NBD and Gamma-Gamma parameters."""
+    bgnbd: Dict[str, float] = field(default_factory=dict)
+    gamma_gamma: Dict[str, float] = field(default_factory=dict)
+
+    def expected_purchases(self, weeks: float, x: np.ndarray, t_x: np.ndarray, T: np.ndarray) -> np.ndarray:
+        """Expected transactions in the next `weeks` given each customer's history."""
+        r, alpha, a, b = (self.bgnbd[name] for name in ('r', 'alpha', 'a', 'b'))
+        z = weeks / (alpha + T + weeks)
+        hypergeometric = hyp2f1(r + x, b + x, a + b + x - 1, z)
+        numerator = (a + b + x - 1) / (a - 1) * (1 - ((alpha + T) / (alpha + T + weeks)) ** (r + x) * hypergeometric)
+        # In log space, so long-lapsed frequent buyers give an overwhelming (not overflowing) dropout weight
+        log_lapse = np.minimum((r + x) * (np.log(alpha + T) - np.log(alpha + t_x)), 700.0)
+        still_active = 1 + (x > 0) * a / (b + x - 1 + (x == 0)) * np.exp(log_lapse)
+        return numerator / still_active
+
+    def expected_average_value(self, x: np.ndarray, m: np.ndarray) -> np.ndarray:
+        """Expected spend per future transaction, shrinking each customer's average towards the population mean."""
+        p, q, gamma = (self.gamma_gamma[name] for name in ('p', 'q', 'gamma'))
+        return p * (gamma + x * m) / (p * x + q - 1)
+
+
+def fit_clv_model(rfm_data: pd.DataFrame) -> CLVModel:
+    """
+    Fit the BG/NBD and Gamma-Gamma models on the scored RFM dataset.
+
+    Args:
+        rfm_data: RFM dataset with frequency, recency_days, tenure_days and avg_transaction_spend
+
+    Returns:
+        CLVModel with fitted parameters
+    """
+    inputs = clv_inputs(rfm_data)
+    x, t_x, T, m = inputs['x'], inputs['t_x'], inputs['T'], inputs['m']
+    # Start from a purchase rate r / alpha matching the average repeat rate
+    rate = max(x.sum(), 1.0) / max(T.sum(), 1.0)
+    r, alpha, a, b = fit_log_params(lambda params: bgnbd_log_likelihood(params, x, t_x, T),
+                                    [1.0, 1.0 / rate, 1.0, 1.0])
+
+    # Gamma-Gamma uses customers with repeat purchases and positive spend. Spend is fitted in
+    # units of its mean, so gamma (which scales with the currency) starts and stays near 1.
+    spenders = (x > 0) & (m > 0)
+    spend_scale = float(m[spenders].mean()) if spenders.any() else 1.0
+    p, q, gamma = fit_log_params(
+        lambda params: gamma_gamma_log_likelihood(params, x[spenders] + 1, m[spenders] / spend_scale),
+        [1.0, 2.0, 1.0])
+    gamma *= spend_scale
+
+    model = CLVModel(bgnbd={'r': r, 'alpha': alpha, 'a': a, 'b': b}, gamma_gamma={'p': p, 'q': q, 'gamma': gamma})
+    logger.info(f"Fitted CLV model on {len(x)} customers: BG/NBD {model.bgnbd}, Gamma-Gamma {model.gamma_gamma}")
+    return model
+
+
+def project_clv(model: CLVModel, rfm_data: pd.DataFrame, months: int = DEFAULT_HORIZON_MONTHS) -> pd.DataFrame:
+    """
+    Project each customer's purchases and value over the coming months.
+
+    Args:
+        model: Fitted CLVModel
+        rfm_data: RFM dataset with the model's input columns and segment
+        months: Projection horizon
+
+    Returns:
+        DataFrame with customer_code, segment, expected_purchases, expected_avg_value and projected_value
+    """
+    inputs = clv_inputs(rfm_data)
+    purchases = model.expected_purchases(months * WEEKS_PER_MONTH, inputs['x'], inputs['t_x'], inputs['T'])
+    average_value = model.expected_average_value(inputs['x'] + 1, inputs['m'])
+    return pd.DataFrame({
+        'customer_code': rfm_data['customer_code'].to_numpy(),
+        'segment': rfm_data['segment'].to_numpy() if 'segment' in rfm_data.columns else None,
+        'expected_purchases': purchases.round(3),
+        'expected_avg_value': average_value.round(2),
+        'projected_value': (purchases * average_value).round(2),
+    })
+
+
+def summarize_segments(projection: pd.DataFrame) -> List[Dict]:
+    """Total and average projected value per segment."""
+    summary = projection.groupby('segment').agg(
+        customer_count=('customer_code', 'count'),
+        projected_value=('projected_value', 'sum'),
+        avg_projected_value=('projected_value', 'mean'),
+        expected_purchases=('expected_purchases', 'sum'),
+    ).round(2).reset_index()
+    return summary.sort_values('projected_value', ascending=False).to_dict('records')
+
+
+@dataclass
+class CLVResult:
+    """Fitted model and 12-month projections for one data version."""
+    model: CLVModel
+    customers: pd.DataFrame
+    segments: List[Dict]
+
+
+def compute_clv() -> CLVResult:
+    """Fit the CLV model on the current RFM dataset and project every customer."""
+    rfm_data = get_rfm_data()
+    model = fit_clv_model(rfm_data)
+    projection = project_clv(model, rfm_data)
+    return CLVResult(model=model, customers=projection, segments=summarize_segments(projection))
+
+
+def get_clv() -> CLVResult:
+    """
+    Return the CLV projections for the current data version, fitting them if needed.
+    """
+    return get_or_build("clv", get_data_version(), compute_clv)
+
+
+def get_cached_clv() -> Optional[CLVResult]:
+    """
+    Return the CLV projections for the current data version only if they are already fitted.
+
+    Lets cheap endpoints show projections without paying for a cold fit.
+    """
+    return get_cached("clv", get_data_version())
+
+
+register_warmer(get_clv)
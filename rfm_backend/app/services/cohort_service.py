@@ -0,0 +1,120 @@
+"""
+Cohort Retention Service
+
+This module groups customers into acquisition cohorts by the month of their first
+purchase and builds cohort x months-since-acquisition matrices of active
+customers and revenue. Dates are reduced to integer month codes, so both
+matrices are filled by a single np.bincount over flattened (cohort, age) cells
+rather than nested groupbys. The result is cached per data version.
+"""
+
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from .data_cache import get_or_build
+from .refresh_scheduler import register_warmer
+from .rfm_service import get_data_version, load_preprocessed_sales
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CohortMatrix:
+    """Cohort x months-since-acquisition matrices; cells past the last observed month are NaN."""
+    cohorts: List[str] = field(default_factory=list)
+    cohort_sizes: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+    active_customers: np.ndarray = field(default_factory=lambda: np.zeros((0, 0)))
+    revenue: np.ndarray = field(default_factory=lambda: np.zeros((0, 0)))
+
+    @property
+    def retention_pct(self) -> np.ndarray:
+        """Share of each cohort active in each month since acquisition."""
+        sizes = self.cohort_sizes[:, None].astype('float64')
+        return np.divide(self.active_customers * 100, sizes, out=np.full(self.active_customers.shape, np.nan),
+                         where=sizes > 0).round(1)
+
+    def to_dict(self) -> Dict:
+        """JSON-ready representation with None for unobserved cells."""
+        def rows(matrix, decimals=2):
+            cells = pd.DataFrame(np.round(matrix, decimals))
+            return cells.astype(object).where(cells.notna(), None).values.tolist()
+        return {
+            'cohorts': self.cohorts,
+            'cohort_sizes': self.cohort_sizes.tolist(),
+            'active_customers': rows(self.active_customers, 0),
+            'retention_pct': rows(self.retention_pct, 1),
+            'revenue': rows(self.revenue),
+        }
+
+
+def build_cohort_matrix(sales_df: pd.DataFrame) -> CohortMatrix:
+    """
+    Build cohort retention and revenue matrices from transactions.
+
+    Args:
+        sales_df: Preprocessed sales with customer_code, date and amount
+
+    Returns:
+        CohortMatrix with one row per acquisition month and one column per month since acquisition
+    """
+    if sales_df.empty:
+        return CohortMatrix()
+
+    # Integer month codes relative to the first month in the data
+    dates = sales_df['date']
+    month_codes = (dates.dt.year * 12 + dates.dt.month).to_numpy(dtype=np.int64)
+    first_month = int(month_codes.min())
+    months = month_codes - first_month
+    n_months = int(months.max()) + 1
+
+    customers, _ = pd.factorize(sales_df['customer_code'])
+    n_customers = int(customers.max()) + 1
+    acquisition = np.full(n_customers, n_months, dtype=np.int64)
+    np.minimum.at(acquisition, customers, months)
+
+    # Every transaction falls in cell (cohort, months since acquisition)
+    cohort = acquisition[customers]
+    cells = cohort * n_months + (months - cohort)
+    n_cells = n_months * n_months
+    revenue = np.bincount(cells, weights=sales_df['amount'].to_numpy(dtype='float64'), minlength=n_cells)
+
+    # A customer counts once per active month: deduplicate (customer, month) before counting
+    customer_months = np.unique(customers * n_months + months)
+    active_cohort = acquisition[customer_months // n_months]
+    active_cells = active_cohort * n_months + (customer_months % n_months - active_cohort)
+    active = np.bincount(active_cells, minlength=n_cells).astype('float64')
+
+    active = active.reshape(n_months, n_months)
+    revenue = revenue.reshape(n_months, n_months)
+    # Cohort c has only been observed for n_months - c months
+    unobserved = np.arange(n_months)[:, None] + np.arange(n_months)[None, :] >= n_months
+    active[unobserved] = np.nan
+    revenue[unobserved] = np.nan
+
+    labels = [f"{(code - 1) // 12}-{(code - 1) % 12 + 1:02d}" for code in range(first_month, first_month + n_months)]
+    sizes = np.bincount(acquisition, minlength=n_months)
+
+    # Drop months in which nobody was acquired
+    has_customers = sizes > 0
+    matrix = CohortMatrix(
+        cohorts=[label for label, keep in zip(labels, has_customers) if keep],
+        cohort_sizes=sizes[has_customers],
+        active_customers=active[has_customers],
+        revenue=revenue[has_customers],
+    )
+    logger.info(f"Built cohort matrix for {n_customers} customers in {len(matrix.cohorts)} cohorts over {n_months} months.")
+    return matrix
+
+
+def get_cohort_matrix() -> CohortMatrix:
+    """
+    Return the cohort matrices for the current data version, building them if needed.
+    """
+    return get_or_build("cohorts", get_data_version(), lambda: build_cohort_matrix(load_preprocessed_sales()))
+
+
+register_warmer(get_cohort_matrix)
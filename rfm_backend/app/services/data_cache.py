@@ -0,0 +1,122 @@
+"""
+Data Version Cache Module
+
+This module keeps derived artifacts (the RFM frame, facet indexes, etc.) in memory
+keyed by the version of the source CSV files they were built from. An artifact is
+rebuilt only when the underlying data changes, so repeated API calls reuse the same
+result instead of re-running the full pipeline.
+
+The last CACHE_VERSIONS versions of each artifact are kept, so building a new version
+never evicts the one requests are still served from. While an artifact is built, the
+building thread's lookups of other artifacts resolve to the same data version
+(building_version()), so a dependent artifact is never built from a newer frame.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from .profiling import stage
+
+logger = logging.getLogger(__name__)
+
+# Versions kept per artifact: the one being served and the one being built
+CACHE_VERSIONS = 2
+
+# (artifact name) -> {data version: artifact}, oldest first
+_cache: Dict[str, "OrderedDict[Hashable, Any]"] = {}
+_lock = threading.Lock()
+# Per-artifact locks so concurrent callers wait for a single build
+_build_locks: Dict[str, threading.Lock] = {}
+# Data version of the artifact the current thread is building
+_building = threading.local()
+
+
+def building_version() -> Optional[Hashable]:
+    """Return the data version being built on this thread, or None outside a build."""
+    return getattr(_building, 'version', None)
+
+
+def _lookup(name: str, version: Hashable) -> Any:
+    """Return the cached artifact for a version or None; the caller holds _lock."""
+    return _cache.get(name, {}).get(version)
+
+
+def get_or_build(name: str, version: Optional[Hashable], builder: Callable[[], Any]) -> Any:
+    """
+    Return the cached artifact for the given data version, building it if needed.
+
+    Args:
+        name: Artifact name (e.g. "rfm", "facets")
+        version: Data version the artifact depends on; None disables caching
+        builder: Zero-argument callable producing the artifact
+
+    Returns:
+        The cached or freshly built artifact
+    """
+    if version is None:
+        return builder()
+
+    with _lock:
+        artifact = _lookup(name, version)
+        if artifact is not None:
+            return artifact
+        build_lock = _build_locks.setdefault(name, threading.Lock())
+
+    with build_lock:
+        # Another caller may have finished the build while we were waiting
+        with _lock:
+            artifact = _lookup(name, version)
+            if artifact is not None:
+                return artifact
+
+        outer_version = building_version()
+        _building.version = version
+        try:
+            with stage(f"build:{name}"):
+                artifact = builder()
+        finally:
+            _building.version = outer_version
+
+        with _lock:
+            versions = _cache.setdefault(name, OrderedDict())
+            versions[version] = artifact
+            while len(versions) > CACHE_VERSIONS:
+                versions.popitem(last=False)
+    logger.info(f"Built '{name}' artifact for data version {version}")
+    return artifact
+
+
+def get_cached(name: str, version: Optional[Hashable] = None) -> Any:
+    """
+    Return a cached artifact without building it.
+
+    Args:
+        name: Artifact name
+        version: Required data version; None returns the most recently built version
+
+    Returns:
+        The artifact, or None if it is missing or stale
+    """
+    with _lock:
+        versions = _cache.get(name)
+        if not versions:
+            return None
+        if version is None:
+            return next(reversed(versions.values()))
+        return versions.get(version)
+
+
+def invalidate(name: Optional[str] = None) -> None:
+    """
+    Drop one cached artifact, or all of them when no name is given.
+
+    Args:
+        name: Artifact name to drop, or None to clear the cache
+    """
+    with _lock:
+        if name is None:
+            _cache.clear()
+        else:
+            _cache.pop(name, None)
@@ -0,0 +1,252 @@
+"""
+Data Quality Profiler Module
+
+This module profiles the source CSV files in a single streaming pass over fixed-size
+chunks, so files of any size can be checked with bounded memory. For every column it
+tracks null counts, conformance with the dtypes documented in data_headers.json,
+numeric summaries (merged with Chan's parallel update) and approximate top values
+from a Misra-Gries heavy-hitters sketch. It also counts the quality issues that
+preprocess_data handles: negative amounts, invalid postcodes and sales records whose
+customer_code has no match in the customer file.
+
+The profiler is shared by the /api/data-quality endpoint and data_analyzer.py.
+"""
+
+import json
+import logging
+import math
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+from . import rfm_service
+from .data_cache import get_or_build
+from .refresh_scheduler import register_warmer
+from .rfm_service import find_invalid_postcodes, get_data_version, load_schema
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 100_000
+DEFAULT_TOP_K = 5
+
+NUMERIC_DTYPES = {'float64', 'float32', 'int64', 'int32', 'Int64', 'Int32'}
+
+
+class HeavyHitters:
+    """
+    Misra-Gries frequent-items sketch with batched, vectorized updates.
+
+    Holds at most `capacity` counters; every reported count is a lower bound that is
+    off by at most total / (capacity + 1), and counts are exact while the number of
+    distinct values stays within capacity.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.counters = pd.Series(dtype='int64')
+        self.total = 0
+
+    def update(self, values: pd.Series) -> None:
+        """Add the non-null values of one chunk to the sketch."""
+        chunk_counts = values.value_counts(dropna=True)
+        if chunk_counts.empty:
+            return
+        self.total += int(chunk_counts.sum())
+        merged = self.counters.add(chunk_counts, fill_value=0).astype('int64')
+        if len(merged) > self.capacity:
+            # Decrement every counter by the (capacity+1)-th largest count and drop the non-positive ones
+            threshold = merged.nlargest(self.capacity + 1).iloc[-1]
+            merged = merged - threshold
+            merged = merged[merged > 0]
+        self.counters = merged
+
+    def top(self, k: int) -> List[Dict]:
+        """Return the k most frequent values with their estimated counts."""
+        return [
+            {'value': str(value), 'count': int(count)}
+            for value, count in self.counters.nlargest(k).items()
+        ]
+
+
+class ColumnProfile:
+    """Streaming statistics for a single column."""
+
+    def __init__(self, name: str, declared_dtype: Optional[str], top_k: int):
+        self.name = name
+        self.declared_dtype = declared_dtype
+        self.top_k = top_k
+        self.nulls = 0
+        self.non_conforming = 0
+        self.is_numeric = declared_dtype in NUMERIC_DTYPES
+        # Running numeric summary: count, mean, sum of squared deviations, min, max
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self.sketch = None if self.is_numeric else HeavyHitters(capacity=max(top_k * 20, 100))
+
+    def update(self, values: pd.Series, date_format: Optional[str] = None) -> None:
+        """Fold one chunk of raw (string) values into the profile."""
+        present = values.notna()
+        self.nulls += int((~present).sum())
+
+        if self.is_numeric:
+            numeric = pd.to_numeric(values, errors='coerce')
+            self.non_conforming += int((numeric.isna() & present).sum())
+            if self.declared_dtype.startswith(('int', 'Int')):
+                self.non_conforming += int(((numeric % 1) > 0).sum())
+            self._update_numeric(numeric.dropna().to_numpy(dtype='float64'))
+        else:
+            if self.name == 'date' and date_format:
+                parsed = pd.to_datetime(values, format=date_format, errors='coerce')
+                self.non_conforming += int((parsed.isna() & present).sum())
+            self.sketch.update(values)
+
+    def _update_numeric(self, chunk: np.ndarray) -> None:
+        """Merge chunk moments into the running summary (Chan et al. parallel variance)."""
+        n = len(chunk)
+        if n == 0:
+            return
+        chunk_mean = float(chunk.mean())
+        chunk_m2 = float(((chunk - chunk_mean) ** 2).sum())
+        total = self.count + n
+        delta = chunk_mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += chunk_m2 + delta ** 2 * self.count * n / total
+        self.count = total
+        self.minimum = min(self.minimum, float(chunk.min()))
+        self.maximum = max(self.maximum, float(chunk.max()))
+
+    def to_dict(self) -> Dict:
+        """Serialize the profile for the JSON report."""
+        result = {
+            'declared_dtype': self.declared_dtype,
+            'nulls': self.nulls,
+            'non_conforming': self.non_conforming,
+        }
+        if self.is_numeric:
+            result['summary'] = {
+                'count': self.count,
+                'mean': round(self.mean, 4) if self.count else None,
+                'std': round(math.sqrt(self.m2 / (self.count - 1)), 4) if self.count > 1 else None,
+                'min': self.minimum if self.count else None,
+                'max': self.maximum if self.count else None,
+            }
+        else:
+            result['top_values'] = self.sketch.top(self.top_k)
+        return result
+
+
+def profile_csv(path, file_name: str, chunk_size: int = DEFAULT_CHUNK_SIZE, top_k: int = DEFAULT_TOP_K,
+                customer_codes: Optional[Set[str]] = None) -> Dict:
+    """
+    Profile one CSV file in a single streaming pass.
+
+    Args:
+        path: Path of the CSV file
+        file_name: Schema key in data_headers.json (e.g. "sales_data.csv")
+        chunk_size: Rows per chunk
+        top_k: Number of top values reported per non-numeric column
+        customer_codes: Known customer codes; when given, unmatched customer_code values are counted
+
+    Returns:
+        Profile dict with row count, header check, per-column stats and issue counts
+    """
+    schema = load_schema().get(file_name, {})
+    declared = schema.get('dtypes', {})
+    date_format = schema.get('date_format')
+
+    profiles: Dict[str, ColumnProfile] = {}
+    issues = {'invalid_postcodes': 0}
+    rows = 0
+    header: List[str] = []
+
+    # Read everything as strings so dtype conformance can be checked against the schema
+    reader = pd.read_csv(path, dtype=str, chunksize=chunk_size, encoding='utf-8-sig')
+    for chunk in reader:
+        if not header:
+            header = chunk.columns.tolist()
+            profiles = {column: ColumnProfile(column, declared.get(column), top_k) for column in header}
+        rows += len(chunk)
+
+        for column, profile in profiles.items():
+            profile.update(chunk[column], date_format)
+
+        if 'postcode' in chunk.columns:
+            issues['invalid_postcodes'] += int(find_invalid_postcodes(chunk['postcode']).sum())
+        if 'amount' in chunk.columns:
+            issues['negative_amounts'] = issues.get('negative_amounts', 0) + int(
+                (pd.to_numeric(chunk['amount'], errors='coerce') < 0).sum())
+        if customer_codes is not None and 'customer_code' in chunk.columns:
+            issues['unmatched_customer_codes'] = issues.get('unmatched_customer_codes', 0) + int(
+                (~chunk['customer_code'].isin(customer_codes)).sum())
+
+    documented = schema.get('headers', [])
+    return {
+        'rows': rows,
+        'columns': len(header),
+        'headers_match': header == documented if documented else None,
+        'missing_columns': [column for column in documented if column not in header],
+        'unexpected_columns': [column for column in header if documented and column not in documented],
+        'column_profiles': {column: profile.to_dict() for column, profile in profiles.items()},
+        'issues': issues,
+    }
+
+
+def read_customer_codes(path, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Set[str]:
+    """Collect the set of customer codes from the customer file."""
+    codes: Set[str] = set()
+    for chunk in pd.read_csv(path, usecols=['customer_code'], dtype=str, chunksize=chunk_size, encoding='utf-8-sig'):
+        codes.update(chunk['customer_code'].dropna().unique())
+    return codes
+
+
+def build_quality_report(customer_path=None, sales_path=None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                         top_k: int = DEFAULT_TOP_K) -> Dict:
+    """
+    Profile both source files and collect the data quality report.
+
+    Args:
+        customer_path: Customer CSV path (defaults to the service's configured path)
+        sales_path: Sales CSV path (defaults to the service's configured path)
+        chunk_size: Rows per chunk
+        top_k: Number of top values reported per non-numeric column
+
+    Returns:
+        JSON-serializable report dict
+    """
+    customer_path = customer_path or rfm_service.CUSTOMER_DATA_PATH
+    sales_path = sales_path or rfm_service.SALES_DATA_PATH
+
+    customer_codes = read_customer_codes(customer_path, chunk_size)
+    files = {
+        'customer_data.csv': profile_csv(customer_path, 'customer_data.csv', chunk_size, top_k),
+        'sales_data.csv': profile_csv(sales_path, 'sales_data.csv', chunk_size, top_k, customer_codes=customer_codes),
+    }
+    logger.info(f"Profiled {files['customer_data.csv']['rows']} customer rows and {files['sales_data.csv']['rows']} sales rows.")
+
+    return {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'data_version': get_data_version(),
+        'files': files,
+    }
+
+
+def write_report(report: Dict, output_path) -> None:
+    """Write a quality report to a JSON file."""
+    with open(output_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Wrote data quality report to {output_path}")
+
+
+def get_quality_report() -> Dict:
+    """
+    Return the data quality report for the current data version, building it if needed.
+    """
+    return get_or_build("data_quality", get_data_version(), build_quality_report)
+
+
+register_warmer(get_quality_report)
@@ -0,0 +1,127 @@
+"""
+Facet Index Service
+
+This module builds a facet index over the RFM dataset for the dashboard filters.
+Each filterable column is factorized once per data version into integer codes, so
+distinct values, per-value customer counts and revenue, and cross-filtered counts
+(e.g. salespeople within a segment) are answered with NumPy bincounts instead of
+re-running the RFM pipeline.
+"""
+
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+from .data_cache import get_or_build
+from .refresh_scheduler import register_warmer
+from .rfm_service import get_data_version, get_rfm_data
+
+logger = logging.getLogger(__name__)
+
+# Columns exposed as dashboard filters
+FACET_COLUMNS = ['customer_type', 'salesperson', 'segment', 'customer_ranking']
+
+
+@dataclass
+class FacetIndex:
+    """Categorical codes and value labels for every facet column."""
+    values: Dict[str, List[str]] = field(default_factory=dict)
+    codes: Dict[str, np.ndarray] = field(default_factory=dict)
+    revenue: np.ndarray = field(default_factory=lambda: np.zeros(0))
+
+    @property
+    def size(self) -> int:
+        """Number of customers in the index."""
+        return len(self.revenue)
+
+    def selection_mask(self, filters: Mapping[str, Optional[str]], exclude: Optional[str] = None) -> Optional[np.ndarray]:
+        """
+        Build a boolean mask of customers matching the given filters.
+
+        Args:
+            filters: Facet column -> selected value ("All"/None means no filter)
+            exclude: Facet column to ignore, so a facet's counts are not narrowed by its own selection
+
+        Returns:
+            Boolean mask, or None when no filter applies
+        """
+        mask = None
+        for column, value in filters.items():
+            if column == exclude or column not in self.codes or value in (None, '', 'All'):
+                continue
+            try:
+                code = self.values[column].index(value)
+            except ValueError:
+                # Unknown value matches nothing
+                return np.zeros(self.size, dtype=bool)
+            column_mask = self.codes[column] == code
+            mask = column_mask if mask is None else mask & column_mask
+        return mask
+
+    def facet_counts(self, column: str, filters: Optional[Mapping[str, Optional[str]]] = None) -> List[Dict]:
+        """
+        Count customers and revenue per value of one facet under the other filters.
+
+        Args:
+            column: Facet column to count
+            filters: Current filter selection
+
+        Returns:
+            List of {value, customer_count, revenue} dicts ordered by value
+        """
+        codes = self.codes[column]
+        mask = self.selection_mask(filters or {}, exclude=column)
+        weights = self.revenue
+        if mask is not None:
+            codes = codes[mask]
+            weights = weights[mask]
+
+        n_values = len(self.values[column])
+        # Missing values carry code -1 and are left out of the counts
+        valid = codes >= 0
+        counts = np.bincount(codes[valid], minlength=n_values)
+        revenue = np.bincount(codes[valid], weights=weights[valid], minlength=n_values)
+
+        return [
+            {'value': value, 'customer_count': int(counts[i]), 'revenue': round(float(revenue[i]), 2)}
+            for i, value in enumerate(self.values[column])
+        ]
+
+
+def build_facet_index(rfm_df: pd.DataFrame) -> FacetIndex:
+    """
+    Factorize the facet columns of an RFM dataset.
+
+    Args:
+        rfm_df: Final RFM dataset
+
+    Returns:
+        FacetIndex over the dataset's customers
+    """
+    index = FacetIndex()
+    index.revenue = pd.to_numeric(rfm_df['monetary'], errors='coerce').fillna(0.0).to_numpy(dtype='float64')
+
+    for column in FACET_COLUMNS:
+        if column not in rfm_df.columns:
+            index.values[column] = []
+            index.codes[column] = np.full(len(rfm_df), -1, dtype=np.int32)
+            continue
+        codes, uniques = pd.factorize(rfm_df[column], sort=True)
+        index.values[column] = [str(value) for value in uniques]
+        index.codes[column] = codes.astype(np.int32)
+
+    logger.info(f"Built facet index for {index.size} customers over {len(FACET_COLUMNS)} columns.")
+    return index
+
+
+def get_facet_index() -> FacetIndex:
+    """
+    Return the facet index for the current data version, building it if needed.
+    """
+    return get_or_build("facets", get_data_version(), lambda: build_facet_index(get_rfm_data()))
+
+
+register_warmer(get_facet_index)
@@ -0,0 +1,189 @@
+"""
+Geographic Rollup Service
+
+This module precomputes the geographic dimensions of the RFM dataset so territory
+planning can see customer counts, revenue and segment mix per state, postcode and
+suburb without loading the full table. Each level is keyed by itself and the levels
+above it (a postcode row carries its state, a suburb row its state and postcode),
+and every customer's group at each level is stored as an integer code once per data
+version. Each request applies the dashboard filters as a boolean mask and reduces
+the codes with np.bincount, the same way the chart aggregates are computed.
+"""
+
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+from .data_cache import get_or_build
+from .facet_service import FacetIndex, build_facet_index, get_facet_index
+from .refresh_scheduler import register_warmer
+from .rfm_service import INVALID_POSTCODE, get_data_version, get_rfm_data
+
+logger = logging.getLogger(__name__)
+
+# Rollup levels, from the coarsest; each level is grouped together with the levels above it
+GEO_LEVELS = ['state', 'postcode', 'suburb']
+
+# Label for customers without a usable location value
+UNKNOWN_LOCATION = 'UNKNOWN'
+
+
+def clean_location(values: pd.Series, column: str) -> pd.Series:
+    """
+    Normalize a location column for grouping.
+
+    States are upper-cased and suburbs title-cased, so spelling variants of the same
+    place fall into one group; blank and missing values (including "nan") and the
+    INVALID_POSTCODE marker written by preprocessing become UNKNOWN_LOCATION.
+
+    Args:
+        values: Raw location values
+        column: One of GEO_LEVELS
+
+    Returns:
+        Cleaned values as strings
+    """
+    text = values.astype(str).str.strip()
+    text = text.str.upper() if column == 'state' else text.str.title() if column == 'suburb' else text
+    missing = values.isna() | text.str.lower().isin(['', 'nan', 'none']) | (text == INVALID_POSTCODE)
+    return text.mask(missing, UNKNOWN_LOCATION)
+
+
+@dataclass
+class GeoIndex:
+    """Group codes per rollup level plus the facet and segment codes used to reduce them."""
+    facets: FacetIndex = field(default_factory=FacetIndex)
+    monetary: np.ndarray = field(default_factory=lambda: np.zeros(0))
+    segments: List[str] = field(default_factory=list)
+    segment_codes: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+    group_keys: Dict[str, pd.DataFrame] = field(default_factory=dict)
+    group_codes: Dict[str, np.ndarray] = field(default_factory=dict)
+
+    @property
+    def levels(self) -> List[str]:
+        """Levels available in this index."""
+        return list(self.group_codes)
+
+    def rollup(self, level: str, filters: Optional[Mapping[str, Optional[str]]] = None,
+               state: Optional[str] = None, limit: Optional[int] = None) -> Dict:
+        """
+        Roll customers up to one geographic level.
+
+        Args:
+            level: One of the indexed GEO_LEVELS
+            filters: Facet column -> selected value ("All"/None means no filter)
+            state: Only include customers in this state
+            limit: Maximum number of groups returned, highest revenue first
+
+        Returns:
+            Dict with the level, totals and one row per group with customer_count,
+            revenue, avg_revenue and the customer count per segment
+        """
+        if level not in self.group_codes:
+            raise ValueError(f"level must be one of {self.levels}")
+        mask = self.facets.selection_mask(filters or {})
+        if mask is None:
+            mask = np.ones(len(self.monetary), dtype=bool)
+        if state not in (None, '', 'All') and 'state' in self.group_codes:
+            state_keys = self.group_keys['state']['state'].tolist()
+            clean_state = str(state).strip().upper()
+            code = state_keys.index(clean_state) if clean_state in state_keys else -1
+            mask = mask & (self.group_codes['state'] == code)
+
+        keys = self.group_keys[level]
+        codes = self.group_codes[level][mask]
+        monetary = self.monetary[mask]
+        counts = np.bincount(codes, minlength=len(keys))
+        revenue = np.bincount(codes, weights=monetary, minlength=len(keys))
+
+        segment_codes = self.segment_codes[mask]
+        known = segment_codes >= 0
+        n_segments = len(self.segments)
+        mix = np.bincount(codes[known] * n_segments + segment_codes[known],
+                          minlength=len(keys) * n_segments).reshape(len(keys), n_segments)
+
+        present = np.flatnonzero(counts)
+        order = present[np.lexsort((present, -revenue[present]))]
+        if limit is not None:
+            order = order[:limit]
+        key_records = keys.iloc[order].to_dict('records')
+        groups = []
+        for group, key in zip(order, key_records):
+            groups.append({
+                **key,
+                'customer_count': int(counts[group]),
+                'revenue': round(float(revenue[group]), 2),
+                'avg_revenue': round(float(revenue[group] / counts[group]), 2),
+                'segments': {self.segments[i]: int(mix[group, i]) for i in np.flatnonzero(mix[group])},
+            })
+
+        return {
+            'level': level,
+            'customer_count': int(mask.sum()),
+            'revenue': round(float(monetary.sum()), 2),
+            'group_count': int(len(present)),
+            'groups': groups,
+        }
+
+
+def build_geo_index(rfm_df: pd.DataFrame, facets: Optional[FacetIndex] = None) -> GeoIndex:
+    """
+    Encode the geographic groups of an RFM dataset.
+
+    Args:
+        rfm_df: Final RFM dataset with state, postcode and suburb columns
+        facets: Facet index of the same dataset to share; built from rfm_df if omitted
+
+    Returns:
+        GeoIndex with a group code per customer for every level present in the dataset
+    """
+    index = GeoIndex(facets=facets if facets is not None else build_facet_index(rfm_df))
+    index.monetary = pd.to_numeric(rfm_df['monetary'], errors='coerce').fillna(0.0).to_numpy(dtype='float64')
+
+    codes, uniques = pd.factorize(rfm_df['segment'], sort=True)
+    index.segments = [str(segment) for segment in uniques]
+    index.segment_codes = codes.astype(np.int64)
+
+    key_columns, column_codes = [], []
+    for level in GEO_LEVELS:
+        if level not in rfm_df.columns:
+            # Lower levels are only meaningful below the levels above them
+            break
+        # Clean each distinct value once; missing values (code -1) pick the appended UNKNOWN_LOCATION
+        raw_codes, raw_values = pd.factorize(rfm_df[level])
+        cleaned = np.append(clean_location(pd.Series(raw_values, dtype=object), level).to_numpy(dtype=object),
+                            UNKNOWN_LOCATION)
+        level_codes, level_values = pd.factorize(cleaned[raw_codes], sort=True)
+        key_columns.append((level, np.asarray(level_values, dtype=object)))
+        column_codes.append(level_codes.astype(np.int64))
+
+        # One combined code per customer for the level and every level above it
+        combined = np.zeros(len(rfm_df), dtype=np.int64)
+        for (_, values), value_codes in zip(key_columns, column_codes):
+            combined = combined * len(values) + value_codes
+        groups, group_codes = np.unique(combined, return_inverse=True)
+
+        # Read each group's key values off its first customer
+        first = np.zeros(len(groups), dtype=np.int64)
+        first[group_codes[::-1]] = np.arange(len(rfm_df))[::-1]
+        index.group_keys[level] = pd.DataFrame({
+            column: values[value_codes[first]] for (column, values), value_codes in zip(key_columns, column_codes)
+        })
+        index.group_codes[level] = group_codes.astype(np.int64)
+
+    group_counts = ", ".join(f"{len(keys)} {level} groups" for level, keys in index.group_keys.items())
+    logger.info(f"Built geographic index for {len(rfm_df)} customers: {group_counts}.")
+    return index
+
+
+def get_geo_index() -> GeoIndex:
+    """
+    Return the geographic index for the current data version, building it if needed.
+    """
+    return get_or_build("geo", get_data_version(), lambda: build_geo_index(get_rfm_data(), get_facet_index()))
+
+
+register_warmer(get_geo_index)
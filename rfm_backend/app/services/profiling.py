@@ -0,0 +1,173 @@
+"""
+Request Profiling Module
+
+This module collects profiles for individual requests. A ProfileCollector is bound
+to the request's context; while one is bound, calls run through run_profiled() are
+executed under cProfile and functions decorated with timed_stage() record their
+wall-clock time. Context variables follow the request into the worker pool, so
+pipeline work done in worker threads is attributed to the request that asked for
+it. When no collector is bound, the decorators cost one context-variable lookup.
+"""
+
+import cProfile
+import functools
+import logging
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Default number of hotspots reported
+DEFAULT_TOP_N = 30
+
+
+class ProfileCollector:
+    """cProfile runs and stage timings gathered for one request."""
+
+    def __init__(self):
+        self.stages: Dict[str, Dict] = {}
+        self.profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def add_stage(self, name: str, seconds: float) -> None:
+        """Accumulate the time spent in a pipeline stage."""
+        with self._lock:
+            entry = self.stages.setdefault(name, {'calls': 0, 'seconds': 0.0})
+            entry['calls'] += 1
+            entry['seconds'] += seconds
+
+    def add_profile(self, profile: cProfile.Profile) -> None:
+        """Keep a finished cProfile run."""
+        with self._lock:
+            self.profiles.append(profile)
+
+    def hotspots(self, top_n: int = DEFAULT_TOP_N) -> List[Dict]:
+        """
+        Merge the profiles and return the functions with the highest cumulative time.
+
+        Args:
+            top_n: Number of functions to return
+
+        Returns:
+            List of dicts with function, calls, total_seconds and cumulative_seconds
+        """
+        with self._lock:
+            profiles = list(self.profiles)
+        if not profiles:
+            return []
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:top_n]
+        return [
+            {
+                'function': f"{function} ({file_name}:{line})",
+                'calls': calls,
+                'total_seconds': round(total, 6),
+                'cumulative_seconds': round(cumulative, 6),
+            }
+            for (file_name, line, function), (_, calls, total, cumulative, _) in rows
+        ]
+
+    def report(self, top_n: int = DEFAULT_TOP_N) -> Dict:
+        """Stage timings and hotspots as a JSON-ready dict."""
+        stages = {name: {'calls': entry['calls'], 'seconds': round(entry['seconds'], 6)}
+                  for name, entry in self.stages.items()}
+        return {'stages': stages, 'hotspots': self.hotspots(top_n)}
+
+
+_collector: ContextVar[Optional[ProfileCollector]] = ContextVar("rfm_profile_collector", default=None)
+
+
+@contextmanager
+def collecting() -> Iterator[ProfileCollector]:
+    """Bind a new collector to the current context for the duration of the block."""
+    collector = ProfileCollector()
+    token = _collector.set(collector)
+    try:
+        yield collector
+    finally:
+        _collector.reset(token)
+
+
+def start_profile() -> Optional[cProfile.Profile]:
+    """
+    Start cProfile in the current thread for the bound collector.
+
+    Returns:
+        The running profile, or None if no collector is bound or another profiler is active
+    """
+    if _collector.get() is None:
+        return None
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError as e:
+        # Only one profiler can be active at a time on some Python versions
+        logger.warning(f"Could not start the request profiler: {str(e)}")
+        return None
+    return profile
+
+
+def stop_profile(profile: Optional[cProfile.Profile]) -> None:
+    """Stop a profile started by start_profile() and hand it to the bound collector."""
+    if profile is None:
+        return
+    profile.disable()
+    collector = _collector.get()
+    if collector is not None:
+        collector.add_profile(profile)
+
+
+def run_profiled(fn: Callable, *args, **kwargs):
+    """
+    Call fn, under cProfile if a collector is bound to the current context.
+
+    Args:
+        fn: Callable to run
+        *args, **kwargs: Arguments passed to fn
+
+    Returns:
+        fn's result
+    """
+    if _collector.get() is None:
+        return fn(*args, **kwargs)
+    profile = start_profile()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        stop_profile(profile)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Record the wall-clock time of a block as a pipeline stage of the bound collector."""
+    collector = _collector.get()
+    if collector is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        collector.add_stage(name, time.perf_counter() - start)
+
+
+def timed_stage(fn: Callable) -> Callable:
+    """Decorator recording each call of fn as a pipeline stage named after the function."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        collector = _collector.get()
+        if collector is None:
+            return fn(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            collector.add_stage(fn.__name__, time.perf_counter() - start)
+    return wrapper
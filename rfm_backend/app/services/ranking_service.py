@@ -0,0 +1,215 @@
+"""
+Ranking Index Service
+
+This module builds a ranking index over the RFM dataset so top-N and
+percentile-rank questions ("top 50 customers by monetary in Champions", "biggest
+decliners by trend") are answered from presorted arrays instead of re-sorting the
+dataset per request. Each metric is argsorted once per data version, highest
+first with missing values last; for every partition column the same order is
+regrouped into contiguous per-partition blocks, so a query slices one block.
+"""
+
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .data_cache import get_or_build
+from .refresh_scheduler import register_warmer
+from .rfm_service import get_data_version, get_rfm_data
+
+logger = logging.getLogger(__name__)
+
+# Metrics customers can be ranked by; metrics missing from the dataset (e.g. churn_probability
+# before a churn model is trained) are left out of the index
+RANK_METRICS = ['monetary', 'frequency', 'recency_days', 'trend_avg', 'trend_slope', 'total_profit',
+                'churn_probability']
+
+# Columns rankings can be partitioned by
+RANK_PARTITIONS = ['segment', 'salesperson']
+
+# Customer attributes returned with every ranked customer
+RANK_ATTRIBUTES = ['customer_code', 'customer_name', 'customer_type', 'salesperson', 'segment']
+
+
+@dataclass
+class PartitionedOrder:
+    """A metric order regrouped into one contiguous block per partition value."""
+    order: np.ndarray
+    offsets: np.ndarray
+    valid_counts: np.ndarray
+
+    def block(self, code: int) -> np.ndarray:
+        """Positions of the partition's customers with a value, highest first."""
+        start = self.offsets[code]
+        return self.order[start:start + self.valid_counts[code]]
+
+
+@dataclass
+class RankingIndex:
+    """Presorted customer positions per metric, overall and per partition."""
+    frame: pd.DataFrame = field(default_factory=pd.DataFrame)
+    values: Dict[str, np.ndarray] = field(default_factory=dict)
+    order: Dict[str, np.ndarray] = field(default_factory=dict)
+    partition_values: Dict[str, List[str]] = field(default_factory=dict)
+    partition_codes: Dict[str, np.ndarray] = field(default_factory=dict)
+    partitioned: Dict[str, Dict[str, PartitionedOrder]] = field(default_factory=dict)
+    positions: pd.Index = field(default_factory=pd.Index)
+
+    @property
+    def metrics(self) -> List[str]:
+        """Metrics available in this index."""
+        return list(self.order)
+
+    def _block(self, metric: str, partition_by: Optional[str], partition: Optional[str]) -> np.ndarray:
+        if metric not in self.order:
+            raise ValueError(f"metric must be one of {self.metrics}")
+        if not partition_by:
+            return self.order[metric][:np.count_nonzero(~np.isnan(self.values[metric]))]
+        if partition_by not in self.partitioned:
+            raise ValueError(f"partition_by must be one of {list(self.partitioned)}")
+        if partition is None:
+            raise ValueError("partition is required with partition_by")
+        try:
+            code = self.partition_values[partition_by].index(partition)
+        except ValueError:
+            return np.zeros(0, dtype=np.int64)
+        return self.partitioned[partition_by][metric].block(code)
+
+    def top(self, metric: str, n: int, ascending: bool = False,
+            partition_by: Optional[str] = None, partition: Optional[str] = None) -> pd.DataFrame:
+        """
+        Return the top (or bottom) n customers by a metric.
+
+        Args:
+            metric: Metric to rank by
+            n: Number of customers to return
+            ascending: Return the lowest values first instead of the highest
+            partition_by: Optional partition column
+            partition: Partition value, required with partition_by
+
+        Returns:
+            DataFrame of customer attributes, the metric and a 1-based rank
+        """
+        block = self._block(metric, partition_by, partition)
+        positions = block[::-1][:n] if ascending else block[:n]
+
+        columns = [column for column in RANK_ATTRIBUTES if column in self.frame.columns]
+        result = self.frame.iloc[positions][columns].copy()
+        result[metric] = self.values[metric][positions]
+        result['rank'] = np.arange(1, len(positions) + 1)
+        return result.reset_index(drop=True)
+
+    def percentile_rank(self, metric: str, customer_code: str, partition_by: Optional[str] = None) -> Dict:
+        """
+        Return a customer's rank and percentile for a metric.
+
+        Args:
+            metric: Metric to rank by
+            customer_code: Customer to look up
+            partition_by: Optional partition column; the customer is ranked within their own partition
+
+        Returns:
+            Dict with the value, rank (1 = highest), population size and the percentage
+            of the population with a value at or below the customer's
+
+        Raises:
+            KeyError: If the customer is not in the dataset
+        """
+        position = self.positions.get_loc(customer_code)
+        partition = None
+        if partition_by:
+            if partition_by not in self.partitioned:
+                raise ValueError(f"partition_by must be one of {list(self.partitioned)}")
+            code = self.partition_codes[partition_by][position]
+            partition = self.partition_values[partition_by][code] if code >= 0 else None
+            if partition is None:
+                raise ValueError(f"Customer {customer_code} has no {partition_by}")
+        block = self._block(metric, partition_by, partition)
+
+        value = self.values[metric][position]
+        summary = {'customer_code': customer_code, 'metric': metric, 'partition': partition,
+                   'population': int(len(block)), 'value': None, 'rank': None, 'percentile': None}
+        if np.isnan(value):
+            return summary
+
+        # The block is sorted descending, so its negation is ascending for searchsorted
+        negated = -self.values[metric][block]
+        higher = int(np.searchsorted(negated, -value, side='left'))
+        at_or_below = len(block) - higher
+        summary.update({
+            'value': float(value),
+            'rank': higher + 1,
+            'percentile': round(100.0 * at_or_below / len(block), 2),
+        })
+        return summary
+
+
+def partition_order(order: np.ndarray, codes: np.ndarray, valid: np.ndarray, n_values: int) -> PartitionedOrder:
+    """
+    Regroup a metric order into per-partition blocks without re-sorting the metric.
+
+    Args:
+        order: Positions sorted by the metric, highest first, missing values last
+        codes: Partition code per customer (-1 when missing)
+        valid: Mask of customers with a metric value
+        n_values: Number of partition values
+
+    Returns:
+        PartitionedOrder whose block for each code keeps the metric order
+    """
+    # A stable sort by partition keeps the metric order inside each block
+    shifted = codes + 1
+    grouped = order[np.argsort(shifted[order], kind='stable')]
+    sizes = np.bincount(shifted, minlength=n_values + 1)
+    offsets = np.concatenate([[0], np.cumsum(sizes)])[1:-1]
+    valid_counts = np.bincount(shifted[valid], minlength=n_values + 1)[1:]
+    return PartitionedOrder(order=grouped, offsets=offsets, valid_counts=valid_counts)
+
+
+def build_ranking_index(rfm_df: pd.DataFrame) -> RankingIndex:
+    """
+    Argsort every rankable metric of an RFM dataset, overall and per partition.
+
+    Args:
+        rfm_df: Final RFM dataset
+
+    Returns:
+        RankingIndex over the dataset's customers
+    """
+    index = RankingIndex(frame=rfm_df, positions=pd.Index(rfm_df['customer_code']))
+
+    for column in RANK_PARTITIONS:
+        if column in rfm_df.columns:
+            codes, uniques = pd.factorize(rfm_df[column], sort=True)
+            index.partition_values[column] = [str(value) for value in uniques]
+            index.partition_codes[column] = codes.astype(np.int64)
+            index.partitioned[column] = {}
+
+    for metric in RANK_METRICS:
+        if metric not in rfm_df.columns:
+            continue
+        values = pd.to_numeric(rfm_df[metric], errors='coerce').to_numpy(dtype='float64')
+        # argsort puts NaN last, and negating keeps that while ordering highest first
+        order = np.argsort(-values, kind='stable')
+        index.values[metric] = values
+        index.order[metric] = order
+        valid = ~np.isnan(values)
+        for column, codes in index.partition_codes.items():
+            index.partitioned[column][metric] = partition_order(
+                order, codes, valid, len(index.partition_values[column]))
+
+    logger.info(f"Built ranking index for {len(rfm_df)} customers over {len(index.order)} metrics.")
+    return index
+
+
+def get_ranking_index() -> RankingIndex:
+    """
+    Return the ranking index for the current data version, building it if needed.
+    """
+    return get_or_build("ranking", get_data_version(), lambda: build_ranking_index(get_rfm_data()))
+
+
+register_warmer(get_ranking_index)
@@ -0,0 +1,217 @@
+"""
+Refresh Scheduler Module
+
+This module watches the source CSV files and recomputes the RFM artifacts in a
+background thread when they change, so requests are always served from a warm cache.
+Changes are detected by polling file stats; a change is only acted on once the files
+have stopped changing for the debounce interval and look complete (non-empty, header
+readable, ending with a newline). Successful refreshes publish their data version to
+the request path; failures keep the previous version in service and are retried with
+exponential backoff. Refreshes run one at a time, so a version is built and published
+before the next one starts.
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+from . import rfm_service
+from .data_cache import get_or_build
+from ..core.config import (REFRESH_DEBOUNCE_SECONDS, REFRESH_POLL_SECONDS, REFRESH_RETRY_MAX_SECONDS,
+                           REFRESH_RETRY_SECONDS)
+
+logger = logging.getLogger(__name__)
+
+# Callables run after the RFM frame is rebuilt, to warm dependent artifacts
+_warmers: List[Callable[[], object]] = []
+
+
+def register_warmer(warmer: Callable[[], object]) -> None:
+    """
+    Register a callable that builds a cached artifact after each refresh.
+
+    Args:
+        warmer: Zero-argument callable, e.g. get_facet_index
+    """
+    if warmer not in _warmers:
+        _warmers.append(warmer)
+
+
+def is_file_complete(path) -> bool:
+    """
+    Check that a CSV file looks fully written.
+
+    Args:
+        path: CSV file path
+
+    Returns:
+        True if the file is non-empty, its header can be read and it ends with a newline
+    """
+    path = Path(path)
+    try:
+        if path.stat().st_size == 0:
+            return False
+        with open(path, 'rb') as f:
+            f.seek(-1, 2)
+            if f.read(1) not in (b'\n', b'\r'):
+                return False
+        pd.read_csv(path, nrows=0, encoding='utf-8-sig')
+        return True
+    except (OSError, ValueError, pd.errors.ParserError) as e:
+        logger.info(f"{path} is not ready yet: {str(e)}")
+        return False
+
+
+class RefreshScheduler:
+    """Background file watcher that keeps the RFM artifacts up to date."""
+
+    def __init__(self, poll_seconds: float = 5.0, debounce_seconds: float = 10.0,
+                 retry_seconds: float = REFRESH_RETRY_SECONDS, max_retry_seconds: float = REFRESH_RETRY_MAX_SECONDS):
+        self.poll_seconds = poll_seconds
+        self.debounce_seconds = debounce_seconds
+        self.retry_seconds = retry_seconds
+        self.max_retry_seconds = max_retry_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._refresh_lock = threading.Lock()
+        self._pending_version: Optional[str] = None
+        self._pending_since = 0.0
+        self._retry_at = 0.0
+        self.status: Dict = {
+            'running': False,
+            'refreshing': False,
+            'last_success_version': None,
+            'last_success_at': None,
+            'last_duration_seconds': None,
+            'last_failure_version': None,
+            'last_failure_at': None,
+            'last_failure_reason': None,
+            'consecutive_failures': 0,
+        }
+
+    def start(self) -> None:
+        """Start watching in a daemon thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="rfm-refresh", daemon=True)
+        self._thread.start()
+        self.status['running'] = True
+        logger.info(f"Refresh scheduler watching {Path(rfm_service.SALES_DATA_PATH).parent}")
+
+    def get_status(self) -> Dict:
+        """Return a snapshot of the scheduler status."""
+        return dict(self.status)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop watching and wait for the thread to exit."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.status['running'] = False
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"Refresh scheduler poll failed: {str(e)}")
+            self._stop.wait(self.poll_seconds)
+
+    def poll(self, now: Optional[float] = None) -> bool:
+        """
+        Check the source files once and refresh if a settled change is found.
+
+        Args:
+            now: Current monotonic time (for testing)
+
+        Returns:
+            True if a refresh was run
+        """
+        now = time.monotonic() if now is None else now
+        version = rfm_service.read_data_version()
+        if version is None or version == self.status['last_success_version']:
+            self._pending_version = None
+            return False
+        if version == self.status['last_failure_version']:
+            # The files have not changed since the failure; retry once the backoff has passed
+            if now < self._retry_at:
+                return False
+            self.refresh(version)
+            self._schedule_retry(now)
+            return True
+
+        # Debounce: wait until the files have kept the same version for the whole interval
+        if version != self._pending_version:
+            self._pending_version = version
+            self._pending_since = now
+            if self.status['last_success_version'] is not None:
+                return False
+        if self.status['last_success_version'] is not None and now - self._pending_since < self.debounce_seconds:
+            return False
+
+        if not all(is_file_complete(path) for path in (rfm_service.CUSTOMER_DATA_PATH, rfm_service.SALES_DATA_PATH)):
+            return False
+
+        self.refresh(version)
+        self._pending_version = None
+        self._schedule_retry(now)
+        return True
+
+    def _schedule_retry(self, now: float) -> None:
+        """Set the next retry time after a failed refresh, doubling the wait per consecutive failure."""
+        failures = self.status['consecutive_failures']
+        if failures:
+            self._retry_at = now + min(self.max_retry_seconds, self.retry_seconds * 2 ** (failures - 1))
+
+    def refresh(self, version: str) -> None:
+        """
+        Recompute the RFM artifacts for a data version and publish it on success.
+
+        Args:
+            version: Data version being computed
+        """
+        with self._refresh_lock:
+            self._refresh(version)
+
+    def _refresh(self, version: str) -> None:
+        self.status['refreshing'] = True
+        started = time.perf_counter()
+        try:
+            get_or_build("rfm", version, rfm_service.compute_rfm_data)
+            rfm_service.publish_data_version(version)
+            for warmer in _warmers:
+                try:
+                    warmer()
+                except Exception as e:
+                    # Dependent artifacts are rebuilt lazily on request if warming fails
+                    logger.warning(f"Warming {getattr(warmer, '__name__', warmer)} failed: {str(e)}")
+        except Exception as e:
+            logger.error(f"Refresh for data version {version} failed: {str(e)}")
+            repeated = version == self.status['last_failure_version']
+            self.status.update({
+                'last_failure_version': version,
+                'last_failure_at': datetime.now().isoformat(timespec='seconds'),
+                'last_failure_reason': str(e),
+                'consecutive_failures': self.status['consecutive_failures'] + 1 if repeated else 1,
+            })
+        else:
+            duration = time.perf_counter() - started
+            self.status.update({
+                'last_success_version': version,
+                'last_success_at': datetime.now().isoformat(timespec='seconds'),
+                'last_duration_seconds': round(duration, 3),
+                'consecutive_failures': 0,
+            })
+            logger.info(f"Refreshed data version {version} in {duration:.2f}s")
+        finally:
+            self.status['refreshing'] = False
+
+
+# Shared scheduler instance, started by the application on startup
+scheduler = RefreshScheduler(poll_seconds=REFRESH_POLL_SECONDS, debounce_seconds=REFRESH_DEBOUNCE_SECONDS)
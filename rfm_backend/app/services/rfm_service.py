@@ -5,14 +5,25 @@ This module contains the core logic for data preprocessing and RFM (Recency, Fre
 It handles data loading, cleaning, and transformation to generate RFM scores for customer segmentation.
 """
 
+import numpy as np
 import pandas as pd
 import os
+import json
+import hashlib
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Union
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 
-# Configure logging for transparency in data processing
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+import threading
+
+from .data_cache import building_version, get_or_build
+from .profiling import timed_stage
+from ..core.config import (CHURN_MODEL_PATH, CSV_ENGINE, DATA_HEADERS_PATH, FREQUENCY_MODE, RFM_PARTITION_WORKERS,
+                           SALES_DEDUP_ENABLED, STORAGE_BACKEND, WORKER_TIMEOUT_SECONDS)
+
+# Logging is configured by the application entry point (app.main or a CLI), not on import
 logger = logging.getLogger(__name__)
 
 # File paths for data sources
@@ -24,6 +35,238 @@ BASE_DIR = Path(__file__).parent.parent.parent.parent
 CUSTOMER_DATA_PATH = BASE_DIR / "data" / "customer_data.csv"
 SALES_DATA_PATH = BASE_DIR / "data" / "sales_data.csv"
 
+# Columns RFM can be computed within; branch is a sales attribute, the rest come from the customer profile
+PARTITION_COLUMNS = ['branch', 'state', 'salesperson', 'customer_type']
+
+# Columns actually used by the RFM pipeline; everything else is skipped at parse time
+CUSTOMER_COLUMNS = ['customer_code', 'customer_name', 'customer_type', 'customer_ranking', 'salesperson', 'suburb', 'state', 'postcode']
+SALES_COLUMNS = ['transaction_number', 'date', 'branch', 'cost', 'customer_code', 'amount', 'profit', 'delivery_suburb', 'postcode']
+# Key of the full source row, kept when sales columns outside SALES_COLUMNS are dropped
+ROW_HASH_COLUMN = 'row_hash'
+# Written in place of postcodes that fail validation
+INVALID_POSTCODE = "INVALID"
+
+# Data version published by the refresh scheduler once it has been computed successfully
+_published_version: Optional[str] = None
+# Set by require_published_version(): requests wait for the first publish instead of reading the files
+_publish_required = False
+_first_publish = threading.Event()
+
+
+class DataNotReadyError(RuntimeError):
+    """Raised when no data version has been published yet."""
+
+def read_data_version(paths: Optional[Tuple] = None) -> Optional[str]:
+    """
+    Identify the current version of the source CSV files on disk.
+
+    The version is derived from the size and modification time of both files, so it
+    changes whenever either file is rewritten. A trained churn model is part of the
+    version too, so retraining it rescores the customers.
+
+    Args:
+        paths: Source files to version (defaults to the customer and sales CSVs)
+
+    Returns:
+        Short hex digest of the file stats, or None if a source file is missing
+    """
+    parts = []
+    for path in paths or (CUSTOMER_DATA_PATH, SALES_DATA_PATH):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        parts.append(f"{path}:{stat.st_size}:{stat.st_mtime_ns}")
+    if os.path.exists(CHURN_MODEL_PATH):
+        stat = os.stat(CHURN_MODEL_PATH)
+        parts.append(f"{CHURN_MODEL_PATH}:{stat.st_size}:{stat.st_mtime_ns}")
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()[:12]
+
+def publish_data_version(version: Optional[str]) -> None:
+    """
+    Pin the data version served to requests.
+
+    Args:
+        version: Version whose artifacts are ready, or None to follow the files on disk
+    """
+    global _published_version
+    _published_version = version
+    if version is not None:
+        _first_publish.set()
+
+def require_published_version() -> None:
+    """
+    Serve requests only from published data versions.
+
+    Called on startup when the warm-up or the refresh scheduler publishes versions, so
+    a request arriving before the first publish waits for it rather than computing on
+    source files that may still be being written.
+    """
+    global _publish_required
+    _publish_required = True
+
+def get_data_version(wait: Optional[float] = WORKER_TIMEOUT_SECONDS) -> Optional[str]:
+    """
+    Return the data version requests should be served from.
+
+    Inside an artifact build this is the version being built. When the refresh
+    scheduler is running it is the last version it computed successfully, so requests
+    never recompute against a file that is still being written; otherwise it is the
+    version of the files on disk.
+
+    Args:
+        wait: Seconds to wait for the first publish when one is required (0 to not wait)
+
+    Returns:
+        The data version, or None if a source file is missing
+
+    Raises:
+        DataNotReadyError: If a publish is required and none happened in time
+    """
+    pinned = building_version()
+    if pinned is not None:
+        return pinned
+    if _published_version is None and _publish_required:
+        if not (wait and _first_publish.wait(wait)):
+            raise DataNotReadyError("No data version has been published yet")
+    if _published_version is not None:
+        return _published_version
+    return read_data_version()
+
+def pipeline_settings() -> Dict:
+    """
+    Return the settings that change the scored RFM frame for the same source files.
+
+    Batch runs record them in their manifest, and the API only serves a batch run
+    computed with the same settings.
+
+    Returns:
+        Dict of the frequency definition, sales deduplication and clustering settings
+    """
+    from . import cluster_model
+    return {
+        'frequency_mode': FREQUENCY_MODE,
+        'sales_dedup': SALES_DEDUP_ENABLED,
+        'clustering': cluster_model.CLUSTERING_ENABLED,
+        'cluster_k_range': list(cluster_model.CLUSTER_K_RANGE),
+    }
+
+def find_invalid_postcodes(postcodes: pd.Series) -> pd.Series:
+    """
+    Flag postcodes recorded as 0, whether they were loaded as numbers or strings.
+
+    Args:
+        postcodes: Raw postcode values
+
+    Returns:
+        Boolean Series, True where the postcode is invalid
+    """
+    return pd.to_numeric(postcodes, errors='coerce') == 0
+
+def row_hashes(df: pd.DataFrame) -> np.ndarray:
+    """
+    Hash every row of a frame to a 64-bit key.
+
+    Args:
+        df: Frame to hash
+
+    Returns:
+        uint64 array with one key per row; equal rows get equal keys
+    """
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+def find_duplicate_rows(df: pd.DataFrame) -> np.ndarray:
+    """
+    Flag rows that exactly repeat an earlier row.
+
+    Rows are compared by their hashed keys first; only rows whose key occurs more than
+    once are compared value by value, which rules out hash collisions. Source columns
+    that were dropped are compared through ROW_HASH_COLUMN when the frame carries it.
+
+    Args:
+        df: Frame to check
+
+    Returns:
+        Boolean array, True for every repeat after the first occurrence
+    """
+    duplicates = np.zeros(len(df), dtype=bool)
+    candidates = pd.Series(row_hashes(df)).duplicated(keep=False).to_numpy()
+    if candidates.any():
+        duplicates[candidates] = df[candidates].duplicated().to_numpy()
+    return duplicates
+
+def sales_source_columns(path) -> List[str]:
+    """
+    Choose the sales columns to read from a source file.
+
+    With SALES_DEDUP_ENABLED every column of the file is read, so repeats are judged on
+    the whole source row (including e.g. salesperson and transaction_type) rather than
+    on the columns RFM needs.
+
+    Args:
+        path: Path of the sales CSV
+
+    Returns:
+        SALES_COLUMNS, followed by the file's other columns when deduplication is enabled
+    """
+    if not SALES_DEDUP_ENABLED:
+        return SALES_COLUMNS
+    header = pd.read_csv(path, nrows=0, encoding='utf-8-sig').columns.tolist()
+    return SALES_COLUMNS + [column for column in header if column not in SALES_COLUMNS]
+
+def key_source_rows(sales_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Reduce raw sales rows to SALES_COLUMNS, keeping a hash of each full source row.
+
+    Args:
+        sales_df: Sales rows as read by sales_source_columns()
+
+    Returns:
+        The frame unchanged if it has no other columns, otherwise its SALES_COLUMNS
+        plus ROW_HASH_COLUMN
+    """
+    extra = [column for column in sales_df.columns if column not in SALES_COLUMNS]
+    if not extra or ROW_HASH_COLUMN in extra:
+        return sales_df
+    kept = [column for column in SALES_COLUMNS if column in sales_df.columns]
+    return sales_df[kept].assign(**{ROW_HASH_COLUMN: row_hashes(sales_df)})
+
+def count_distinct(group_codes: np.ndarray, values: pd.Series, n_groups: int) -> np.ndarray:
+    """
+    Count the distinct non-missing values in each group.
+
+    Values are factorized to integer codes and each (group, value) pair is packed into
+    one int64 key, so the distinct pairs come from a single np.unique.
+
+    Args:
+        group_codes: Group code per row (0..n_groups-1, -1 to ignore the row)
+        values: Value per row
+        n_groups: Number of groups
+
+    Returns:
+        Distinct value count per group
+    """
+    value_codes, uniques = pd.factorize(values)
+    valid = (value_codes >= 0) & (group_codes >= 0)
+    n_values = max(len(uniques), 1)
+    pairs = np.unique(group_codes[valid].astype(np.int64) * n_values + value_codes[valid])
+    return np.bincount(pairs // n_values, minlength=n_groups)
+
+def distinct_invoice_frequency(sales_df: pd.DataFrame, group_columns: List[str]) -> np.ndarray:
+    """
+    Number of distinct transaction numbers per group, in sorted group order.
+
+    Args:
+        sales_df: Sales transactions
+        group_columns: Columns the metrics are grouped by
+
+    Returns:
+        Distinct invoice count per group, aligned with groupby(group_columns, sort=True)
+    """
+    groups = sales_df.groupby(group_columns, sort=True).ngroup().to_numpy()
+    n_groups = int(groups.max()) + 1 if len(groups) else 0
+    return count_distinct(groups, sales_df['transaction_number'], n_groups)
+
 def format_recency_display(days: Union[int, float]) -> str:
     """
     Format recency days into user-friendly display text.
@@ -82,16 +325,19 @@ def categorize_recency(days: Union[int, float]) -> str:
     else:
         return "Inactive"
 
+@timed_stage
 def calculate_customer_trends(rfm_data: pd.DataFrame, sales_df: pd.DataFrame) -> pd.DataFrame:
     """
     Calculate customer purchase trends for sparkline visualization.
+    Monthly spend is accumulated into one customer x month matrix, and every trend
+    column is computed from that matrix in batched NumPy.
     
     Args:
         rfm_data: DataFrame with RFM calculations
         sales_df: DataFrame with sales transactions
         
     Returns:
-        Enhanced RFM DataFrame with trend data
+        Enhanced RFM DataFrame with trend data and trend features
     """
     logger.info("Starting trend calculation...")
     
@@ -110,16 +356,12 @@ def calculate_customer_trends(rfm_data: pd.DataFrame, sales_df: pd.DataFrame) ->
     
     logger.info(f"Calculating trends from {start_date} to {reference_date}")
     
-    # Filter sales data to last 12 months
-    recent_sales = sales_df[sales_df['date'] >= start_date].copy()
-    
-    if recent_sales.empty:
+    # Filter sales data to last 12 months, keeping only the columns the trend needs
+    recent_mask = (sales_df['date'] >= start_date).to_numpy()
+    if not recent_mask.any():
         logger.warning("No sales data in the last 12 months")
         raise ValueError("No recent sales data available")
     
-    # Create month-year period for grouping
-    recent_sales['month_period'] = recent_sales['date'].dt.to_period('M')
-    
     # Generate all months in the range
     all_months = pd.period_range(start=start_date.to_period('M'), 
                                end=reference_date.to_period('M'), 
@@ -127,91 +369,214 @@ def calculate_customer_trends(rfm_data: pd.DataFrame, sales_df: pd.DataFrame) ->
     
     logger.info(f"Processing {len(all_months)} months of data for {len(rfm_data)} customers")
     
-    trend_data = []
-    
-    for i, customer_code in enumerate(rfm_data['customer_code']):
-        try:
-            customer_sales = recent_sales[recent_sales['customer_code'] == customer_code]
-            
-            if not customer_sales.empty:
-                # Group by month and sum amounts
-                monthly_spend = customer_sales.groupby('month_period')['amount'].sum().astype('float64')
-                
-                # Create complete series with zeros for months with no purchases
-                complete_series = pd.Series(0.0, index=all_months, dtype='float64')
-                
-                # Update with actual spend data
-                for period, amount in monthly_spend.items():
-                    if period in complete_series.index:
-                        complete_series.loc[period] = float(amount)
-                
-                # Convert to list for JSON serialization
-                trend_values = complete_series.tolist()
-            else:
-                # Customer has no sales in the period
-                trend_values = [0.0] * len(all_months)
-            
-            # Ensure we have exactly the right number of months
-            if len(trend_values) != len(all_months):
-                trend_values = trend_values[:len(all_months)] + [0.0] * (len(all_months) - len(trend_values))
-            
-            # Calculate trend direction (comparing first half vs second half)
-            if len(trend_values) >= 6:
-                mid_point = len(trend_values) // 2
-                first_half = sum(trend_values[:mid_point])
-                second_half = sum(trend_values[mid_point:])
-                
-                if second_half > first_half * 1.1:  # 10% increase threshold
-                    trend_direction = "up"
-                elif second_half < first_half * 0.9:  # 10% decrease threshold
-                    trend_direction = "down"
-                else:
-                    trend_direction = "stable"
-            else:
-                trend_direction = "stable"
-            
-            trend_data.append({
-                'customer_code': customer_code,
-                'trend_values': trend_values,
-                'trend_direction': trend_direction,
-                'trend_peak': max(trend_values) if trend_values else 0.0,
-                'trend_avg': sum(trend_values) / len(trend_values) if trend_values else 0.0
-            })
-            
-        except Exception as e:
-            logger.warning(f"Error calculating trend for customer {customer_code}: {str(e)}")
-            # Add safe fallback for this customer
-            trend_data.append({
-                'customer_code': customer_code,
-                'trend_values': [0.0] * len(all_months),
-                'trend_direction': "stable",
-                'trend_peak': 0.0,
-                'trend_avg': 0.0
-            })
+    # Row of each transaction's customer and column of its month in the matrix
+    customer_rows = pd.Index(rfm_data['customer_code']).get_indexer(sales_df['customer_code'].to_numpy()[recent_mask])
+    recent_dates = sales_df['date'][recent_mask]
+    month_columns = ((recent_dates.dt.year - start_date.year) * 12 + (recent_dates.dt.month - start_date.month)).to_numpy()
+    amounts = sales_df['amount'].to_numpy(dtype='float64')[recent_mask]
+    known = customer_rows >= 0
     
-    # Convert to DataFrame and merge with RFM data
-    trends_df = pd.DataFrame(trend_data)
-    logger.info(f"Successfully calculated trends for {len(trends_df)} customers")
+    n_customers, n_months = len(rfm_data), len(all_months)
+    monthly_spend = np.bincount(
+        customer_rows[known] * n_months + month_columns[known],
+        weights=amounts[known],
+        minlength=n_customers * n_months,
+    ).reshape(n_customers, n_months)
     
-    rfm_data = rfm_data.merge(trends_df, on='customer_code', how='left')
+    # Trend direction compares the first and second half of the window (10% thresholds)
+    mid_point = n_months // 2
+    first_half = monthly_spend[:, :mid_point].sum(axis=1)
+    second_half = monthly_spend[:, mid_point:].sum(axis=1)
+    trend_direction = np.select(
+        [second_half > first_half * 1.1, second_half < first_half * 0.9],
+        ["up", "down"],
+        default="stable",
+    ) if n_months >= 6 else np.full(n_customers, "stable")
     
-    # Fill any missing trend data
-    rfm_data['trend_values'] = rfm_data['trend_values'].fillna().apply(lambda x: x if isinstance(x, list) else [])
-    rfm_data['trend_direction'] = rfm_data['trend_direction'].fillna("stable")
-    rfm_data['trend_peak'] = rfm_data['trend_peak'].fillna(0.0)
-    rfm_data['trend_avg'] = rfm_data['trend_avg'].fillna(0.0)
+    rfm_data = rfm_data.assign(
+        trend_values=monthly_spend.tolist(),
+        trend_direction=trend_direction,
+        trend_peak=monthly_spend.max(axis=1),
+        trend_avg=monthly_spend.mean(axis=1),
+        **trend_features(monthly_spend),
+    )
+    logger.info(f"Successfully calculated trends for {n_customers} customers")
     
     return rfm_data
 
+def trend_features(monthly_spend: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Derive trend features from a customer x month spend matrix, oldest month first.
+    Every feature is a whole-matrix NumPy reduction, linear in the matrix size.
+
+    Args:
+        monthly_spend: Spend per customer (rows) and month (columns)
+
+    Returns:
+        Dict of feature columns:
+            trend_slope: least-squares change in monthly spend per month
+            trend_cv: coefficient of variation of monthly spend (0 when nothing was spent)
+            months_active: number of months with spend
+            longest_gap_months: longest run of consecutive months without spend
+            trend_mom_change: percentage change from the previous to the latest month
+                (NaN when the previous month had no spend)
+    """
+    n_customers, n_months = monthly_spend.shape
+    
+    # Least squares slope against the month index: sum((x - x_mean) * y) / sum((x - x_mean)^2)
+    centered = np.arange(n_months, dtype='float64') - (n_months - 1) / 2
+    denominator = (centered ** 2).sum()
+    slope = monthly_spend @ centered / denominator if denominator else np.zeros(n_customers)
+    
+    mean = monthly_spend.mean(axis=1)
+    std = monthly_spend.std(axis=1)
+    cv = np.divide(std, mean, out=np.zeros(n_customers), where=mean > 0)
+    
+    active = monthly_spend > 0
+    # Track the current inactive run per customer, one month (column) at a time
+    current_gap = np.zeros(n_customers, dtype=np.int64)
+    longest_gap = np.zeros(n_customers, dtype=np.int64)
+    for month in range(n_months):
+        current_gap = np.where(active[:, month], 0, current_gap + 1)
+        np.maximum(longest_gap, current_gap, out=longest_gap)
+    
+    mom_change = np.full(n_customers, np.nan)
+    if n_months >= 2:
+        previous, latest = monthly_spend[:, -2], monthly_spend[:, -1]
+        np.divide((latest - previous) * 100, previous, out=mom_change, where=previous > 0)
+    
+    return {
+        'trend_slope': slope.round(2),
+        'trend_cv': cv.round(3),
+        'months_active': active.sum(axis=1),
+        'longest_gap_months': longest_gap,
+        'trend_mom_change': mom_change.round(1),
+    }
+
+@lru_cache(maxsize=1)
+def load_schema() -> Dict:
+    """
+    Load the documented CSV schema from data_headers.json.
+
+    Returns:
+        Mapping of file name to its headers, dtypes and date format (empty if unavailable)
+    """
+    try:
+        with open(DATA_HEADERS_PATH, 'r') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning(f"Could not load CSV schema from {DATA_HEADERS_PATH}, falling back to type inference: {str(e)}")
+        return {}
+
+def _csv_read_options(path, file_name: str, columns: List[str]) -> Dict:
+    """
+    Build pd.read_csv keyword arguments from the documented schema.
+
+    Args:
+        path: Path of the CSV file
+        file_name: Schema key in data_headers.json (e.g. "sales_data.csv")
+        columns: Columns required by the caller
+
+    Returns:
+        Keyword arguments selecting the available columns with their declared dtypes
+    """
+    schema = load_schema().get(file_name, {})
+
+    # Read the header row only, so missing columns are skipped rather than raising
+    header = pd.read_csv(path, nrows=0, encoding='utf-8-sig').columns.tolist()
+    documented = schema.get('headers')
+    if documented and header != documented:
+        logger.warning(f"Headers of {file_name} do not match the documented structure: {header}")
+
+    usecols = [column for column in columns if column in header]
+    dtypes = {column: dtype for column, dtype in schema.get('dtypes', {}).items() if column in usecols}
+    return {'usecols': usecols, 'dtype': dtypes, 'encoding': 'utf-8-sig'}
+
+def _finish_chunk(df: pd.DataFrame, file_name: str) -> pd.DataFrame:
+    """Parse the date column of a freshly read frame with the documented format."""
+    date_format = load_schema().get(file_name, {}).get('date_format')
+    if 'date' in df.columns and date_format:
+        df['date'] = parse_dates(df['date'], date_format)
+    return df
+
+def read_csv_with_schema(path, file_name: str, columns: List[str]) -> pd.DataFrame:
+    """
+    Read a CSV file using the documented schema, loading only the requested columns.
+
+    Args:
+        path: Path of the CSV file
+        file_name: Schema key in data_headers.json (e.g. "sales_data.csv")
+        columns: Columns required by the caller
+
+    Returns:
+        DataFrame with declared dtypes and, if present, the date column parsed
+    """
+    options = _csv_read_options(path, file_name, columns)
+
+    engine = CSV_ENGINE
+    if engine == 'pyarrow':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            logger.warning("pyarrow is not installed, using the default CSV engine.")
+            engine = 'c'
+
+    df = pd.read_csv(path, engine=engine, **options)
+    return _finish_chunk(df, file_name)
+
+def iter_csv_with_schema(path, file_name: str, columns: List[str], chunk_size: int) -> Iterator[pd.DataFrame]:
+    """
+    Read a CSV file in chunks using the documented schema.
+
+    Args:
+        path: Path of the CSV file
+        file_name: Schema key in data_headers.json
+        columns: Columns required by the caller
+        chunk_size: Rows per chunk
+
+    Yields:
+        DataFrames with declared dtypes and parsed dates
+    """
+    options = _csv_read_options(path, file_name, columns)
+    for chunk in pd.read_csv(path, chunksize=chunk_size, **options):
+        yield _finish_chunk(chunk, file_name)
+
+def parse_dates(values: pd.Series, date_format: str) -> pd.Series:
+    """
+    Parse a date column using a fixed format, inferring the format only for rows that do not match.
+
+    Args:
+        values: Raw date strings
+        date_format: Expected strptime format
+
+    Returns:
+        datetime64 Series with unparseable values as NaT
+    """
+    parsed = pd.to_datetime(values, format=date_format, errors='coerce')
+    failed = parsed.isna() & values.notna()
+    if failed.any():
+        logger.warning(f"{failed.sum()} dates did not match format {date_format}, inferring their format.")
+        parsed[failed] = pd.to_datetime(values[failed], errors='coerce')
+    return parsed
+
+@timed_stage
 def load_data():
     """
     Load data from CSV files for RFM analysis.
+    Only the columns needed for RFM are read, with dtypes declared in data_headers.json.
     Returns cleaned and processed data ready for calculations.
     """
     try:
+        if STORAGE_BACKEND != 'csv':
+            from .storage_service import get_storage_engine
+            engine = get_storage_engine()
+            if engine is not None:
+                return engine.load_data()
+
         # Load customer and sales data
-        customer_df = pd.read_csv(CUSTOMER_DATA_PATH)
-        sales_df = pd.read_csv(SALES_DATA_PATH)
+        customer_df = read_csv_with_schema(CUSTOMER_DATA_PATH, 'customer_data.csv', CUSTOMER_COLUMNS)
+        sales_df = read_csv_with_schema(SALES_DATA_PATH, 'sales_data.csv', sales_source_columns(SALES_DATA_PATH))
+        sales_df = key_source_rows(sales_df)
         
         logger.info(f"Loaded customer data: {customer_df.shape[0]} rows, {customer_df.shape[1]} columns")
         logger.info(f"Loaded sales data: {sales_df.shape[0]} rows, {sales_df.shape[1]} columns")
@@ -221,57 +586,223 @@ def load_data():
         logger.error(f"Error loading data: {str(e)}")
         raise
 
+def preprocess_customers(customer_df):
+    """
+    Normalise customer codes to strings and flag invalid postcodes.
+    Customer data is small, so this returns a shallow reassignment rather than
+    modifying the input frame.
+    """
+    customer_codes = customer_df['customer_code']
+    if customer_codes.dtype != object:
+        customer_codes = customer_codes.astype('str')
+    invalid_customer_mask = find_invalid_postcodes(customer_df['postcode'])
+    logger.info(f"Flagged {invalid_customer_mask.sum()} invalid postcodes in customer data.")
+    return customer_df.assign(
+        customer_code=customer_codes,
+        postcode=customer_df['postcode'].astype(str).mask(invalid_customer_mask, INVALID_POSTCODE),
+    )
+
+@timed_stage
 def preprocess_data(customer_df, sales_df):
     """
     Preprocess data to handle quality issues such as negative transactions,
     missing values, invalid postcodes, and data type consistency.
+    Exclusions are evaluated as a single boolean mask over the raw sales rows, so the
+    only full-size allocation is the filtered result; the input frames are not modified.
     Returns preprocessed data for RFM calculations.
     """
     try:
         # 1. Ensure Data Type Consistency
-        # Convert date column to datetime
-        sales_df['date'] = pd.to_datetime(sales_df['date'], errors='coerce')
-        # Ensure monetary values are float
-        sales_df['amount'] = sales_df['amount'].astype('float64')
-        sales_df['cost'] = sales_df['cost'].astype('float64')
-        sales_df['profit'] = sales_df['profit'].astype('float64')
-        # Ensure customer_code is string/object for consistent merging
-        customer_df['customer_code'] = customer_df['customer_code'].astype('str')
-        sales_df['customer_code'] = sales_df['customer_code'].astype('str')
-        logger.info("Data types enforced for critical columns.")
+        customer_df = preprocess_customers(customer_df)
+        customer_codes = customer_df['customer_code']
 
-        # 2. Handle Invalid Postcodes
-        # Replace postcode 0 with "INVALID" in both datasets using replace to avoid FutureWarning
-        invalid_customer_postcodes = (customer_df['postcode'] == 0).sum()
-        invalid_sales_postcodes = (sales_df['postcode'] == 0).sum()
-        customer_df['postcode'] = customer_df['postcode'].replace(0, "INVALID").astype(str)
-        sales_df['postcode'] = sales_df['postcode'].replace(0, "INVALID").astype(str)
-        logger.info(f"Flagged {invalid_customer_postcodes} invalid postcodes in customer data.")
-        logger.info(f"Flagged {invalid_sales_postcodes} invalid postcodes in sales data.")
+        amount = sales_df['amount']
+        if amount.dtype != 'float64':
+            amount = amount.astype('float64')
+        sales_codes = sales_df['customer_code']
+        if sales_codes.dtype != object:
+            sales_codes = sales_codes.astype('str')
+
+        # 2. Build the exclusion mask in one pass and derive every count from it
+        unique_rows = ~find_duplicate_rows(sales_df) if SALES_DEDUP_ENABLED else np.ones(len(sales_df), dtype=bool)
+        non_negative = (amount >= 0).to_numpy()
+        matched = sales_codes.isin(customer_codes).to_numpy()
+        keep = unique_rows & non_negative & matched
+        duplicate_rows = int((~unique_rows).sum())
+        negative_transactions = int((unique_rows & ~non_negative).sum())
+        unmatched_sales = int((unique_rows & non_negative & ~matched).sum())
+        invalid_sales_mask = find_invalid_postcodes(sales_df['postcode'])
+        invalid_sales_postcodes = int(invalid_sales_mask.sum())
 
         # 3. Handle Missing Values (log only, no imputation for non-critical fields)
         missing_branch = sales_df['branch'].isnull().sum()
         missing_delivery_suburb = sales_df['delivery_suburb'].isnull().sum()
-        logger.info(f"Missing values in sales data - branch: {missing_branch}, delivery_suburb: {missing_delivery_suburb}")
 
-        # 4. Handle Negative Transaction Values
-        # Exclude transactions with negative amount from RFM calculations
-        negative_transactions = (sales_df['amount'] < 0).sum()
-        sales_df_cleaned = sales_df[sales_df['amount'] >= 0].copy()
-        logger.info(f"Excluded {negative_transactions} negative transactions from RFM calculations.")
+        # 4. Produce the filtered frame, converting only the rows that survive
+        # (take() returns an independent frame, so the conversions below never touch sales_df)
+        kept_rows = np.flatnonzero(keep)
+        sales_df_cleaned = sales_df.take(kept_rows)
+        if ROW_HASH_COLUMN in sales_df_cleaned.columns:
+            sales_df_cleaned = sales_df_cleaned.drop(columns=ROW_HASH_COLUMN)
+        converted = {}
+        if not pd.api.types.is_datetime64_any_dtype(sales_df_cleaned['date']):
+            converted['date'] = pd.to_datetime(sales_df_cleaned['date'], errors='coerce')
+        for column in ['amount', 'cost', 'profit']:
+            if sales_df_cleaned[column].dtype != 'float64':
+                converted[column] = sales_df_cleaned[column].astype('float64')
+        if sales_df_cleaned['customer_code'].dtype != object:
+            converted['customer_code'] = sales_df_cleaned['customer_code'].astype('str')
+        converted['postcode'] = sales_df_cleaned['postcode'].astype(str).mask(invalid_sales_mask.to_numpy()[kept_rows], INVALID_POSTCODE)
+        for column, values in converted.items():
+            sales_df_cleaned[column] = values
+        logger.info("Data types enforced for critical columns.")
 
-        # 5. Ensure Data Integrity for Linking
-        # Exclude sales records with unmatched customer_code
-        unmatched_sales = len(sales_df_cleaned[~sales_df_cleaned['customer_code'].isin(customer_df['customer_code'])])
-        sales_df_cleaned = sales_df_cleaned[sales_df_cleaned['customer_code'].isin(customer_df['customer_code'])].copy()
+        logger.info(f"Flagged {invalid_sales_postcodes} invalid postcodes in sales data.")
+        logger.info(f"Missing values in sales data - branch: {missing_branch}, delivery_suburb: {missing_delivery_suburb}")
+        logger.info(f"Excluded {duplicate_rows} sales rows repeating an earlier source row.")
+        logger.info(f"Excluded {negative_transactions} negative transactions from RFM calculations.")
         logger.info(f"Excluded {unmatched_sales} sales records with unmatched customer_code.")
-
         logger.info(f"Preprocessed sales data: {sales_df_cleaned.shape[0]} rows remaining after cleaning.")
         return customer_df, sales_df_cleaned
     except Exception as e:
         logger.error(f"Error in preprocessing data: {str(e)}")
         raise
 
+def quintile_scores(values: pd.Series, label: str) -> Tuple[pd.Series, Optional[np.ndarray]]:
+    """
+    Score values from 1 to 5 by quintile, where 5 is the highest value.
+
+    Args:
+        values: Metric to score
+        label: Metric name for logging
+
+    Returns:
+        Tuple of (integer scores, quintile cut-offs or None when a fallback binning was used)
+    """
+    bins = None
+    if values.nunique() == 0:
+        logger.warning(f"{label} has no values to score, assigning the middle score.")
+        return pd.Series(3, index=values.index, dtype=int), bins
+    try:
+        scores, bins = pd.qcut(values, 5, labels=[1, 2, 3, 4, 5], duplicates='drop', retbins=True)
+        logger.info(f"{label} quintile cut-offs: {bins}")
+    except ValueError as e:
+        logger.warning(f"{label} qcut failed with error: {str(e)}. Falling back to simpler binning.")
+        unique_values = values.nunique()
+        if unique_values < 5:
+            labels = list(range(1, unique_values + 1))
+            scores = pd.qcut(values, unique_values, labels=labels, duplicates='drop')
+        else:
+            # Heavy ties collapse quantile edges; rank first so every quintile stays populated
+            scores = pd.qcut(values.rank(method='first'), 5, labels=[1, 2, 3, 4, 5])
+
+    # Handle any NaN values in scores (if quintiles couldn't be calculated due to data distribution)
+    # Convert categorical to numeric first to avoid categorical fill errors
+    scores = pd.Series(scores, index=values.index).astype(float)
+    return scores.fillna(3).astype(int), bins
+
+def assign_segments(rfm_data: pd.DataFrame) -> np.ndarray:
+    """
+    Enhanced segment assignment with more granular customer categorization.
+    Rules are evaluated in order over whole score columns; the first match wins.
+
+    Args:
+        rfm_data: DataFrame containing recency_score, frequency_score, monetary_score
+
+    Returns:
+        Array of customer segment names
+    """
+    r = rfm_data['recency_score'].to_numpy()
+    f = rfm_data['frequency_score'].to_numpy()
+    m = rfm_data['monetary_score'].to_numpy()
+
+    rules = [
+        # Champions - Best customers across all dimensions
+        ((r == 5) & (f == 5) & (m == 5), 'Champions'),
+        # VIP Customers - Excellent recent customers with high engagement
+        ((r == 5) & (f >= 4) & (m >= 4), 'VIP Customers'),
+        # Loyal Customers - Consistently engaged customers
+        ((r >= 3) & (f >= 4) & (m >= 3), 'Loyal Customers'),
+        # Potential Loyalists - Recent customers with decent engagement
+        ((r >= 4) & (f >= 2) & (m >= 2) & ~((f >= 4) & (m >= 4)), 'Potential Loyalists'),
+        # Recent Customers - New customers with limited history
+        ((r >= 4) & (f <= 2) & (m <= 2), 'Recent Customers'),
+        # Promising - Moderate recency with high value but low frequency
+        ((r >= 3) & (f <= 2) & (m >= 4), 'Promising'),
+        # Customers Needing Attention - Moderate recency but low engagement
+        ((r >= 3) & (f <= 2) & (m <= 3) & (m >= 2), 'Customers Needing Attention'),
+        # About to Sleep - Declining recency but were valuable
+        ((r <= 3) & (f <= 2) & (m >= 3), 'About to Sleep'),
+        # Cannot Lose Them - Previously excellent customers now inactive (check before At Risk)
+        ((r <= 2) & (f >= 4) & (m >= 4), 'Cannot Lose Them'),
+        # At Risk - High-value customers with poor recent engagement
+        ((r <= 2) & (f >= 3) & (m >= 4), 'At Risk'),
+        # Lost Customers - Very inactive but were decent customers
+        ((r == 1) & (f >= 2) & (m >= 2), 'Lost Customers'),
+        # Hibernating - Low engagement across all metrics
+        ((r <= 2) & (f <= 2) & (m <= 2), 'Hibernating'),
+        # Price Sensitive - High frequency but low value
+        ((r >= 3) & (f >= 4) & (m <= 2), 'Price Sensitive'),
+        # Bargain Hunters - Moderate engagement with lower value
+        ((r >= 3) & (f >= 2) & (m <= 2), 'Bargain Hunters'),
+    ]
+    # Default for any remaining combinations
+    return np.select([condition for condition, _ in rules], [segment for _, segment in rules], default='Other')
+
+@timed_stage
+def aggregate_customer_metrics(sales_df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.Timestamp]:
+    """
+    Aggregate preprocessed transactions into raw per-customer RFM metrics.
+
+    Args:
+        sales_df: Preprocessed sales transactions
+
+    Returns:
+        Tuple of (DataFrame with customer_code, recency, last_sale_date, first_sale_date, frequency, monetary;
+        reference date used for recency)
+    """
+    # Group sales data by customer_code to calculate RFM (and profit) metrics in one pass
+    rfm_data = sales_df.groupby('customer_code').agg(**metric_aggregations(sales_df)).reset_index()
+    if FREQUENCY_MODE == 'invoices':
+        rfm_data['frequency'] = distinct_invoice_frequency(sales_df, ['customer_code'])
+    return add_recency(rfm_data, sales_df['date'].max())
+
+def metric_aggregations(sales_df: pd.DataFrame) -> Dict[str, Tuple[str, str]]:
+    """
+    Named aggregations for the per-customer metrics.
+    Profit is included when the sales data carries a profit column. Frequency counts rows
+    here; in "invoices" mode callers replace it with distinct_invoice_frequency().
+    """
+    aggregations = {
+        'last_sale_date': ('date', 'max'),              # Last Sale Date
+        'first_sale_date': ('date', 'min'),             # First Sale Date, for customer tenure
+        'frequency': ('transaction_number', 'count'),   # Frequency: count of transactions
+        'monetary': ('amount', 'sum'),                  # Monetary: total spend
+    }
+    if 'profit' in sales_df.columns:
+        aggregations['total_profit'] = ('profit', 'sum')  # Profit: total margin earned
+    return aggregations
+
+def add_recency(rfm_data: pd.DataFrame, last_date: pd.Timestamp) -> Tuple[pd.DataFrame, pd.Timestamp]:
+    """
+    Add the recency column to aggregated customer metrics.
+
+    Args:
+        rfm_data: Per-customer metrics with customer_code, last_sale_date, frequency, monetary
+        last_date: Most recent transaction date in the dataset
+
+    Returns:
+        Tuple of (metrics with recency after customer_code, reference date used)
+    """
+    # Calculate reference date for Recency (most recent transaction date + 1 day)
+    reference_date = last_date + pd.Timedelta(days=1)
+    logger.info(f"Reference date for Recency calculation: {reference_date}")
+
+    # Recency: days from the reference date back to the last purchase (negative)
+    rfm_data.insert(1, 'recency', (rfm_data['last_sale_date'] - reference_date).dt.days)
+    logger.info(f"Calculated raw RFM metrics for {rfm_data.shape[0]} customers.")
+    return rfm_data, reference_date
+
 def calculate_rfm_scores(customer_df, sales_df):
     """
     Calculate RFM scores based on preprocessed data.
@@ -279,25 +810,43 @@ def calculate_rfm_scores(customer_df, sales_df):
     Returns RFM data with scores for customer segmentation.
     """
     try:
-        # Calculate reference date for Recency (most recent transaction date + 1 day)
-        reference_date = sales_df['date'].max() + pd.Timedelta(days=1)
-        logger.info(f"Reference date for Recency calculation: {reference_date}")
+        rfm_data, _ = aggregate_customer_metrics(sales_df)
+        return score_customer_metrics(rfm_data, customer_df, sales_df)
+    except Exception as e:
+        logger.error(f"Error in calculating RFM scores: {str(e)}")
+        raise
 
-        # Group sales data by customer_code to calculate RFM metrics
-        rfm_data = sales_df.groupby('customer_code').agg({
-            'date': [lambda x: (x.max() - reference_date).days, lambda x: x.max()],  # Recency: days from earliest date to last purchase, Last Sale Date
-            'transaction_number': 'count',                      # Frequency: count of transactions
-            'amount': 'sum'                                     # Monetary: total spend
-        }).reset_index()
+@timed_stage
+def score_customer_metrics(rfm_data, customer_df, sales_df, with_clusters: bool = True):
+    """
+    Score raw per-customer RFM metrics and assign segments.
 
-        # Flatten multi-level column index and rename columns for clarity
-        rfm_data.columns = ['customer_code', 'recency', 'last_sale_date', 'frequency', 'monetary']
-        logger.info(f"Calculated raw RFM metrics for {rfm_data.shape[0]} customers.")
+    Args:
+        rfm_data: Output of aggregate_customer_metrics (or an equivalent SQL aggregation)
+        customer_df: Preprocessed customer data
+        sales_df: Sales transactions covering at least the last 12 months, used for trends
+        with_clusters: Add cluster ids (if clustering is enabled); only meaningful when
+            rfm_data covers the whole customer base
 
+    Returns:
+        RFM data with scores, trends, segments and customer attributes
+    """
+    try:
         # Calculate Customer average transaction spend
         rfm_data['avg_transaction_spend'] = rfm_data['monetary'] / rfm_data['frequency']
         logger.info("Calculated average transaction spend for customers.")
 
+        # Profitability metrics derived from the aggregated profit
+        if 'total_profit' in rfm_data.columns:
+            rfm_data['margin_pct'] = (rfm_data['total_profit'] / rfm_data['monetary'].where(rfm_data['monetary'] != 0) * 100).round(2)
+            rfm_data['avg_margin_per_transaction'] = rfm_data['total_profit'] / rfm_data['frequency']
+            logger.info("Calculated profitability metrics for customers.")
+
+        # Tenure: days from the first purchase to the reference date used for recency
+        if 'first_sale_date' in rfm_data.columns:
+            rfm_data['tenure_days'] = (rfm_data['last_sale_date'] - rfm_data['first_sale_date']).dt.days + abs(rfm_data['recency'])
+            rfm_data['first_sale_date'] = rfm_data['first_sale_date'].dt.strftime('%d-%m-%y')
+
         # Format last_sale_date to DD-MM-YY
         rfm_data['last_sale_date'] = rfm_data['last_sale_date'].dt.strftime('%d-%m-%y')
         logger.info("Formatted last sale date to DD-MM-YY.")
@@ -319,156 +868,77 @@ def calculate_rfm_scores(customer_df, sales_df):
             rfm_data['trend_direction'] = "stable"
             rfm_data['trend_peak'] = 0
             rfm_data['trend_avg'] = 0
+            rfm_data['trend_slope'] = 0.0
+            rfm_data['trend_cv'] = 0.0
+            rfm_data['months_active'] = 0
+            rfm_data['longest_gap_months'] = 0
+            rfm_data['trend_mom_change'] = np.nan
 
         # Assign RFM scores based on quintiles (1 to 5, where 5 is best for all metrics)
-        try:
-            _, rec_bins = pd.qcut(rfm_data['recency'], 5, labels=[1, 2, 3, 4, 5], duplicates='drop', retbins=True)
-            rfm_data['recency_score'] = pd.qcut(rfm_data['recency'], 5, labels=[1, 2, 3, 4, 5], duplicates='drop')
-            logger.info(f"Recency quintile cut-offs: {rec_bins}")
-        except ValueError as e:
-            logger.warning(f"Recency qcut failed with error: {str(e)}. Falling back to simpler binning.")
-            unique_values = rfm_data['recency'].nunique()
-            if unique_values < 5:
-                labels = list(range(1, unique_values + 1))
-                rfm_data['recency_score'] = pd.qcut(rfm_data['recency'], unique_values, labels=labels, duplicates='drop')
-            else:
-                rfm_data['recency_score'] = pd.qcut(rfm_data['recency'], 5, labels=[1, 2, 3, 4, 5], duplicates='drop')
-                
-        try:
-            _, freq_bins = pd.qcut(rfm_data['frequency'], 5, labels=[1, 2, 3, 4, 5], duplicates='drop', retbins=True)
-            rfm_data['frequency_score'] = pd.qcut(rfm_data['frequency'], 5, labels=[1, 2, 3, 4, 5], duplicates='drop')
-            logger.info(f"Frequency quintile cut-offs: {freq_bins}")
-        except ValueError as e:
-            logger.warning(f"Frequency qcut failed with error: {str(e)}. Falling back to simpler binning.")
-            unique_values = rfm_data['frequency'].nunique()
-            if unique_values < 5:
-                labels = list(range(1, unique_values + 1))
-                rfm_data['frequency_score'] = pd.qcut(rfm_data['frequency'], unique_values, labels=labels, duplicates='drop')
-            else:
-                rfm_data['frequency_score'] = pd.qcut(rfm_data['frequency'], 5, labels=[1, 2, 3, 4, 5], duplicates='drop')
-                
-        try:
-            _, mon_bins = pd.qcut(rfm_data['monetary'], 5, labels=[1, 2, 3, 4, 5], duplicates='drop', retbins=True)
-            rfm_data['monetary_score'] = pd.qcut(rfm_data['monetary'], 5, labels=[1, 2, 3, 4, 5], duplicates='drop')
-            logger.info(f"Monetary quintile cut-offs: {mon_bins}")
-        except ValueError as e:
-            logger.warning(f"Monetary qcut failed with error: {str(e)}. Falling back to simpler binning.")
-            unique_values = rfm_data['monetary'].nunique()
-            if unique_values < 5:
-                labels = list(range(1, unique_values + 1))
-                rfm_data['monetary_score'] = pd.qcut(rfm_data['monetary'], unique_values, labels=labels, duplicates='drop')
-            else:
-                rfm_data['monetary_score'] = pd.qcut(rfm_data['monetary'], 5, labels=[1, 2, 3, 4, 5], duplicates='drop')
-
-        # Handle any NaN values in scores (if quintiles couldn't be calculated due to data distribution)
-        # Convert categorical to numeric first to avoid categorical fill errors
-        if hasattr(rfm_data['recency_score'], 'cat'):
-            rfm_data['recency_score'] = rfm_data['recency_score'].astype(float)
-        if hasattr(rfm_data['frequency_score'], 'cat'):
-            rfm_data['frequency_score'] = rfm_data['frequency_score'].astype(float)
-        if hasattr(rfm_data['monetary_score'], 'cat'):
-            rfm_data['monetary_score'] = rfm_data['monetary_score'].astype(float)
-            
-        rfm_data['recency_score'] = rfm_data['recency_score'].fillna(3).astype(int)
-        rfm_data['frequency_score'] = rfm_data['frequency_score'].fillna(3).astype(int)
-        rfm_data['monetary_score'] = rfm_data['monetary_score'].fillna(3).astype(int)
+        rfm_data['recency_score'], _ = quintile_scores(rfm_data['recency'], 'Recency')
+        rfm_data['frequency_score'], _ = quintile_scores(rfm_data['frequency'], 'Frequency')
+        rfm_data['monetary_score'], _ = quintile_scores(rfm_data['monetary'], 'Monetary')
+        if 'total_profit' in rfm_data.columns:
+            rfm_data['profit_score'], _ = quintile_scores(rfm_data['total_profit'], 'Profit')
 
         # Calculate combined RFM score (simple concatenation for segment identification)
         rfm_data['rfm_score'] = rfm_data['recency_score'].astype(str) + rfm_data['frequency_score'].astype(str) + rfm_data['monetary_score'].astype(str)
         logger.info("Assigned RFM scores based on quintiles.")
 
-        # Define customer segments based on RFM scores with enhanced granularity
-        def assign_segment(row):
-            """
-            Enhanced segment assignment with more granular customer categorization.
-            
-            Args:
-                row: DataFrame row containing recency_score, frequency_score, monetary_score
-                
-            Returns:
-                str: Customer segment name
-            """
-            r, f, m = row['recency_score'], row['frequency_score'], row['monetary_score']
-            
-            # Champions - Best customers across all dimensions
-            if r == 5 and f == 5 and m == 5:
-                return 'Champions'
-            
-            # VIP Customers - Excellent recent customers with high engagement
-            elif r == 5 and f >= 4 and m >= 4:
-                return 'VIP Customers'
-            
-            # Loyal Customers - Consistently engaged customers
-            elif r >= 3 and f >= 4 and m >= 3:
-                return 'Loyal Customers'
-            
-            # Potential Loyalists - Recent customers with decent engagement
-            elif r >= 4 and f >= 2 and m >= 2 and not (f >= 4 and m >= 4):
-                return 'Potential Loyalists'
-            
-            # Recent Customers - New customers with limited history
-            elif r >= 4 and f <= 2 and m <= 2:
-                return 'Recent Customers'
-            
-            # Promising - Moderate recency with high value but low frequency
-            elif r >= 3 and f <= 2 and m >= 4:
-                return 'Promising'
-            
-            # Customers Needing Attention - Moderate recency but low engagement
-            elif r >= 3 and f <= 2 and m <= 3 and m >= 2:
-                return 'Customers Needing Attention'
-            
-            # About to Sleep - Declining recency but were valuable
-            elif r <= 3 and f <= 2 and m >= 3:
-                return 'About to Sleep'
-            
-            # Cannot Lose Them - Previously excellent customers now inactive (check before At Risk)
-            elif r <= 2 and f >= 4 and m >= 4:
-                return 'Cannot Lose Them'
-            
-            # At Risk - High-value customers with poor recent engagement
-            elif r <= 2 and f >= 3 and m >= 4:
-                return 'At Risk'
-            
-            # Lost Customers - Very inactive but were decent customers
-            elif r == 1 and f >= 2 and m >= 2:
-                return 'Lost Customers'
-            
-            # Hibernating - Low engagement across all metrics
-            elif r <= 2 and f <= 2 and m <= 2:
-                return 'Hibernating'
-            
-            # Price Sensitive - High frequency but low value
-            elif r >= 3 and f >= 4 and m <= 2:
-                return 'Price Sensitive'
-            
-            # Bargain Hunters - Moderate engagement with lower value
-            elif r >= 3 and f >= 2 and m <= 2:
-                return 'Bargain Hunters'
-            
-            # Default for any remaining combinations
-            else:
-                return 'Other'
-        
-        rfm_data['segment'] = rfm_data.apply(assign_segment, axis=1)
+        rfm_data['segment'] = assign_segments(rfm_data)
         logger.info("Assigned customer segments based on RFM scores.")
 
+        # Churn risk from the trained model, if one has been trained
+        try:
+            from .churn_model import add_churn_probability
+            rfm_data = add_churn_probability(rfm_data)
+        except Exception as e:
+            logger.warning(f"Failed to score churn probability, continuing without it: {str(e)}")
+
+        # Data-driven clusters next to the rule-based segments, if clustering is enabled
+        if with_clusters:
+            try:
+                from .cluster_model import add_cluster_ids
+                rfm_data = add_cluster_ids(rfm_data)
+            except Exception as e:
+                logger.warning(f"Failed to assign clusters, continuing without them: {str(e)}")
+
         # Merge with customer data to include additional attributes if needed, selecting only required fields
         selected_columns = ['customer_code', 'customer_name', 'customer_type', 'customer_ranking', 'salesperson']
+        # Location columns feed the customer search index and the geographic rollups
+        selected_columns += [column for column in ['suburb', 'state', 'postcode'] if column in customer_df.columns]
         rfm_data = rfm_data.merge(customer_df[selected_columns], on='customer_code', how='left')
         logger.info(f"Merged RFM data with selected customer attributes, final shape: {rfm_data.shape}")
 
         return rfm_data
     except Exception as e:
-        logger.error(f"Error in calculating RFM scores: {str(e)}")
+        logger.error(f"Error in scoring RFM metrics: {str(e)}")
         raise
 
 def get_rfm_data():
+    """
+    Return the RFM dataset for the current data version.
+    The result is computed once per version of the source files and shared between
+    callers, so it must be treated as read-only.
+    """
+    return get_or_build("rfm", get_data_version(), compute_rfm_data)
+
+@timed_stage
+def compute_rfm_data():
     """
     Main function to orchestrate data loading, preprocessing, and RFM calculation.
+    With an embedded storage backend configured, the aggregation runs as SQL instead.
     Returns the final RFM dataset for API exposure.
     """
     try:
+        if STORAGE_BACKEND != 'csv':
+            from .storage_service import get_storage_engine
+            engine = get_storage_engine()
+            if engine is not None:
+                rfm_data = engine.compute_rfm_data()
+                logger.info(f"RFM data processing completed successfully using {engine.backend} storage.")
+                return rfm_data
+
         # Step 1: Load raw data
         customer_df, sales_df = load_data()
         
@@ -486,3 +956,108 @@ def get_rfm_data():
     except Exception as e:
         logger.error(f"Error in RFM data processing pipeline: {str(e)}")
         raise
+
+@timed_stage
+def load_preprocessed_sales() -> pd.DataFrame:
+    """
+    Load the full history of sales transactions that pass preprocessing.
+    Reads from the embedded storage backend when one is configured.
+    """
+    if STORAGE_BACKEND != 'csv':
+        from .storage_service import get_storage_engine
+        engine = get_storage_engine()
+        if engine is not None:
+            engine.ingest(read_data_version())
+            return engine.load_sales(valid_only=True)
+    _, sales_df = preprocess_data(*load_data())
+    return sales_df
+
+def get_partitioned_rfm_data(partition_by: str):
+    """
+    Return RFM data scored separately within each value of a partition column.
+    Each partition column is cached separately per data version.
+
+    Args:
+        partition_by: One of PARTITION_COLUMNS
+
+    Returns:
+        RFM dataset with a leading 'partition' column
+    """
+    if partition_by not in PARTITION_COLUMNS:
+        raise ValueError(f"Cannot partition by '{partition_by}', expected one of {PARTITION_COLUMNS}")
+    return get_or_build(f"rfm:{partition_by}", get_data_version(),
+                        lambda: compute_partitioned_rfm_data(partition_by))
+
+def compute_partitioned_rfm_data(partition_by: str, max_workers: int = RFM_PARTITION_WORKERS):
+    """
+    Compute per-partition quintiles and segments.
+
+    Raw metrics for every (partition, customer) pair come from a single grouped
+    aggregation with a shared reference date; quintile scoring and trends then run
+    per partition in a thread pool. Partitions carry no cluster ids: clusters are fitted
+    on the whole customer base, and a per-partition fit would number them unrelatedly.
+
+    Args:
+        partition_by: One of PARTITION_COLUMNS
+        max_workers: Threads used to score partitions in parallel
+
+    Returns:
+        RFM dataset with a leading 'partition' column
+    """
+    customer_df, sales_df = preprocess_data(*load_data())
+    return calculate_partitioned_rfm_scores(customer_df, sales_df, partition_by, max_workers)
+
+@timed_stage
+def calculate_partitioned_rfm_scores(customer_df, sales_df, partition_by: str, max_workers: int = RFM_PARTITION_WORKERS):
+    """
+    Score preprocessed data separately within each value of a partition column.
+
+    Args:
+        customer_df: Preprocessed customer data
+        sales_df: Preprocessed sales transactions
+        partition_by: One of PARTITION_COLUMNS
+        max_workers: Threads used to score partitions in parallel
+
+    Returns:
+        RFM dataset with a leading 'partition' column
+    """
+    try:
+        # Attach the partition key to every transaction
+        if partition_by == 'branch':
+            keys = sales_df[partition_by]
+        else:
+            lookup = customer_df.drop_duplicates('customer_code').set_index('customer_code')[partition_by]
+            keys = sales_df['customer_code'].map(lookup)
+        keys = keys.astype(object).where(keys.notna(), 'Unknown').astype(str)
+        sales_df = sales_df.assign(partition=keys.to_numpy())
+
+        # One grouped pass for the raw metrics of every partition
+        metrics = sales_df.groupby(['partition', 'customer_code'], sort=True).agg(
+            **metric_aggregations(sales_df)).reset_index()
+        if FREQUENCY_MODE == 'invoices':
+            metrics['frequency'] = distinct_invoice_frequency(sales_df, ['partition', 'customer_code'])
+        reference_date = sales_df['date'].max() + pd.Timedelta(days=1)
+        metrics.insert(2, 'recency', (metrics['last_sale_date'] - reference_date).dt.days)
+        logger.info(f"Calculated raw RFM metrics for {len(metrics)} customer/{partition_by} pairs.")
+
+        sales_by_partition = dict(tuple(sales_df.groupby('partition', sort=False)))
+
+        def score_partition(item):
+            partition, partition_metrics = item
+            scored = score_customer_metrics(
+                partition_metrics.drop(columns='partition').reset_index(drop=True),
+                customer_df, sales_by_partition[partition], with_clusters=False)
+            scored.insert(0, 'partition', partition)
+            return scored
+
+        partitions = list(metrics.groupby('partition', sort=True))
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            results = list(executor.map(score_partition, partitions))
+
+        rfm_data = pd.concat(results, ignore_index=True) if results else pd.DataFrame(columns=['partition'])
+        rfm_data = rfm_data.where(rfm_data.notna(), None)
+        logger.info(f"Scored {len(partitions)} {partition_by} partitions.")
+        return rfm_data
+    except Exception as e:
+        logger.error(f"Error in partitioned RFM processing by {partition_by}: {str(e)}")
+        raise
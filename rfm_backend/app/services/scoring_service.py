@@ -0,0 +1,210 @@
+"""
+Batch Scoring Service
+
+This module scores externally supplied customers against the quintile cut-offs of
+the current RFM dataset, so marketing tools can ask which segment a list of
+customers would fall into without adding them to the source data. The cut-offs
+are derived once per data version; a batch is then scored with NumPy
+searchsorted over each metric and the shared segment rules.
+"""
+
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .data_cache import get_or_build
+from .refresh_scheduler import register_warmer
+from .rfm_service import assign_segments, count_distinct, get_data_version, get_rfm_data, quintile_scores
+from ..core.config import FREQUENCY_MODE
+
+logger = logging.getLogger(__name__)
+
+# Metrics scored by the model, keyed by score column
+SCORED_METRICS = {'recency_score': 'recency', 'frequency_score': 'frequency', 'monetary_score': 'monetary'}
+
+# Columns required for each kind of batch
+SUMMARY_COLUMNS = ['recency_days', 'frequency', 'monetary']
+TRANSACTION_COLUMNS = ['customer_code', 'date', 'amount']
+
+
+@dataclass
+class ScoreBins:
+    """Cut-offs of one metric: values up to edges[i] get labels[i], larger values the last label."""
+    edges: np.ndarray
+    labels: np.ndarray
+
+    def score(self, values: np.ndarray) -> np.ndarray:
+        """Score metric values, giving missing values the middle score like the pipeline does."""
+        scores = self.labels[np.searchsorted(self.edges, values, side='left')]
+        return np.where(np.isnan(values), 3, scores)
+
+
+@dataclass
+class ScoringModel:
+    """Score cut-offs of the current RFM dataset and its recency reference date."""
+    bins: Dict[str, ScoreBins] = field(default_factory=dict)
+    reference_date: Optional[pd.Timestamp] = None
+
+
+def fit_score_bins(values: pd.Series, label: str) -> ScoreBins:
+    """
+    Derive the cut-offs that reproduce the pipeline's scores for one metric.
+
+    Args:
+        values: Metric over the reference customers
+        label: Metric name for logging
+
+    Returns:
+        ScoreBins using the quintile edges, or the per-score maxima when the
+        pipeline had to fall back to a simpler binning
+    """
+    scores, quintile_edges = quintile_scores(values, label)
+    if quintile_edges is not None:
+        # qcut bins are right-inclusive, which searchsorted(side='left') reproduces
+        return ScoreBins(edges=np.asarray(quintile_edges[1:-1], dtype='float64'), labels=np.arange(1, 6))
+
+    valid = values.notna()
+    if not valid.any():
+        return ScoreBins(edges=np.zeros(0), labels=np.array([3]))
+    upper = values[valid].groupby(scores[valid]).max().sort_index()
+    return ScoreBins(edges=upper.to_numpy(dtype='float64')[:-1], labels=upper.index.to_numpy())
+
+
+def build_scoring_model(rfm_df: pd.DataFrame) -> ScoringModel:
+    """
+    Build the scoring model from a scored RFM dataset.
+
+    Args:
+        rfm_df: Final RFM dataset with recency, frequency, monetary and last_sale_date
+
+    Returns:
+        ScoringModel with cut-offs for each RFM metric
+    """
+    model = ScoringModel()
+    for score_column, metric in SCORED_METRICS.items():
+        values = pd.to_numeric(rfm_df[metric], errors='coerce').astype('float64')
+        model.bins[score_column] = fit_score_bins(values, metric.capitalize())
+
+    # Recency is measured back from a shared reference date (last sale date + recency days)
+    if len(rfm_df):
+        last_sale = pd.to_datetime(rfm_df['last_sale_date'], format='%d-%m-%y', errors='coerce')
+        reference = last_sale - pd.to_timedelta(pd.to_numeric(rfm_df['recency'], errors='coerce'), unit='D')
+        model.reference_date = reference.max()
+    logger.info(f"Built scoring model over {len(rfm_df)} customers, reference date {model.reference_date}.")
+    return model
+
+
+def get_scoring_model() -> ScoringModel:
+    """
+    Return the scoring model for the current data version, building it if needed.
+    """
+    return get_or_build("scoring_model", get_data_version(), lambda: build_scoring_model(get_rfm_data()))
+
+
+def summarize_transactions(transactions: pd.DataFrame, reference_date: Optional[pd.Timestamp]) -> pd.DataFrame:
+    """
+    Aggregate raw transactions into per-customer recency, frequency and monetary values.
+
+    Args:
+        transactions: DataFrame with customer_code, date and amount (and transaction_number,
+            counted once per invoice in "invoices" frequency mode)
+        reference_date: Date recency is measured from; defaults to the day after the last transaction
+
+    Returns:
+        DataFrame with customer_code, recency_days, frequency and monetary
+    """
+    missing = [column for column in TRANSACTION_COLUMNS if column not in transactions.columns]
+    if missing:
+        raise ValueError(f"Transactions are missing columns: {missing}")
+
+    dates = pd.to_datetime(transactions['date'], errors='coerce')
+    if dates.isna().any():
+        raise ValueError("Transactions contain unparseable dates")
+    amounts = pd.to_numeric(transactions['amount'], errors='coerce')
+
+    codes, uniques = pd.factorize(transactions['customer_code'].astype(str), sort=True)
+    n_customers = len(uniques)
+    if FREQUENCY_MODE == 'invoices' and 'transaction_number' in transactions.columns:
+        frequency = count_distinct(codes, transactions['transaction_number'], n_customers)
+    else:
+        frequency = np.bincount(codes, minlength=n_customers)
+    monetary = np.bincount(codes, weights=amounts.fillna(0.0).to_numpy(), minlength=n_customers)
+    last_sale = np.full(n_customers, np.iinfo(np.int64).min, dtype=np.int64)
+    np.maximum.at(last_sale, codes, dates.to_numpy(dtype='datetime64[ns]').view(np.int64))
+
+    if reference_date is None:
+        reference_date = dates.max() + pd.Timedelta(days=1)
+    recency_days = (pd.Timestamp(reference_date).value - last_sale) // pd.Timedelta(days=1).value
+
+    return pd.DataFrame({
+        'customer_code': np.asarray(uniques),
+        'recency_days': np.clip(recency_days, 0, None),
+        'frequency': frequency,
+        'monetary': monetary,
+    })
+
+
+def score_batch(model: ScoringModel, batch: pd.DataFrame) -> pd.DataFrame:
+    """
+    Score a batch of per-customer metrics against the model's cut-offs.
+
+    Args:
+        model: Scoring model for the current data version
+        batch: DataFrame with recency_days (days since last purchase), frequency and monetary,
+            plus an optional customer_code
+
+    Returns:
+        DataFrame with the input metrics, R/F/M scores, rfm_score and segment
+    """
+    missing = [column for column in SUMMARY_COLUMNS if column not in batch.columns]
+    if missing:
+        raise ValueError(f"Batch is missing columns: {missing}")
+
+    metrics = {
+        # The dataset stores recency as negative days, so more recent customers score higher
+        'recency_score': -np.abs(pd.to_numeric(batch['recency_days'], errors='coerce').to_numpy(dtype='float64')),
+        'frequency_score': pd.to_numeric(batch['frequency'], errors='coerce').to_numpy(dtype='float64'),
+        'monetary_score': pd.to_numeric(batch['monetary'], errors='coerce').to_numpy(dtype='float64'),
+    }
+    result = batch[[column for column in ['customer_code'] + SUMMARY_COLUMNS if column in batch.columns]].copy()
+    for score_column, values in metrics.items():
+        result[score_column] = model.bins[score_column].score(values).astype(np.int64)
+
+    combined = result['recency_score'] * 100 + result['frequency_score'] * 10 + result['monetary_score']
+    result['rfm_score'] = combined.astype(str)
+    result['segment'] = assign_segments(result)
+    return result
+
+
+def score_records(model: ScoringModel, batch: pd.DataFrame) -> pd.DataFrame:
+    """
+    Score a batch of either per-customer summaries or raw transactions.
+
+    Args:
+        model: Scoring model for the current data version
+        batch: Summary columns (recency_days, frequency, monetary) or transaction
+            columns (customer_code, date, amount)
+
+    Returns:
+        Scored DataFrame, one row per summary row or per customer in the transactions
+    """
+    if 'date' in batch.columns:
+        batch = summarize_transactions(batch, model.reference_date)
+    return score_batch(model, batch)
+
+
+def columnar_records(df: pd.DataFrame) -> Dict[str, List]:
+    """Convert a scored batch into a column -> values dict for JSON responses, with NaN as None."""
+    records = {}
+    for column in df.columns:
+        values = df[column]
+        if values.dtype.kind == 'f' and values.isna().any():
+            values = values.astype(object).where(values.notna(), None)
+        records[column] = values.tolist()
+    return records
+
+
+register_warmer(get_scoring_model)
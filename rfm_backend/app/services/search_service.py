@@ -0,0 +1,248 @@
+"""
+Customer Search Service
+
+This module builds a search index over customer names, codes and suburbs so the
+dashboard can find a customer without loading the full RFM table. Text is
+normalized (accents stripped, lower case, punctuation collapsed to spaces) and
+indexed twice, once per data version:
+
+- a prefix index: every field value and every word in it, sorted, so the
+  customers whose field or word starts with the query are one searchsorted range;
+- a trigram index: postings of customers per character trigram, so queries with
+  typos still match customers sharing most of their trigrams.
+
+Trigrams are generated for whole blocks of customers at once from fixed-width
+byte matrices, and a query scores its candidates with one np.unique over the
+concatenated postings.
+"""
+
+import itertools
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from .data_cache import get_or_build
+from .refresh_scheduler import register_warmer
+from .rfm_service import get_data_version, get_rfm_data
+
+logger = logging.getLogger(__name__)
+
+# Customer fields that are searched
+SEARCH_FIELDS = ['customer_name', 'customer_code', 'suburb']
+
+# RFM fields returned with every match
+RESULT_FIELDS = ['customer_code', 'customer_name', 'suburb', 'customer_type', 'salesperson', 'segment',
+                 'recency_days', 'frequency', 'monetary', 'rfm_score']
+
+# Share of the query's trigrams a customer must contain to match without a prefix match
+MIN_SIMILARITY = 0.3
+
+# Longest field prefix indexed for trigrams, and customers processed per block
+MAX_FIELD_LENGTH = 64
+BLOCK_SIZE = 100_000
+
+# Normalized text is ASCII, so a trigram packs into 21 bits
+_CHAR_BITS = 7
+
+
+def normalize_text(values: pd.Series) -> pd.Series:
+    """
+    Normalize text for indexing and querying.
+
+    Each distinct value is normalized once, so repeated suburbs and names cost nothing extra.
+
+    Args:
+        values: Raw text values
+
+    Returns:
+        Lower-case ASCII with runs of other characters replaced by single spaces;
+        missing values (including the literal "nan") become empty strings
+    """
+    codes, uniques = pd.factorize(values.fillna('').astype(str))
+    text = (pd.Series(uniques, dtype=object)
+            .str.normalize('NFKD').str.encode('ascii', 'ignore').str.decode('ascii')
+            .str.lower().str.replace(r'[^a-z0-9]+', ' ', regex=True).str.strip())
+    text = text.mask(text == 'nan', '').to_numpy(dtype=object)
+    return pd.Series(text[codes] if len(text) else np.zeros(0, dtype=object), index=values.index, dtype=object)
+
+
+def trigram_codes(texts: np.ndarray) -> tuple:
+    """
+    Generate the trigrams of each text, padded with one space on each side.
+
+    Args:
+        texts: Normalized ASCII strings
+
+    Returns:
+        Tuple of (row of each trigram, packed trigram code)
+    """
+    lengths = np.char.str_len(texts.astype(str)) if len(texts) else np.zeros(0, dtype=np.int64)
+    lengths = np.minimum(lengths, MAX_FIELD_LENGTH)
+    width = int(lengths.max()) if len(lengths) else 0
+    if width == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    chars = np.frombuffer(np.asarray(texts, dtype=f'S{width}').tobytes(), dtype=np.uint8).reshape(len(texts), width)
+    padded = np.full((len(texts), width + 2), ord(' '), dtype=np.int64)
+    padded[:, 1:-1] = chars
+    # Bytes past each text's end are NUL padding; turn the first into the closing space
+    rows = np.arange(len(texts))
+    padded[rows, lengths + 1] = ord(' ')
+
+    grams = (padded[:, :-2] << (2 * _CHAR_BITS)) | (padded[:, 1:-1] << _CHAR_BITS) | padded[:, 2:]
+    valid = (np.arange(width)[None, :] < lengths[:, None]) & (lengths[:, None] > 0)
+    return np.broadcast_to(rows[:, None], grams.shape)[valid], grams[valid]
+
+
+@dataclass
+class SearchIndex:
+    """Prefix and trigram indexes over the searchable customer fields."""
+    frame: pd.DataFrame = field(default_factory=pd.DataFrame)
+    monetary: np.ndarray = field(default_factory=lambda: np.zeros(0))
+    tokens: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=object))
+    token_offsets: np.ndarray = field(default_factory=lambda: np.zeros(1, dtype=np.int64))
+    token_owners: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+    grams: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+    gram_offsets: np.ndarray = field(default_factory=lambda: np.zeros(1, dtype=np.int64))
+    postings: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+
+    def _prefix_matches(self, query: str) -> tuple:
+        """Customers with a field or word starting with the query, and those matching it exactly."""
+        lo = np.searchsorted(self.tokens, query, side='left')
+        hi = np.searchsorted(self.tokens, query + '\x7f', side='left')
+        owners = self.token_owners[self.token_offsets[lo]:self.token_offsets[hi]]
+        exact = np.zeros(0, dtype=np.int64)
+        if lo < hi and self.tokens[lo] == query:
+            exact = self.token_owners[self.token_offsets[lo]:self.token_offsets[lo + 1]]
+        return np.unique(owners), np.unique(exact)
+
+    def _trigram_matches(self, query: str) -> tuple:
+        """Candidates sharing trigrams with the query and the share of the query's trigrams each contains."""
+        # The query is only padded at the start, so a query that stops mid-word still matches fully
+        _, grams = trigram_codes(np.array([query]))
+        grams = np.unique(grams[:-1]) if len(grams) > 1 else np.unique(grams)
+        if len(grams) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        positions = np.searchsorted(self.grams, grams)
+        found = positions < len(self.grams)
+        found[found] = self.grams[positions[found]] == grams[found]
+        blocks = [self.postings[self.gram_offsets[p]:self.gram_offsets[p + 1]] for p in positions[found]]
+        if not blocks:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        candidates, shared = np.unique(np.concatenate(blocks), return_counts=True)
+        return candidates, shared / len(grams)
+
+    def search(self, query: str, limit: int = 20) -> List[Dict]:
+        """
+        Find customers matching a query, best matches first.
+
+        Exact field matches rank above prefix matches, which rank above trigram-only
+        matches; ties are broken by trigram similarity and then by monetary value.
+
+        Args:
+            query: Free-text query (name, code or suburb, typos allowed)
+            limit: Maximum number of matches
+
+        Returns:
+            List of result dicts with RFM fields and a match score
+        """
+        normalized = normalize_text(pd.Series([query])).iloc[0]
+        if not normalized or self.frame.empty:
+            return []
+
+        candidates, similarity = self._trigram_matches(normalized)
+        prefix, exact = self._prefix_matches(normalized)
+        keep = similarity >= MIN_SIMILARITY
+        ids = np.union1d(candidates[keep], prefix)
+        if len(ids) == 0:
+            return []
+
+        scores = np.zeros(len(ids))
+        scores[np.searchsorted(ids, candidates[keep])] = similarity[keep]
+        scores[np.searchsorted(ids, prefix)] += 1.0
+        scores[np.searchsorted(ids, exact)] += 1.0
+
+        order = np.lexsort((-self.monetary[ids], -scores))[:limit]
+
+        columns = [column for column in RESULT_FIELDS if column in self.frame.columns]
+        results = self.frame.iloc[ids[order]][columns]
+        results = results.astype(object).where(results.notna(), None)
+        records = results.to_dict('records')
+        for record, score in zip(records, scores[order]):
+            record['score'] = round(float(score), 4)
+        return records
+
+
+def build_search_index(rfm_df: pd.DataFrame) -> SearchIndex:
+    """
+    Build the prefix and trigram indexes for an RFM dataset.
+
+    Args:
+        rfm_df: Final RFM dataset
+
+    Returns:
+        SearchIndex over the dataset's customers
+    """
+    frame = rfm_df.reset_index(drop=True)
+    index = SearchIndex(frame=frame)
+    index.monetary = (pd.to_numeric(frame['monetary'], errors='coerce').fillna(0.0).to_numpy(dtype='float64')
+                      if 'monetary' in frame.columns else np.zeros(len(frame)))
+
+    token_values, token_owners, gram_rows, gram_codes = [], [], [], []
+    for column in SEARCH_FIELDS:
+        if column not in frame.columns:
+            continue
+        text = normalize_text(frame[column]).to_numpy(dtype=object)
+
+        # Prefix tokens: the whole field plus each of its words
+        words = [value.split() for value in text]
+        lengths = np.fromiter(map(len, words), dtype=np.int64, count=len(words))
+        token_values += [text, np.array(list(itertools.chain.from_iterable(words)), dtype=object)]
+        token_owners += [np.arange(len(text)), np.repeat(np.arange(len(text)), lengths)]
+
+        for start in range(0, len(text), BLOCK_SIZE):
+            rows, codes = trigram_codes(text[start:start + BLOCK_SIZE])
+            gram_rows.append(rows + start)
+            gram_codes.append(codes)
+
+    if token_values:
+        # Sort the distinct tokens once and group the owners of each token contiguously
+        codes, uniques = pd.factorize(np.concatenate(token_values))
+        owners = np.concatenate(token_owners)
+        rank = np.empty(len(uniques), dtype=np.int64)
+        order = np.argsort(uniques.astype(str))
+        rank[order] = np.arange(len(uniques))
+        token_rank = rank[codes]
+        grouped = np.argsort(token_rank, kind='stable')
+        index.tokens = uniques[order].astype(object)
+        index.token_offsets = np.concatenate([[0], np.cumsum(np.bincount(token_rank, minlength=len(uniques)))])
+        index.token_owners = owners[grouped]
+        if len(index.tokens) and index.tokens[0] == '':
+            # Empty fields are not searchable
+            index.tokens = index.tokens[1:]
+            index.token_offsets = index.token_offsets[1:]
+
+    if gram_codes:
+        # One posting per (trigram, customer) pair, grouped by trigram
+        pairs = np.unique((np.concatenate(gram_codes) << 32) | np.concatenate(gram_rows))
+        grams, starts = np.unique(pairs >> 32, return_index=True)
+        index.grams = grams
+        index.gram_offsets = np.append(starts, len(pairs))
+        index.postings = pairs & 0xFFFFFFFF
+
+    logger.info(f"Built search index for {len(frame)} customers with {len(index.tokens)} prefix tokens "
+                f"and {len(index.grams)} trigrams.")
+    return index
+
+
+def get_search_index() -> SearchIndex:
+    """
+    Return the search index for the current data version, building it if needed.
+    """
+    return get_or_build("search", get_data_version(), lambda: build_search_index(get_rfm_data()))
+
+
+register_warmer(get_search_index)
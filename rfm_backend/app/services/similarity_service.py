@@ -0,0 +1,197 @@
+"""
+Lookalike Customer Service
+
+This module finds the customers that behave most like a given customer. Every
+customer is described by one feature vector: log-scaled recency, frequency,
+monetary value and average transaction spend, plus the log-scaled 12-month spend
+trend. Features are standardized so no single unit dominates the distance, and the
+trend months are down-weighted so the whole trend counts as TREND_WEIGHT features.
+
+The vectors are built into a float32 matrix once per data version. A query is an
+exact nearest-neighbour search by Euclidean distance, computed block by block as
+one matrix-vector product per block, so memory stays bounded and each query takes
+milliseconds even for large customer bases.
+"""
+
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from .data_cache import get_or_build
+from .refresh_scheduler import register_warmer
+from .rfm_service import get_data_version, get_rfm_data
+
+logger = logging.getLogger(__name__)
+
+# Scalar features, log-scaled before standardization
+FEATURE_COLUMNS = ['recency_days', 'frequency', 'monetary', 'avg_transaction_spend']
+
+# Months of spend trend in the vector, and how many scalar features the trend counts as
+TREND_MONTHS = 12
+TREND_WEIGHT = 2.0
+
+# Customer attributes returned with every neighbour
+RESULT_FIELDS = ['customer_code', 'customer_name', 'customer_type', 'salesperson', 'segment',
+                 'recency_days', 'frequency', 'monetary', 'avg_transaction_spend']
+
+# Customers scored per matrix product
+BLOCK_SIZE = 262_144
+
+
+def trend_matrix(trend_values: pd.Series, months: int = TREND_MONTHS) -> np.ndarray:
+    """
+    Stack the monthly trend lists into a matrix, aligned on the most recent month.
+
+    Args:
+        trend_values: List of monthly spend per customer (may be empty or missing)
+        months: Number of trailing months kept
+
+    Returns:
+        Array of shape (customers, months); months without data are 0
+    """
+    lists = [values if isinstance(values, (list, tuple, np.ndarray)) else [] for values in trend_values]
+    lengths = np.fromiter((min(len(values), months) for values in lists), dtype=np.int64, count=len(lists))
+    flat = np.fromiter((value for values, length in zip(lists, lengths) for value in values[len(values) - length:]),
+                       dtype='float64', count=int(lengths.sum()))
+    matrix = np.zeros((len(lists), months))
+    # Right-align each customer's trailing months so column -1 is always the latest month
+    rows = np.repeat(np.arange(len(lists)), lengths)
+    columns = months + np.arange(len(flat)) - np.repeat(np.cumsum(lengths), lengths)
+    matrix[rows, columns] = flat
+    return matrix
+
+
+def feature_matrix(rfm_df: pd.DataFrame) -> np.ndarray:
+    """
+    Build the standardized feature vectors of an RFM dataset.
+
+    Args:
+        rfm_df: Final RFM dataset
+
+    Returns:
+        float32 array of shape (customers, features)
+    """
+    columns = [pd.to_numeric(rfm_df[column], errors='coerce').to_numpy(dtype='float64')
+               if column in rfm_df.columns else np.zeros(len(rfm_df))
+               for column in FEATURE_COLUMNS]
+    features = np.column_stack(columns) if columns else np.zeros((len(rfm_df), 0))
+    trends = trend_matrix(rfm_df['trend_values']) if 'trend_values' in rfm_df.columns else np.zeros((len(rfm_df), 0))
+
+    # Spend and counts are heavy-tailed; refunds can make a trend month slightly negative
+    raw = np.log1p(np.clip(np.hstack([features, trends]), 0, None))
+    mean = np.nanmean(raw, axis=0) if len(raw) else np.zeros(raw.shape[1])
+    std = np.nanstd(raw, axis=0) if len(raw) else np.ones(raw.shape[1])
+    std[~(std > 0)] = 1.0
+    standardized = np.nan_to_num((raw - mean) / std)
+
+    if trends.shape[1]:
+        standardized[:, features.shape[1]:] *= np.sqrt(TREND_WEIGHT / trends.shape[1])
+    return standardized.astype(np.float32)
+
+
+@dataclass
+class SimilarityIndex:
+    """Standardized feature vectors of every customer."""
+    frame: pd.DataFrame = field(default_factory=pd.DataFrame)
+    vectors: np.ndarray = field(default_factory=lambda: np.zeros((0, 0), dtype=np.float32))
+    squared_norms: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.float32))
+    positions: pd.Index = field(default_factory=pd.Index)
+
+    def nearest(self, vector: np.ndarray, k: int, exclude: int = -1) -> tuple:
+        """
+        Find the k customers closest to a feature vector.
+
+        Args:
+            vector: Standardized feature vector
+            k: Number of neighbours
+            exclude: Position to leave out (the query customer itself)
+
+        Returns:
+            Tuple of (positions, distances), closest first
+        """
+        best_positions, best_distances = [], []
+        query_norm = float(vector @ vector)
+        for start in range(0, len(self.vectors), BLOCK_SIZE):
+            block = self.vectors[start:start + BLOCK_SIZE]
+            # |x - q|^2 = |x|^2 - 2 x.q + |q|^2, one matrix-vector product per block
+            distances = self.squared_norms[start:start + BLOCK_SIZE] - 2.0 * (block @ vector) + query_norm
+            if start <= exclude < start + len(block):
+                distances[exclude - start] = np.inf
+            take = min(k, len(block))
+            candidates = np.argpartition(distances, take - 1)[:take]
+            best_positions.append(candidates + start)
+            best_distances.append(distances[candidates])
+
+        if not best_positions:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        positions = np.concatenate(best_positions)
+        distances = np.concatenate(best_distances)
+        order = np.lexsort((positions, distances))[:k]
+        keep = np.isfinite(distances[order])
+        return positions[order][keep], np.sqrt(np.maximum(distances[order][keep], 0))
+
+    def similar(self, customer_code: str, k: int = 10) -> List[Dict]:
+        """
+        Find the customers that behave most like a customer.
+
+        Args:
+            customer_code: Customer to find lookalikes for
+            k: Number of lookalikes
+
+        Returns:
+            List of customer attribute dicts with the feature-space distance, closest first
+
+        Raises:
+            KeyError: If the customer is not in the dataset
+        """
+        position = self.positions.get_loc(customer_code)
+        if not isinstance(position, (int, np.integer)):
+            # Duplicate codes resolve to a slice or mask; use the first row
+            position = int(np.arange(len(self.positions))[position][0])
+        positions, distances = self.nearest(self.vectors[position], k, exclude=position)
+
+        columns = [column for column in RESULT_FIELDS if column in self.frame.columns]
+        results = self.frame.iloc[positions][columns]
+        results = results.astype(object).where(results.notna(), None)
+        records = results.to_dict('records')
+        for record, distance in zip(records, distances):
+            record['distance'] = round(float(distance), 4)
+        return records
+
+
+def build_similarity_index(rfm_df: pd.DataFrame) -> SimilarityIndex:
+    """
+    Build the feature vectors for an RFM dataset.
+
+    Args:
+        rfm_df: Final RFM dataset
+
+    Returns:
+        SimilarityIndex over the dataset's customers
+    """
+    frame = rfm_df.reset_index(drop=True)
+    vectors = feature_matrix(frame)
+    index = SimilarityIndex(
+        frame=frame,
+        vectors=vectors,
+        squared_norms=np.einsum('ij,ij->i', vectors, vectors),
+        positions=pd.Index(frame['customer_code'].astype(str)),
+    )
+    # Checking uniqueness also builds the code lookup table, so the first query does not pay for it
+    if not index.positions.is_unique:
+        logger.warning("Customer codes are not unique; lookups use the first matching customer.")
+    logger.info(f"Built similarity index for {len(frame)} customers with {vectors.shape[1]} features.")
+    return index
+
+
+def get_similarity_index() -> SimilarityIndex:
+    """
+    Return the similarity index for the current data version, building it if needed.
+    """
+    return get_or_build("similarity", get_data_version(), lambda: build_similarity_index(get_rfm_data()))
+
+
+register_warmer(get_similarity_index)
@@ -0,0 +1,403 @@
+"""
+Storage Service Module
+
+This module provides an optional embedded storage backend (SQLite, or DuckDB when it
+is installed) behind the load_data/get_rfm_data interface. Source CSVs are ingested
+in chunks into tables indexed on (customer_code, date), the per-customer RFM
+aggregation is pushed down as SQL, and the scored results are materialized in a
+table that endpoints can query with filters and pagination without holding the
+transaction history in the API process.
+
+Tables are rebuilt under a staging name and swapped in with a rename inside one
+transaction, and SQLite runs in WAL mode, so concurrent queries see either the old
+or the new tables, never a missing or half-filled one. Only the RFM aggregation and
+the results queries run in SQL: the scored frame is still cached in memory, and the
+cohort, partitioned and churn pipelines still read the full valid sales history
+through load_preprocessed_sales().
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+from contextlib import closing
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from . import rfm_service
+from ..core.config import FREQUENCY_MODE, SALES_DEDUP_ENABLED, STORAGE_BACKEND, STORAGE_CHUNK_SIZE, STORAGE_PATH
+
+logger = logging.getLogger(__name__)
+
+# Columns stored for every transaction: the full schema the CSV pipeline reads, so load_data()
+# returns the same frame from either backend
+SALES_TABLE_COLUMNS = rfm_service.SALES_COLUMNS
+
+# Columns that may be used to filter and sort materialized results
+RESULT_FILTER_COLUMNS = ['customer_type', 'salesperson', 'segment', 'customer_ranking']
+RESULT_SORT_COLUMNS = ['customer_code', 'customer_name', 'recency_days', 'frequency', 'monetary',
+                       'avg_transaction_spend', 'recency_score', 'frequency_score', 'monetary_score',
+                       'segment', 'trend_avg', 'total_profit', 'margin_pct', 'avg_margin_per_transaction',
+                       'profit_score', 'trend_slope', 'trend_cv', 'months_active', 'longest_gap_months',
+                       'trend_mom_change', 'churn_probability', 'cluster_id']
+
+# Serializes ingests (refresh scheduler and worker threads) so the version check and reload happen once
+_ingest_lock = threading.Lock()
+
+# Suffix of the tables a rebuild writes before they are swapped in
+STAGING_SUFFIX = '_staging'
+
+SALES_DDL = """
+CREATE TABLE sales_staging (
+    transaction_number VARCHAR,
+    date TIMESTAMP,
+    branch VARCHAR,
+    cost DOUBLE,
+    customer_code VARCHAR,
+    amount DOUBLE,
+    profit DOUBLE,
+    delivery_suburb VARCHAR,
+    postcode VARCHAR,
+    row_hash BIGINT
+)
+"""
+
+
+class StorageEngine:
+    """Embedded SQL store for transactions and materialized RFM results."""
+
+    def __init__(self, backend: str, path):
+        if backend == 'duckdb':
+            try:
+                import duckdb  # noqa: F401
+            except ImportError:
+                logger.warning("duckdb is not installed, falling back to SQLite storage.")
+                backend = 'sqlite'
+        self.backend = backend
+        self.path = str(path)
+
+    def connect(self):
+        """Open a new connection to the store."""
+        if self.backend == 'duckdb':
+            import duckdb
+            return duckdb.connect(self.path)
+        conn = sqlite3.connect(self.path)
+        # Readers keep their snapshot while a rebuild is swapped in, instead of blocking on it
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    # --- helpers -------------------------------------------------------------
+
+    def _query_frame(self, conn, sql: str, params: Tuple = ()) -> pd.DataFrame:
+        if self.backend == 'duckdb':
+            return conn.execute(sql, list(params)).df()
+        return pd.read_sql_query(sql, conn, params=params)
+
+    def _date_param(self, value: pd.Timestamp):
+        # SQLite stores dates as sortable ISO text, DuckDB as native timestamps
+        if self.backend == 'duckdb':
+            return value.to_pydatetime()
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+
+    def _write_frame(self, conn, table: str, df: pd.DataFrame, replace: bool) -> None:
+        if self.backend == 'duckdb':
+            conn.register('frame_to_write', df)
+            if replace:
+                conn.execute(f"CREATE OR REPLACE TABLE {table} AS SELECT * FROM frame_to_write")
+            else:
+                conn.execute(f"INSERT INTO {table} SELECT * FROM frame_to_write")
+            conn.unregister('frame_to_write')
+        else:
+            df.to_sql(table, conn, if_exists='replace' if replace else 'append', index=False)
+
+    def _commit(self, conn) -> None:
+        # DuckDB runs in autocommit mode and rejects commit() outside a transaction
+        if self.backend == 'sqlite':
+            conn.commit()
+
+    def _swap_in(self, conn, tables: List[str], indexes: List[str], meta: Optional[Dict[str, str]] = None) -> None:
+        """
+        Replace live tables with their staged copies in one transaction.
+
+        Args:
+            conn: Open connection whose staged tables are complete and committed
+            tables: Live table names; each is replaced by its STAGING_SUFFIX copy
+            indexes: CREATE INDEX statements run on the swapped-in tables
+            meta: Meta entries committed together with the swap
+        """
+        conn.execute("BEGIN TRANSACTION")
+        try:
+            for table in tables:
+                conn.execute(f"DROP TABLE IF EXISTS {table}")
+                conn.execute(f"ALTER TABLE {table}{STAGING_SUFFIX} RENAME TO {table}")
+            for statement in indexes:
+                conn.execute(statement)
+            for key, value in (meta or {}).items():
+                self._set_meta(conn, key, value)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _get_meta(self, conn, key: str) -> Optional[str]:
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key VARCHAR PRIMARY KEY, value VARCHAR)")
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", [key]).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, conn, key: str, value: str) -> None:
+        conn.execute("DELETE FROM meta WHERE key = ?", [key])
+        conn.execute("INSERT INTO meta VALUES (?, ?)", [key, value])
+
+    # --- ingest --------------------------------------------------------------
+
+    def ingest(self, version: Optional[str], chunk_size: int = STORAGE_CHUNK_SIZE) -> bool:
+        """
+        Load the source CSVs into the store unless this data version is already there.
+
+        The tables are loaded under staging names and swapped in together with the new
+        data version, so queries never see a partial load.
+
+        Args:
+            version: Data version of the source files
+            chunk_size: Sales rows parsed and inserted per batch
+
+        Returns:
+            True if the tables were (re)loaded
+        """
+        with _ingest_lock, closing(self.connect()) as conn:
+            if version is not None and self._get_meta(conn, 'data_version') == version:
+                return False
+
+            customer_df = rfm_service.read_csv_with_schema(
+                rfm_service.CUSTOMER_DATA_PATH, 'customer_data.csv', rfm_service.CUSTOMER_COLUMNS)
+            customer_df = rfm_service.preprocess_customers(customer_df)
+            self._write_frame(conn, f'customers{STAGING_SUFFIX}', customer_df, replace=True)
+
+            conn.execute(f"DROP TABLE IF EXISTS sales{STAGING_SUFFIX}")
+            conn.execute(SALES_DDL)
+            rows = 0
+            sales_columns = rfm_service.sales_source_columns(rfm_service.SALES_DATA_PATH)
+            for chunk in rfm_service.iter_csv_with_schema(
+                    rfm_service.SALES_DATA_PATH, 'sales_data.csv', sales_columns, chunk_size):
+                rows += self._insert_sales(conn, chunk)
+            if SALES_DEDUP_ENABLED:
+                rows -= self._drop_duplicate_sales(conn)
+            self._commit(conn)
+
+            self._swap_in(conn, ['customers', 'sales'],
+                          ["CREATE INDEX idx_sales_customer_date ON sales (customer_code, date)"],
+                          meta={'data_version': version or ''})
+        logger.info(f"Ingested {len(customer_df)} customers and {rows} sales rows into {self.backend} store.")
+        return True
+
+    def _insert_sales(self, conn, chunk: pd.DataFrame) -> int:
+        batch = pd.DataFrame({
+            column: chunk[column] if column in chunk.columns else None
+            for column in SALES_TABLE_COLUMNS
+        })
+        batch['customer_code'] = batch['customer_code'].astype(str)
+        for column in ['branch', 'delivery_suburb', 'postcode']:
+            # Categorical and string columns are stored as plain text
+            batch[column] = batch[column].astype(object).where(batch[column].notna(), None)
+        # Key of the full source row as read, including columns the table does not keep
+        # (stored as signed 64-bit), for dropping repeated rows across chunks
+        batch[rfm_service.ROW_HASH_COLUMN] = rfm_service.row_hashes(chunk).view('int64')
+        if self.backend == 'duckdb':
+            self._write_frame(conn, f'sales{STAGING_SUFFIX}', batch, replace=False)
+        else:
+            batch['date'] = batch['date'].dt.strftime('%Y-%m-%d %H:%M:%S')
+            rows = batch.astype(object).where(batch.notna(), None).itertuples(index=False, name=None)
+            conn.executemany(f"INSERT INTO sales{STAGING_SUFFIX} VALUES ({', '.join('?' * len(batch.columns))})", rows)
+        return len(batch)
+
+    def _drop_duplicate_sales(self, conn) -> int:
+        """
+        Delete every staged sales row that repeats an earlier one; returns the rows removed.
+
+        Rows must match on every stored column as well as the source row key, so a hash
+        collision alone never drops a row; source columns the table does not keep are
+        compared through the key.
+        """
+        key_columns = ', '.join(SALES_TABLE_COLUMNS + [rfm_service.ROW_HASH_COLUMN])
+        table = f"sales{STAGING_SUFFIX}"
+        before = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        conn.execute(f"DELETE FROM {table} WHERE rowid NOT IN (SELECT MIN(rowid) FROM {table} GROUP BY {key_columns})")
+        removed = before - conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        logger.info(f"Dropped {removed} sales rows repeating an earlier source row.")
+        return removed
+
+    # --- queries -------------------------------------------------------------
+
+    # Same exclusions as preprocess_data: negative amounts and unknown customers
+    VALID_SALES = "amount >= 0 AND customer_code IN (SELECT customer_code FROM customers)"
+
+    def load_customers(self) -> pd.DataFrame:
+        """Return the preprocessed customer table."""
+        with closing(self.connect()) as conn:
+            return self._query_frame(conn, "SELECT * FROM customers")
+
+    def load_sales(self, since: Optional[pd.Timestamp] = None, valid_only: bool = False,
+                   with_row_hash: bool = False) -> pd.DataFrame:
+        """
+        Return stored transactions, optionally only those on or after a date.
+
+        Args:
+            since: Earliest transaction date to return
+            valid_only: Apply the preprocessing exclusions in SQL
+            with_row_hash: Also return the source row key, so preprocess_data's duplicate
+                check tells apart rows that differ only in columns the table does not keep
+
+        Returns:
+            Sales DataFrame with parsed dates
+        """
+        clauses, params = [], []
+        if valid_only:
+            clauses.append(self.VALID_SALES)
+        if since is not None:
+            clauses.append("date >= ?")
+            params.append(self._date_param(since))
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        columns = SALES_TABLE_COLUMNS + ([rfm_service.ROW_HASH_COLUMN] if with_row_hash else [])
+        with closing(self.connect()) as conn:
+            sales_df = self._query_frame(conn, f"SELECT {', '.join(columns)} FROM sales{where}", tuple(params))
+        sales_df['date'] = pd.to_datetime(sales_df['date'])
+        return sales_df
+
+    def aggregate_customer_metrics(self) -> Tuple[pd.DataFrame, pd.Timestamp]:
+        """
+        Compute raw per-customer RFM metrics with a single SQL aggregation.
+
+        Returns:
+            Same shape as rfm_service.aggregate_customer_metrics
+        """
+        frequency = ("COUNT(DISTINCT transaction_number)" if FREQUENCY_MODE == 'invoices'
+                     else "COUNT(transaction_number)")
+        sql = f"""
+            SELECT customer_code,
+                   MAX(date) AS last_sale_date,
+                   MIN(date) AS first_sale_date,
+                   {frequency} AS frequency,
+                   SUM(amount) AS monetary,
+                   SUM(profit) AS total_profit
+            FROM sales
+            WHERE {self.VALID_SALES}
+            GROUP BY customer_code
+            ORDER BY customer_code
+        """
+        with closing(self.connect()) as conn:
+            rfm_data = self._query_frame(conn, sql)
+        rfm_data['last_sale_date'] = pd.to_datetime(rfm_data['last_sale_date'])
+        rfm_data['first_sale_date'] = pd.to_datetime(rfm_data['first_sale_date'])
+        return rfm_service.add_recency(rfm_data, rfm_data['last_sale_date'].max())
+
+    def write_results(self, rfm_data: pd.DataFrame) -> None:
+        """Materialize scored RFM results for filtered, paginated queries."""
+        results = rfm_data.copy()
+        if 'trend_values' in results.columns:
+            results['trend_values'] = results['trend_values'].map(json.dumps)
+        indexes = [f"CREATE INDEX idx_rfm_results_{column} ON rfm_results ({column})"
+                   for column in ['segment', 'salesperson', 'customer_type'] if column in results.columns]
+        with closing(self.connect()) as conn:
+            self._write_frame(conn, f'rfm_results{STAGING_SUFFIX}', results, replace=True)
+            self._commit(conn)
+            self._swap_in(conn, ['rfm_results'], indexes)
+        logger.info(f"Materialized {len(results)} RFM results in {self.backend} store.")
+
+    def query_results(self, filters: Dict[str, Optional[str]], limit: int, offset: int,
+                      sort: str = 'monetary', descending: bool = True) -> Tuple[int, List[Dict]]:
+        """
+        Query materialized RFM results with filters and pagination.
+
+        Args:
+            filters: Filter column -> value ("All"/None means no filter)
+            limit: Page size
+            offset: Rows to skip
+            sort: Column to sort by (must be in RESULT_SORT_COLUMNS and in the materialized results)
+            descending: Sort direction
+
+        Returns:
+            Tuple of (total matching rows, page of records)
+
+        Raises:
+            ValueError: If the results have no such column (e.g. churn_probability before a
+                churn model is trained, or cluster_id with clustering disabled)
+        """
+        clauses, params = [], []
+        for column, value in filters.items():
+            if column in RESULT_FILTER_COLUMNS and value not in (None, '', 'All'):
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        order = f" ORDER BY {sort} {'DESC' if descending else 'ASC'}, customer_code"
+
+        with closing(self.connect()) as conn:
+            # One read transaction, so the count and the page come from the same snapshot
+            conn.execute("BEGIN TRANSACTION")
+            columns = [column[0] for column in conn.execute("SELECT * FROM rfm_results LIMIT 0").description]
+            if sort not in columns:
+                raise ValueError(f"Cannot sort by '{sort}': not in the current results")
+            total = conn.execute(f"SELECT COUNT(*) FROM rfm_results{where}", params).fetchone()[0]
+            page = self._query_frame(conn, f"SELECT * FROM rfm_results{where}{order} LIMIT ? OFFSET ?",
+                                     tuple(params + [limit, offset]))
+        if 'trend_values' in page.columns:
+            page['trend_values'] = page['trend_values'].map(lambda value: json.loads(value) if value else [])
+        return int(total), page.astype(object).where(page.notna(), None).to_dict('records')
+
+    # --- pipeline ------------------------------------------------------------
+
+    def load_data(self) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Ingest if needed and return the stored customer and sales data."""
+        self.ingest(rfm_service.read_data_version())
+        return self.load_customers(), self.load_sales(with_row_hash=True)
+
+    def compute_rfm_data(self) -> pd.DataFrame:
+        """
+        Run the RFM pipeline with the aggregation pushed down to SQL.
+        Only the last 12 months of valid transactions are read back, for the trend sparklines.
+        """
+        self.ingest(rfm_service.read_data_version())
+        customer_df = self.load_customers()
+        rfm_data, reference_date = self.aggregate_customer_metrics()
+
+        last_date = reference_date - pd.Timedelta(days=1)
+        recent_sales = self.load_sales(since=last_date - pd.DateOffset(months=12), valid_only=True)
+        rfm_data = rfm_service.score_customer_metrics(rfm_data, customer_df, recent_sales)
+        rfm_data = rfm_data.where(rfm_data.notna(), None)
+
+        self.write_results(rfm_data)
+        return rfm_data
+
+
+def get_storage_engine() -> Optional[StorageEngine]:
+    """
+    Return the configured storage engine, or None when the CSV backend is in use.
+    """
+    if STORAGE_BACKEND not in ('sqlite', 'duckdb'):
+        return None
+    return StorageEngine(STORAGE_BACKEND, STORAGE_PATH)
+
+
+def query_rfm_results(filters: Dict[str, Optional[str]], limit: int, offset: int,
+                      sort: str = 'monetary', descending: bool = True) -> Tuple[int, List[Dict]]:
+    """
+    Filter and paginate RFM results from the store, or from the cached frame with the CSV backend.
+    """
+    if sort not in RESULT_SORT_COLUMNS:
+        raise ValueError(f"Cannot sort by '{sort}'")
+
+    engine = get_storage_engine()
+    if engine is not None:
+        rfm_service.get_rfm_data()  # make sure results for the current version are materialized
+        return engine.query_results(filters, limit, offset, sort, descending)
+
+    rfm_df = rfm_service.get_rfm_data()
+    if sort not in rfm_df.columns:
+        raise ValueError(f"Cannot sort by '{sort}': not in the current results")
+    mask = pd.Series(True, index=rfm_df.index)
+    for column, value in filters.items():
+        if column in RESULT_FILTER_COLUMNS and column in rfm_df.columns and value not in (None, '', 'All'):
+            mask &= rfm_df[column] == value
+    matched = rfm_df[mask].sort_values([sort, 'customer_code'], ascending=[not descending, True])
+    page = matched.iloc[offset:offset + limit]
+    return len(matched), page.astype(object).where(page.notna(), None).to_dict('records')
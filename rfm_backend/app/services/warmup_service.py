@@ -0,0 +1,150 @@
+"""
+Startup Warm-up Module
+
+This module fills the artifact cache when the API starts, so the first request
+does not pay for the CSV parse and RFM computation. The RFM frame is loaded from
+the batch artifacts written by `python -m app.cli` when a run exists for the
+current data version, and computed otherwise; the refresh scheduler's warmers then
+build the dependent artifacts. Warm-up runs in a background thread, and readiness
+is reported from the cache itself, so the health endpoints answer immediately.
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+import pandas as pd
+
+from . import rfm_service
+from .artifact_store import MANIFEST_FILE, read_artifact, read_manifest
+from .data_cache import get_cached, get_or_build
+from .refresh_scheduler import is_file_complete, scheduler as refresh_scheduler
+from ..core.config import ARTIFACT_DIR
+
+logger = logging.getLogger(__name__)
+
+status: Dict = {
+    'state': 'idle',
+    'source': None,
+    'data_version': None,
+    'started_at': None,
+    'finished_at': None,
+    'duration_seconds': None,
+    'error': None,
+}
+
+
+def load_snapshot(version: str, root=ARTIFACT_DIR) -> Optional[pd.DataFrame]:
+    """
+    Load the precomputed RFM frame for a data version.
+
+    Args:
+        version: Data version of the source files
+        root: Artifact root directory
+
+    Returns:
+        The RFM frame in the shape compute_rfm_data() returns, or None if no batch
+        run exists for this version or it was computed with other scoring settings
+    """
+    run_dir = Path(root) / version
+    if not (run_dir / MANIFEST_FILE).exists():
+        return None
+    manifest = read_manifest(run_dir)
+    entry = manifest.get('artifacts', {}).get('rfm')
+    if entry is None or manifest.get('as_of') is not None:
+        return None
+    settings = rfm_service.pipeline_settings()
+    options = manifest.get('options', {})
+    recorded = {key: options.get(key) for key in settings}
+    if recorded != settings:
+        logger.info(f"Batch run {run_dir} was computed with {recorded}, not the API's {settings}; computing instead.")
+        return None
+
+    rfm_data = read_artifact(run_dir, entry)
+    # Parquet and Arrow return array columns as NumPy arrays; the API serves plain lists
+    for column in entry.get('array_columns', []):
+        rfm_data[column] = [list(values) for values in rfm_data[column]]
+    logger.info(f"Loaded {len(rfm_data)} precomputed RFM rows from {run_dir}")
+    return rfm_data.where(rfm_data.notna(), None)
+
+
+def warm_up(root=ARTIFACT_DIR) -> None:
+    """
+    Fill the cache for the current data version and build the dependent artifacts.
+
+    Args:
+        root: Artifact root directory
+    """
+    started = time.perf_counter()
+    status.update({'state': 'warming', 'started_at': datetime.now().isoformat(timespec='seconds'), 'error': None})
+    try:
+        version = rfm_service.read_data_version()
+        if version is None:
+            raise FileNotFoundError("Source data files are missing")
+        status['data_version'] = version
+        if not all(is_file_complete(path) for path in (rfm_service.CUSTOMER_DATA_PATH, rfm_service.SALES_DATA_PATH)):
+            # The refresh scheduler picks the files up once they are complete
+            raise RuntimeError("Source data files are still being written")
+
+        snapshot = None
+        try:
+            snapshot = load_snapshot(version, root)
+        except Exception as e:
+            logger.warning(f"Failed to load precomputed RFM artifacts, computing instead: {str(e)}")
+        if snapshot is not None:
+            get_or_build("rfm", version, lambda: snapshot)
+        status['source'] = 'snapshot' if snapshot is not None else 'computed'
+
+        # Computes the frame if no snapshot was loaded, publishes the version and runs the warmers
+        refresh_scheduler.refresh(version)
+        if get_cached("rfm", version) is None:
+            raise RuntimeError(refresh_scheduler.get_status()['last_failure_reason'] or "RFM computation failed")
+        status['state'] = 'ready'
+    except Exception as e:
+        logger.error(f"Startup warm-up failed: {str(e)}")
+        status.update({'state': 'failed', 'error': str(e)})
+    finally:
+        status.update({
+            'finished_at': datetime.now().isoformat(timespec='seconds'),
+            'duration_seconds': round(time.perf_counter() - started, 3),
+        })
+        logger.info(f"Startup warm-up {status['state']} in {status['duration_seconds']}s ({status['source']})")
+
+
+def start_warm_up(on_done: Optional[Callable[[], None]] = None) -> threading.Thread:
+    """
+    Run warm_up() in a daemon thread.
+
+    Args:
+        on_done: Called in the thread once warm-up has finished, e.g. to start the file watcher
+
+    Returns:
+        The started thread
+    """
+    def run():
+        warm_up()
+        if on_done is not None:
+            on_done()
+
+    status['state'] = 'warming'
+    thread = threading.Thread(target=run, name="rfm-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def readiness() -> Dict:
+    """
+    Report whether requests for the current data version are served from the cache.
+
+    Returns:
+        Dict with ready, the data version and the warm-up status
+    """
+    try:
+        version = rfm_service.get_data_version(wait=0)
+    except rfm_service.DataNotReadyError:
+        version = None
+    ready = version is not None and get_cached("rfm", version) is not None
+    return {'ready': ready, 'data_version': version, 'warm_up': dict(status)}
@@ -0,0 +1,95 @@
+"""
+Worker Pool Module
+
+This module runs CPU-bound pipeline work off the event loop. A fixed set of worker
+threads executes submitted calls, and a slot semaphore caps how many calls may be
+running or queued at once, so a burst of heavy requests is rejected up front instead
+of piling up behind a long recompute. Light endpoints stay on the event loop and keep
+responding while the workers are busy.
+"""
+
+import contextvars
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+
+from .profiling import run_profiled
+from ..core.config import WORKER_QUEUE_DEPTH, WORKER_THREADS
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerPoolFull(Exception):
+    """Raised when every worker is busy and the queue is at its depth limit."""
+
+
+class WorkerPool:
+    """Thread pool with a bound on running plus queued calls."""
+
+    def __init__(self, max_workers: int = 2, max_queue: int = 8):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rfm-worker")
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+    @property
+    def in_flight(self) -> int:
+        """Number of calls currently running or queued."""
+        return self._in_flight
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """
+        Submit a call to the pool without blocking.
+
+        Args:
+            fn: Callable to run in a worker thread
+            *args, **kwargs: Arguments passed to fn
+
+        Returns:
+            Future for the call's result
+
+        Raises:
+            WorkerPoolFull: If the pool has no free slot
+        """
+        if not self._slots.acquire(blocking=False):
+            logger.warning(f"Worker pool full ({self._in_flight} calls in flight), rejecting {getattr(fn, '__name__', fn)}")
+            raise WorkerPoolFull(f"{self._in_flight} calls already in flight")
+        with self._lock:
+            self._in_flight += 1
+        try:
+            # Run in a copy of the caller's context so request-scoped state (e.g. profiling) follows the call
+            future = self._executor.submit(self._run, contextvars.copy_context(), fn, args, kwargs)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(self._release_if_cancelled)
+        return future
+
+    def _run(self, context: contextvars.Context, fn: Callable, args, kwargs):
+        # The slot is held until the call finishes, even if the waiting request has timed out,
+        # and is freed before the result is published so callers can resubmit immediately
+        try:
+            return context.run(run_profiled, fn, *args, **kwargs)
+        finally:
+            self._release()
+
+    def _release_if_cancelled(self, future: Future) -> None:
+        # Calls cancelled while still queued never reach _run
+        if future.cancelled():
+            self._release()
+
+    def _release(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def shutdown(self, wait: bool = False) -> None:
+        """Stop accepting calls and cancel anything still queued."""
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+# Shared pool used by the API endpoints
+worker_pool = WorkerPool(max_workers=WORKER_THREADS, max_queue=WORKER_QUEUE_DEPTH)
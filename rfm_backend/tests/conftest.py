@@ -0,0 +1,26 @@
+"""
+Shared Test Fixtures
+
+Fixtures for the segmentation test data used across the service tests, as frames and
+as CSV files in the documented source layout.
+"""
+
+import pytest
+from tests.test_enhanced_segmentation import TestEnhancedSegmentation
+
+
+@pytest.fixture
+def segmentation_data():
+    """Customer and sales frames of the segmentation test data, fresh for each test."""
+    return TestEnhancedSegmentation().create_test_data()
+
+
+@pytest.fixture
+def source_files(tmp_path, segmentation_data):
+    """Write the segmentation test data to CSV files."""
+    customer_df, sales_df = segmentation_data
+    customer_path = tmp_path / 'customer_data.csv'
+    sales_path = tmp_path / 'sales_data.csv'
+    customer_df.to_csv(customer_path, index=False)
+    sales_df.assign(date=sales_df['date'].dt.strftime('%Y-%m-%d')).to_csv(sales_path, index=False)
+    return customer_path, sales_path
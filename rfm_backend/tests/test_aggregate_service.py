@@ -0,0 +1,77 @@
+"""
+Unit Tests for the Chart Aggregate Service
+
+This module checks the bincount aggregates against pandas reductions of the same data.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from app.services.aggregate_service import build_aggregate_index, monetary_bins
+
+
+@pytest.fixture
+def rfm_df():
+    """Random scored customers across a few segments and salespeople."""
+    rng = np.random.default_rng(21)
+    n = 300
+    return pd.DataFrame({
+        'customer_code': [f'C{i:03d}' for i in range(n)],
+        'recency_score': rng.integers(1, 6, n),
+        'frequency_score': rng.integers(1, 6, n),
+        'monetary_score': rng.integers(1, 6, n),
+        'monetary': rng.gamma(2, 500, n).round(2),
+        'segment': rng.choice(['Champions', 'At Risk', 'Hibernating'], n),
+        'salesperson': rng.choice(['Q1', 'Q2', 'Q3'], n),
+        'customer_type': rng.choice(['Tiler', 'Builder'], n),
+        'customer_ranking': rng.choice(['A', 'B'], n),
+    })
+
+
+def test_grids_and_segments_match_pandas(rfm_df):
+    """Filtered grids and segment totals equal the equivalent groupbys."""
+    result = build_aggregate_index(rfm_df).aggregate({'salesperson': 'Q2', 'customer_type': 'All'})
+    selected = rfm_df[rfm_df['salesperson'] == 'Q2']
+
+    assert result['customer_count'] == len(selected)
+    expected = selected.groupby(['recency_score', 'frequency_score'])['monetary'].agg(['count', 'sum'])
+    counts = np.array(result['grids']['rf']['counts'])
+    revenue = np.array(result['grids']['rf']['revenue'])
+    for (r, f), row in expected.iterrows():
+        assert counts[r - 1, f - 1] == row['count']
+        assert revenue[r - 1, f - 1] == pytest.approx(row['sum'], abs=0.01)
+    assert counts.sum() == len(selected)
+
+    segments = {item['segment']: item for item in result['segments']}
+    expected = selected.groupby('segment')['monetary'].agg(['count', 'sum'])
+    for segment, row in expected.iterrows():
+        assert segments[segment]['customer_count'] == row['count']
+        assert segments[segment]['revenue'] == pytest.approx(row['sum'], abs=0.01)
+
+
+def test_monetary_histogram(rfm_df):
+    """Every customer lands in exactly one histogram bin."""
+    result = build_aggregate_index(rfm_df).aggregate()
+    histogram = result['monetary_histogram']
+
+    assert len(histogram['edges']) == len(histogram['counts']) + 1
+    assert sum(histogram['counts']) == len(rfm_df)
+    assert sum(histogram['revenue']) == pytest.approx(rfm_df['monetary'].sum(), abs=0.1)
+
+    edges, codes = monetary_bins(np.array([0.0, 10.0, 100.0, 1000.0]), n_bins=3)
+    assert codes.tolist() == [0, 0, 1, 2], "Zero spend falls in the first bin and the maximum in the last"
+
+
+def test_indexes_share_the_facet_index(rfm_df, monkeypatch):
+    """Chart and geographic indexes reuse the cached facet index of the same data version."""
+    from app.services import aggregate_service, data_cache, facet_service, geo_service
+    for module in (aggregate_service, facet_service, geo_service):
+        monkeypatch.setattr(module, "get_data_version", lambda: 'facets-shared')
+        monkeypatch.setattr(module, "get_rfm_data", lambda: rfm_df)
+    data_cache.invalidate()
+    try:
+        facets = facet_service.get_facet_index()
+        assert aggregate_service.get_aggregate_index().facets is facets
+        assert geo_service.get_geo_index().facets is facets
+    finally:
+        data_cache.invalidate()
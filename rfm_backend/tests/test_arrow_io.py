@@ -0,0 +1,27 @@
+"""
+Unit Tests for the Arrow IPC Module
+
+This module tests how per-row array columns are prepared for Arrow encoding.
+"""
+
+import numpy as np
+import pandas as pd
+from app.services.arrow_io import is_array_column, stack_array_column, wants_arrow
+
+
+
+def test_array_columns_are_stacked():
+    """Per-row trend arrays stack into one matrix, padding short or missing rows with NaN."""
+    values = pd.Series([[1.0, 2.0, 3.0], [], None, [4.0, 5.0, 6.0]])
+    assert is_array_column(values)
+    matrix = stack_array_column(values)
+    assert matrix.shape == (4, 3)
+    np.testing.assert_array_equal(matrix[0], [1.0, 2.0, 3.0])
+    assert np.isnan(matrix[1]).all() and np.isnan(matrix[2]).all()
+
+
+def test_wants_arrow():
+    """Only an Accept header listing the Arrow stream media type selects Arrow."""
+    assert wants_arrow("application/vnd.apache.arrow.stream, application/json;q=0.5")
+    assert not wants_arrow("application/json")
+    assert not wants_arrow(None)
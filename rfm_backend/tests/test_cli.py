@@ -0,0 +1,91 @@
+"""
+Unit Tests for the RFM Batch Command Line
+
+This module runs the batch pipeline on small CSV files and checks the published
+artifacts and manifest.
+"""
+
+import json
+
+import pandas as pd
+import pytest
+from app import cli
+from app.services import rfm_service
+from app.services.artifact_store import latest_run, read_artifact, read_manifest
+
+
+def test_batch_run_matches_pipeline(source_files, tmp_path):
+    """Chunked batch results equal the in-memory pipeline and are listed in the manifest."""
+    customer_path, sales_path = source_files
+    output_dir = tmp_path / 'artifacts'
+    cli.main(['--customers', str(customer_path), '--sales', str(sales_path), '--output-dir', str(output_dir),
+              '--format', 'csv', '--chunk-size', '40', '--partition-by', 'salesperson'])
+
+    run_dir = latest_run(output_dir)
+    manifest = read_manifest(run_dir)
+    assert manifest['run_id'] == rfm_service.read_data_version((customer_path, sales_path))
+    assert manifest['row_counts']['sales'] == 173
+    assert set(manifest['artifacts']) == {'rfm', 'rfm_by_salesperson'}
+    assert {'load', 'score', 'total'} <= set(manifest['timings_seconds'])
+
+    rfm_data = read_artifact(run_dir, manifest['artifacts']['rfm']).set_index('customer_code')
+    customer_df, sales_df = rfm_service.preprocess_data(
+        rfm_service.read_csv_with_schema(customer_path, 'customer_data.csv', rfm_service.CUSTOMER_COLUMNS),
+        rfm_service.read_csv_with_schema(sales_path, 'sales_data.csv', rfm_service.SALES_COLUMNS))
+    expected = rfm_service.calculate_rfm_scores(customer_df, sales_df).set_index('customer_code')
+
+    assert manifest['artifacts']['rfm']['rows'] == len(expected)
+    pd.testing.assert_series_equal(rfm_data['monetary'], expected['monetary'].loc[rfm_data.index])
+    assert (rfm_data['segment'] == expected['segment'].loc[rfm_data.index]).all()
+    assert rfm_data['trend_values'].iloc[0] == pytest.approx(expected['trend_values'].loc[rfm_data.index[0]])
+
+
+def test_dedup_across_chunks_matches_pipeline(source_files, tmp_path, monkeypatch):
+    """Repeats spanning chunks are judged on the raw source row, as in the API pipeline."""
+    customer_path, sales_path = source_files
+    monkeypatch.setattr(rfm_service, "SALES_DEDUP_ENABLED", True)
+    sales = pd.read_csv(sales_path)
+    sales['salesperson'] = 'SP1'
+    # An exact repeat far from its original, and one that differs only in salesperson
+    sales = pd.concat([sales, sales.iloc[[0]], sales.iloc[[1]].assign(salesperson='SP2')], ignore_index=True)
+    # Two raw rows that preprocessing makes identical (both postcodes become "INVALID")
+    sales.loc[len(sales)] = sales.iloc[2]
+    sales.loc[[2, len(sales) - 1], 'postcode'] = [0, '0000']
+    sales.to_csv(sales_path, index=False)
+
+    counts = {}
+    _, cli_sales = cli.load_inputs(customer_path, sales_path, chunk_size=40, as_of=None, counts=counts)
+    monkeypatch.setattr(rfm_service, "CUSTOMER_DATA_PATH", customer_path)
+    monkeypatch.setattr(rfm_service, "SALES_DATA_PATH", sales_path)
+    _, api_sales = rfm_service.preprocess_data(*rfm_service.load_data())
+
+    assert counts['sales'] == 176
+    assert len(cli_sales) == len(api_sales) == 175
+    assert list(cli_sales.columns) == list(api_sales.columns)
+
+
+def test_manifest_records_pipeline_settings(source_files, tmp_path, monkeypatch):
+    """A run made with deduplication enabled says so in its manifest, with the other scoring settings."""
+    customer_path, sales_path = source_files
+    monkeypatch.setattr(rfm_service, "SALES_DEDUP_ENABLED", True)
+    monkeypatch.setattr(rfm_service, "FREQUENCY_MODE", 'invoices')
+    run_dir = cli.run(customer_path, sales_path, tmp_path / 'artifacts', 'csv')
+
+    options = read_manifest(run_dir)['options']
+    assert options['sales_dedup'] is True
+    assert options['frequency_mode'] == 'invoices'
+    assert options['clustering'] is False
+    assert {key: options[key] for key in rfm_service.pipeline_settings()} == rfm_service.pipeline_settings()
+
+
+def test_as_of_run_ignores_later_transactions(source_files, tmp_path):
+    """An as-of run is published under its own id and only sees earlier sales."""
+    customer_path, sales_path = source_files
+    output_dir = tmp_path / 'artifacts'
+    run_dir = cli.run(customer_path, sales_path, output_dir, 'csv', as_of=pd.Timestamp('2023-06-30'))
+
+    manifest = json.loads((run_dir / 'manifest.json').read_text())
+    assert manifest['run_id'].endswith('-asof-20230630')
+    assert manifest['row_counts']['sales_cleaned'] < manifest['row_counts']['sales']
+    assert not any(path.name.startswith('.') for path in output_dir.iterdir() if path.is_dir()), \
+        "The staging directory should be renamed into place"
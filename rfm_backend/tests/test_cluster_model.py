@@ -0,0 +1,78 @@
+"""
+Unit Tests for the Cluster Segmentation Module
+
+This module checks the silhouette against a direct computation and that mini-batch
+k-means recovers well-separated groups of customers.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from app.services import cluster_model
+from app.services.cluster_model import add_cluster_ids, cluster_summary, fit_clusters, silhouette_score
+
+
+@pytest.fixture
+def rfm_df():
+    """Three well-separated groups: big growing, mid steady, and small lapsed declining buyers."""
+    rng = np.random.default_rng(49)
+    groups = [(10, 120, 50000.0, 200.0), (90, 20, 4000.0, 0.0), (600, 2, 150.0, -20.0)]
+    frames = []
+    for number, (recency, frequency, monetary, slope) in enumerate(groups):
+        n = 200
+        frames.append(pd.DataFrame({
+            'customer_code': [f'G{number}-{i:03d}' for i in range(n)],
+            'recency_days': (recency * rng.lognormal(0, 0.1, n)).round(),
+            'frequency': (frequency * rng.lognormal(0, 0.1, n)).round(),
+            'monetary': monetary * rng.lognormal(0, 0.1, n),
+            'trend_slope': slope + rng.normal(0, 1, n),
+            'segment': ['Champions', 'Loyal Customers', 'Hibernating'][number],
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def test_silhouette_matches_direct_computation():
+    """The vectorized silhouette equals the textbook per-point definition."""
+    rng = np.random.default_rng(0)
+    points = rng.normal(size=(60, 3))
+    labels = rng.integers(0, 3, 60)
+
+    distances = np.sqrt(((points[:, None] - points[None]) ** 2).sum(axis=-1))
+    expected = []
+    for i in range(len(points)):
+        own = distances[i, labels == labels[i]].sum() / ((labels == labels[i]).sum() - 1)
+        nearest = min(distances[i, labels == c].mean() for c in set(labels) if c != labels[i])
+        expected.append((nearest - own) / max(own, nearest))
+
+    assert silhouette_score(points, labels) == pytest.approx(np.mean(expected))
+
+
+def test_fit_clusters_picks_k_by_silhouette(rfm_df, monkeypatch):
+    """The separated groups are found, also when batches are drawn from several chunks."""
+    monkeypatch.setattr(cluster_model, 'CHUNK_SIZE', 128)
+    model = fit_clusters(cluster_model.cluster_features(rfm_df), [2, 3, 4, 5])
+    assert model.k == 3
+    assert max(model.silhouettes, key=model.silhouettes.get) == 3
+
+
+def test_add_cluster_ids_orders_by_value(rfm_df):
+    """Every group maps to one cluster, numbered from the highest monetary value down."""
+    clustered = add_cluster_ids(rfm_df.copy(), k_range=[2, 3, 4])
+    by_group = clustered.groupby(clustered['customer_code'].str[:2])['cluster_id'].agg(['nunique', 'first'])
+    assert by_group['nunique'].tolist() == [1, 1, 1]
+    assert by_group['first'].tolist() == [0, 1, 2]
+
+
+def test_add_cluster_ids_disabled_and_tiny(rfm_df, monkeypatch):
+    """Clustering is skipped when disabled or when there are too few customers."""
+    monkeypatch.setattr(cluster_model, 'CLUSTERING_ENABLED', False)
+    assert 'cluster_id' not in add_cluster_ids(rfm_df.copy()).columns
+    assert 'cluster_id' not in add_cluster_ids(rfm_df.head(2).copy(), k_range=[2, 3]).columns
+
+
+def test_cluster_summary_segment_mix(rfm_df):
+    """The summary reports cluster sizes and their rule-based segment mix."""
+    summary = cluster_summary(add_cluster_ids(rfm_df.copy(), k_range=[3]))
+    assert [cluster['customer_count'] for cluster in summary] == [200, 200, 200]
+    assert summary[0]['segments'] == {'Champions': 200}
+    assert cluster_summary(rfm_df) == []
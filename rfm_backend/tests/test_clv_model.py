@@ -0,0 +1,122 @@
+"""
+Unit Tests for the Customer Lifetime Value Module
+
+This module tests the NumPy fallbacks for the special functions and the optimizer
+against known values, and that the BG/NBD and Gamma-Gamma fits recover the
+parameters of simulated customers.
+"""
+
+import math
+import numpy as np
+import pandas as pd
+import pytest
+from app.services.clv_model import (LOG_PARAM_BOUND, CLVModel, fit_clv_model, gammaln, hyp2f1, nelder_mead,
+                                    project_clv, summarize_segments)
+
+
+def simulate_customers(n=3000, weeks=104, seed=11, r=0.8, alpha=4.0, a=0.8, b=2.5, p=6.0, q=4.0, gamma=150.0):
+    """Simulate purchase histories from the BG/NBD and Gamma-Gamma generative processes."""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for i in range(n):
+        rate = rng.gamma(r, 1 / alpha)
+        dropout = rng.beta(a, b)
+        mean_spend = p / rng.gamma(q, 1 / gamma)
+        T = rng.uniform(30, weeks)
+        t, purchases = 0.0, [0.0]
+        while True:
+            t += rng.exponential(1 / rate)
+            if t > T:
+                break
+            purchases.append(t)
+            if rng.random() < dropout:
+                break
+        spend = rng.gamma(p, mean_spend / p, len(purchases))
+        rows.append({
+            'customer_code': f'C{i:04d}',
+            'segment': 'Champions' if len(purchases) > 3 else 'Hibernating',
+            'frequency': len(purchases),
+            'tenure_days': T * 7,
+            'recency_days': (T - purchases[-1]) * 7,
+            'avg_transaction_spend': spend.mean(),
+        })
+    return pd.DataFrame(rows)
+
+
+def test_special_function_fallbacks():
+    """The NumPy series and lgamma fallbacks agree with closed forms."""
+    values = np.array([0.5, 1.0, 3.0, 3.0, 10.5])
+    assert gammaln(values) == pytest.approx([math.lgamma(v) for v in values])
+    z = np.array([0.0, 0.3, 0.9])
+    # 2F1(1, 1; 2; z) = -log(1 - z) / z
+    assert hyp2f1(1.0, 1.0, 2.0, z)[1:] == pytest.approx(-np.log(1 - z[1:]) / z[1:], rel=1e-9)
+
+
+def test_hyp2f1_fallback_matches_closed_forms():
+    """The series fallback is accurate up to the z values projections use."""
+    z = np.array([0.1, 0.5, 0.8, 0.95])
+    # 2F1(a, b; b; z) = (1 - z)^-a
+    assert hyp2f1(2.7, 1.3, 1.3, z) == pytest.approx((1 - z) ** -2.7, rel=1e-9)
+    # 2F1(1/2, 1/2; 3/2; z^2) = arcsin(z) / z
+    assert hyp2f1(0.5, 0.5, 1.5, z ** 2) == pytest.approx(np.arcsin(z) / z, rel=1e-9)
+
+
+def test_nelder_mead_fallback_finds_known_minimum():
+    """The simplex fallback converges on the Rosenbrock function's minimum at (1, 1)."""
+    rosenbrock = lambda v: (1 - v[0]) ** 2 + 100 * (v[1] - v[0] ** 2) ** 2
+    assert nelder_mead(rosenbrock, np.array([-1.2, 1.0]), step=0.1) == pytest.approx([1.0, 1.0], abs=1e-3)
+
+
+def test_fit_stays_bounded_on_unmodelled_data():
+    """Histories the model does not describe still give finite, bounded parameters and projections."""
+    rng = np.random.default_rng(0)
+    tenure = rng.uniform(30, 1000, 500)
+    customers = pd.DataFrame({
+        'customer_code': range(500),
+        'frequency': rng.integers(1, 200, 500),
+        'tenure_days': tenure,
+        'recency_days': rng.uniform(0, 1, 500) * tenure,
+        'avg_transaction_spend': rng.gamma(2, 300, 500),
+    })
+
+    model = fit_clv_model(customers)
+
+    params = np.array(list(model.bgnbd.values()) + [model.gamma_gamma['p'], model.gamma_gamma['q']])
+    assert np.all(np.abs(np.log(params)) < LOG_PARAM_BOUND)
+    assert np.isfinite(project_clv(model, customers)['projected_value']).all()
+
+
+@pytest.mark.parametrize('seed', [11, 12, 13])
+def test_fit_recovers_simulated_parameters(seed):
+    """Fitted parameters land near the ones the customers were simulated with, whatever the sample."""
+    customers = simulate_customers(seed=seed)
+    model = fit_clv_model(customers)
+
+    assert model.bgnbd['r'] == pytest.approx(0.8, rel=0.3)
+    assert model.bgnbd['alpha'] == pytest.approx(4.0, rel=0.4)
+    assert model.bgnbd['a'] == pytest.approx(0.8, rel=0.3)
+    assert model.bgnbd['b'] == pytest.approx(2.5, rel=0.3)
+    # p, q and gamma trade off against each other; the population mean spend p * gamma / (q - 1) is well identified
+    gg = model.gamma_gamma
+    assert gg['p'] * gg['gamma'] / (gg['q'] - 1) == pytest.approx(6.0 * 150.0 / 3.0, rel=0.1)
+
+
+def test_projection_orders_customers():
+    """Recent frequent buyers are projected to be worth more than lapsed ones."""
+    model = CLVModel(bgnbd={'r': 0.8, 'alpha': 4.0, 'a': 0.8, 'b': 2.5},
+                     gamma_gamma={'p': 6.0, 'q': 4.0, 'gamma': 150.0})
+    customers = pd.DataFrame({
+        'customer_code': ['active', 'lapsed', 'new'],
+        'segment': ['Champions', 'Lost Customers', 'Recent Customers'],
+        'frequency': [30, 30, 1],
+        'tenure_days': [700, 700, 10],
+        'recency_days': [5, 500, 10],
+        'avg_transaction_spend': [200.0, 200.0, 200.0],
+    })
+
+    projection = project_clv(model, customers, months=12).set_index('customer_code')
+
+    assert projection.loc['active', 'projected_value'] > 10 * projection.loc['lapsed', 'projected_value']
+    assert projection.loc['new', 'expected_purchases'] > 0
+    segments = summarize_segments(projection.reset_index())
+    assert segments[0]['segment'] == 'Champions'
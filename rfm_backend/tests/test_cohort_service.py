@@ -0,0 +1,56 @@
+"""
+Unit Tests for the Cohort Retention Service
+
+This module checks the bincount-built cohort matrices against a groupby reference.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from app.services.cohort_service import build_cohort_matrix
+
+
+def create_sales(seed=5, n=2000):
+    """Random transactions for 150 customers over 18 months."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'customer_code': [f'C{i:03d}' for i in rng.integers(0, 150, n)],
+        'date': pd.Timestamp('2023-01-01') + pd.to_timedelta(rng.integers(0, 540, n), unit='D'),
+        'amount': rng.gamma(2, 50, n).round(2),
+    })
+
+
+def test_cohort_matrix_matches_groupby():
+    """Active customers and revenue per (cohort, month since acquisition) match nested groupbys."""
+    sales_df = create_sales()
+    matrix = build_cohort_matrix(sales_df)
+
+    month = sales_df['date'].dt.to_period('M')
+    acquisition = month.groupby(sales_df['customer_code']).transform('min')
+    age = (month - acquisition).map(lambda offset: offset.n)
+    reference = sales_df.assign(cohort=acquisition.astype(str), age=age)
+    active = reference.groupby(['cohort', 'age'])['customer_code'].nunique()
+    revenue = reference.groupby(['cohort', 'age'])['amount'].sum()
+
+    assert matrix.cohorts == sorted(reference['cohort'].unique())
+    assert matrix.cohort_sizes.tolist() == reference.groupby('cohort')['customer_code'].nunique().tolist()
+    for (cohort, age), count in active.items():
+        row = matrix.cohorts.index(cohort)
+        assert matrix.active_customers[row, age] == count
+        assert matrix.revenue[row, age] == pytest.approx(revenue[(cohort, age)])
+    assert (matrix.retention_pct[:, 0] == 100.0).all(), "Every customer is active in their acquisition month"
+
+
+def test_unobserved_cells_are_empty():
+    """Cells beyond the last month in the data are None in the JSON form."""
+    sales_df = pd.DataFrame({
+        'customer_code': ['A', 'A', 'B'],
+        'date': pd.to_datetime(['2024-01-15', '2024-03-01', '2024-02-10']),
+        'amount': [10.0, 20.0, 5.0],
+    })
+    result = build_cohort_matrix(sales_df).to_dict()
+
+    assert result['cohorts'] == ['2024-01', '2024-02']
+    assert result['active_customers'] == [[1, 0, 1], [1, 0, None]]
+    assert result['revenue'][0] == [10.0, 0.0, 20.0]
+    assert result['retention_pct'][1] == [100.0, 0.0, None]
@@ -0,0 +1,74 @@
+"""
+Unit Tests for the Data Quality Profiler
+
+This module tests the streaming profiler shared by the /api/data-quality endpoint
+and data_analyzer.py, including chunked numeric summaries, dtype conformance,
+heavy-hitter top values and preprocessing issue counts.
+"""
+
+import pandas as pd
+import pytest
+from app.services.data_profiler import HeavyHitters, build_quality_report
+
+
+@pytest.fixture
+def source_files(tmp_path):
+    """Write small customer and sales CSV files for profiling."""
+    customer_path = tmp_path / 'customer_data.csv'
+    pd.DataFrame({
+        'customer_code': ['C1', 'C2', 'C3'],
+        'postcode': [4000, 0, 5000],
+    }).to_csv(customer_path, index=False)
+
+    sales_path = tmp_path / 'sales_data.csv'
+    pd.DataFrame({
+        'transaction_number': [1, 2, 3, 4, 5],
+        'date': ['2023-01-01', '2023-02-01', 'not a date', '2023-03-01', '2023-03-02'],
+        'branch': ['Branch1', 'Branch1', None, 'Branch2', 'Branch1'],
+        'customer_code': ['C1', 'C1', 'C2', 'C3', 'C9'],
+        'amount': [100.0, 200.0, 150.0, -50.0, 'unknown'],
+        'postcode': [4000, 4000, 0, 5000, 5000],
+    }).to_csv(sales_path, index=False)
+    return customer_path, sales_path
+
+
+def test_quality_report_counts_issues(source_files):
+    """Issue counts match what preprocessing would exclude or flag."""
+    customer_path, sales_path = source_files
+    report = build_quality_report(customer_path, sales_path, chunk_size=2)
+
+    sales = report['files']['sales_data.csv']
+    assert sales['rows'] == 5
+    assert sales['issues'] == {'invalid_postcodes': 1, 'negative_amounts': 1, 'unmatched_customer_codes': 1}
+    assert report['files']['customer_data.csv']['issues']['invalid_postcodes'] == 1
+
+
+def test_quality_report_column_profiles(source_files):
+    """Null counts, dtype conformance and chunk-merged numeric summaries are correct."""
+    customer_path, sales_path = source_files
+    report = build_quality_report(customer_path, sales_path, chunk_size=2)
+    columns = report['files']['sales_data.csv']['column_profiles']
+
+    assert columns['branch']['nulls'] == 1
+    assert columns['amount']['non_conforming'] == 1, "'unknown' is not a float"
+    assert columns['date']['non_conforming'] == 1, "'not a date' does not match the date format"
+
+    summary = columns['amount']['summary']
+    expected = pd.Series([100.0, 200.0, 150.0, -50.0])
+    assert summary['count'] == 4
+    assert summary['mean'] == pytest.approx(expected.mean())
+    assert summary['std'] == pytest.approx(expected.std(), rel=1e-4)
+    assert summary['min'] == -50.0 and summary['max'] == 200.0
+
+    assert columns['branch']['top_values'][0] == {'value': 'Branch1', 'count': 3}
+
+
+def test_heavy_hitters_keeps_frequent_values():
+    """The sketch keeps frequent values even when distinct values exceed its capacity."""
+    sketch = HeavyHitters(capacity=3)
+    for _ in range(10):
+        sketch.update(pd.Series(['a'] * 50 + ['b'] * 20 + [f'rare{i}' for i in range(10)]))
+
+    top = sketch.top(2)
+    assert [item['value'] for item in top] == ['a', 'b']
+    assert top[0]['count'] <= 500, "Counts are lower bounds"
@@ -52,3 +52,349 @@ def test_get_filters_endpoint():
     assert 'state' in data, "Response should include state filter"
     assert isinstance(data['customer_group'], list), "customer_group should be a list of options"
     assert 'All' in data['customer_group'], "customer_group should include 'All' option"
+
+def test_get_facets_endpoint(monkeypatch):
+    """Test the /api/facets endpoint to ensure it returns cross-filtered counts."""
+    import pandas as pd
+    from app.services.facet_service import build_facet_index
+
+    rfm_df = pd.DataFrame({
+        'customer_code': ['C1', 'C2', 'C3'],
+        'monetary': [100.0, 200.0, 300.0],
+        'customer_type': ['Tiler', 'Tiler', 'Builder'],
+        'salesperson': ['Q1', 'Q2', 'Q1'],
+        'segment': ['Champions', 'At Risk', 'Champions'],
+        'customer_ranking': ['A', 'B', 'A'],
+    })
+    monkeypatch.setattr("app.api.endpoints.get_facet_index", lambda: build_facet_index(rfm_df))
+
+    response = client.get("/api/facets", params={'segment': 'Champions'})
+
+    assert response.status_code == 200, "Endpoint should return a 200 status code"
+    data = response.json()
+    salesperson_counts = {item['value']: item['customer_count'] for item in data['salesperson']}
+    assert salesperson_counts == {'Q1': 2, 'Q2': 0}, "Salesperson counts should be filtered by segment"
+
+def test_rfm_results_sort_by_missing_column(monkeypatch):
+    """Test /api/rfm-results returns 400 when sorting by an optional column the results lack."""
+    import pandas as pd
+    rfm_df = pd.DataFrame({'customer_code': ['C1', 'C2'], 'monetary': [100.0, 200.0], 'segment': ['Champions', 'Other']})
+    monkeypatch.setattr("app.services.storage_service.STORAGE_BACKEND", 'csv')
+    monkeypatch.setattr("app.services.rfm_service.get_rfm_data", lambda: rfm_df)
+
+    response = client.get("/api/rfm-results", params={'sort': 'churn_probability'})
+    assert response.status_code == 400, "Sorting by an absent column should be a client error"
+    response = client.get("/api/rfm-results", params={'sort': 'monetary'})
+    assert response.status_code == 200
+    assert [item['customer_code'] for item in response.json()['items']] == ['C2', 'C1']
+
+def test_heavy_endpoint_rejected_when_busy(monkeypatch):
+    """Test that a saturated worker pool returns 503 while light endpoints keep responding."""
+    import threading
+    from app.services.worker_pool import WorkerPool
+
+    pool = WorkerPool(max_workers=1, max_queue=0)
+    release = threading.Event()
+    running = pool.submit(release.wait, 5)
+    monkeypatch.setattr("app.api.endpoints.worker_pool", pool)
+    try:
+        response = client.get("/api/filters")
+        assert response.status_code == 503, "A full pool should reject heavy requests"
+        assert response.headers.get("retry-after") == "5", "The rejection should carry a Retry-After hint"
+
+        assert client.get("/").status_code == 200, "Light endpoints should not wait for the pool"
+        assert client.get("/api/rfm-guide").status_code == 200, "Light endpoints should not wait for the pool"
+    finally:
+        release.set()
+        running.result(timeout=5)
+        pool.shutdown()
+
+def test_score_endpoint(monkeypatch):
+    """Test the /api/score endpoint with a columnar JSON batch."""
+    import pandas as pd
+    from app.services.scoring_service import build_scoring_model
+
+    rfm_df = pd.DataFrame({
+        'customer_code': [f'C{i}' for i in range(10)],
+        'recency': [-(i * 10 + 1) for i in range(10)],
+        'frequency': list(range(1, 11)),
+        'monetary': [100.0 * (i + 1) for i in range(10)],
+        'last_sale_date': ['31-12-23'] * 10,
+    })
+    model = build_scoring_model(rfm_df)
+    monkeypatch.setattr("app.api.endpoints.get_scoring_model", lambda: model)
+
+    response = client.post("/api/score", json={
+        'customer_code': ['X1', 'X2'],
+        'recency_days': [1, 500],
+        'frequency': [50, 1],
+        'monetary': [5000.0, 10.0],
+    })
+
+    assert response.status_code == 200, "Endpoint should return a 200 status code"
+    data = response.json()
+    assert data['customer_code'] == ['X1', 'X2']
+    assert data['segment'] == ['Champions', 'Hibernating']
+
+    response = client.post("/api/score", json={'frequency': [1]})
+    assert response.status_code == 400, "A batch without the RFM columns should be rejected"
+
+def test_rfm_data_arrow_response(monkeypatch):
+    """Test that /api/rfm-data returns an Arrow IPC stream with a fixed-size trend column."""
+    pa = pytest.importorskip("pyarrow")
+    import pandas as pd
+
+    rfm_df = pd.DataFrame({
+        'customer_code': ['C1', 'C2'],
+        'monetary': [300.0, None],
+        'segment': ['Champions', None],
+        'trend_values': [[1.0] * 12, [2.0] * 12],
+    })
+    monkeypatch.setattr("app.api.endpoints.get_rfm_data", lambda: rfm_df)
+
+    response = client.get("/api/rfm-data", headers={"Accept": "application/vnd.apache.arrow.stream"})
+
+    assert response.status_code == 200, "Endpoint should return a 200 status code"
+    assert response.headers['content-type'] == "application/vnd.apache.arrow.stream"
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert table.column_names == list(rfm_df.columns)
+    assert table.schema.field('trend_values').type == pa.list_(pa.float64(), 12)
+    assert table.column('trend_values').to_pylist()[1] == [2.0] * 12
+
+def test_top_endpoint(monkeypatch):
+    """Test the /api/top endpoints for top-N lists and customer percentile ranks."""
+    import pandas as pd
+    from app.services.ranking_service import build_ranking_index
+
+    rfm_df = pd.DataFrame({
+        'customer_code': ['C1', 'C2', 'C3', 'C4'],
+        'segment': ['Champions', 'Champions', 'At Risk', 'Champions'],
+        'monetary': [300.0, 500.0, 900.0, 100.0],
+    })
+    index = build_ranking_index(rfm_df)
+    monkeypatch.setattr("app.api.endpoints.get_ranking_index", lambda: index)
+
+    response = client.get("/api/top", params={'metric': 'monetary', 'n': 2, 'partition_by': 'segment', 'partition': 'Champions'})
+    assert response.status_code == 200, "Endpoint should return a 200 status code"
+    assert [item['customer_code'] for item in response.json()] == ['C2', 'C1']
+
+    response = client.get("/api/top/C1", params={'metric': 'monetary'})
+    assert response.json()['rank'] == 3
+
+    assert client.get("/api/top", params={'metric': 'bogus'}).status_code == 400
+    assert client.get("/api/top/NOBODY").status_code == 404
+
+def test_clv_endpoint(monkeypatch):
+    """Test the /api/clv endpoint returns parameters, segment totals and customer projections."""
+    from tests.test_clv_model import simulate_customers
+    from app.services.clv_model import CLVResult, fit_clv_model, project_clv, summarize_segments
+
+    customers = simulate_customers(n=500)
+    model = fit_clv_model(customers)
+    projection = project_clv(model, customers)
+    monkeypatch.setattr("app.api.endpoints.get_clv", lambda: CLVResult(model, projection, summarize_segments(projection)))
+
+    response = client.get("/api/clv", params={'segment': 'Champions'})
+
+    assert response.status_code == 200, "Endpoint should return a 200 status code"
+    data = response.json()
+    assert set(data['parameters']['bgnbd']) == {'r', 'alpha', 'a', 'b'}
+    assert {item['segment'] for item in data['segments']} == {'Champions', 'Hibernating'}
+    assert all(item['segment'] == 'Champions' for item in data['customers'])
+
+def test_segment_analysis_uses_only_cached_clv(monkeypatch):
+    """Test /api/segment-analysis adds CLV projections only when they are already fitted."""
+    import pandas as pd
+    from app.services.clv_model import CLVModel, CLVResult
+
+    rfm_df = pd.DataFrame({
+        'customer_code': ['C1', 'C2', 'C3'],
+        'segment': ['Champions', 'Champions', 'Hibernating'],
+        'monetary': [500.0, 300.0, 50.0],
+        'frequency': [5, 3, 1],
+        'recency_days': [5, 10, 300],
+    })
+    monkeypatch.setattr("app.api.endpoints.get_rfm_data", lambda: rfm_df)
+
+    def fail_get_clv():
+        raise AssertionError("segment analysis must not fit the CLV model")
+    monkeypatch.setattr("app.api.endpoints.get_clv", fail_get_clv)
+
+    monkeypatch.setattr("app.api.endpoints.get_cached_clv", lambda: None)
+    response = client.get("/api/segment-analysis")
+    assert response.status_code == 200, "Endpoint should return a 200 status code"
+    assert all('projected_value_12m' not in row for row in response.json())
+
+    segments = [{'segment': 'Champions', 'projected_value': 1234.5}]
+    monkeypatch.setattr("app.api.endpoints.get_cached_clv",
+                        lambda: CLVResult(CLVModel(), pd.DataFrame(), segments))
+    response = client.get("/api/segment-analysis")
+    assert response.status_code == 200
+    projected = {row['segment']: row['projected_value_12m'] for row in response.json()}
+    assert projected == {'Champions': 1234.5, 'Hibernating': 0.0}
+
+def test_cohorts_endpoint(monkeypatch):
+    """Test the /api/cohorts endpoint returns the cohort matrices."""
+    import pandas as pd
+    from app.services.cohort_service import build_cohort_matrix
+
+    sales_df = pd.DataFrame({
+        'customer_code': ['A', 'A', 'B'],
+        'date': pd.to_datetime(['2024-01-15', '2024-02-01', '2024-02-10']),
+        'amount': [10.0, 20.0, 5.0],
+    })
+    monkeypatch.setattr("app.api.endpoints.get_cohort_matrix", lambda: build_cohort_matrix(sales_df))
+
+    response = client.get("/api/cohorts")
+
+    assert response.status_code == 200, "Endpoint should return a 200 status code"
+    data = response.json()
+    assert data['cohorts'] == ['2024-01', '2024-02']
+    assert data['retention_pct'] == [[100.0, 100.0], [100.0, None]]
+
+def test_aggregates_endpoint(monkeypatch):
+    """Test the /api/aggregates endpoint applies the dashboard filters."""
+    import pandas as pd
+    from app.services.aggregate_service import build_aggregate_index
+
+    rfm_df = pd.DataFrame({
+        'customer_code': ['C1', 'C2', 'C3'],
+        'recency_score': [5, 5, 1],
+        'frequency_score': [5, 4, 1],
+        'monetary_score': [5, 4, 1],
+        'monetary': [500.0, 300.0, 20.0],
+        'segment': ['Champions', 'VIP Customers', 'Hibernating'],
+        'salesperson': ['Q1', 'Q1', 'Q2'],
+    })
+    index = build_aggregate_index(rfm_df)
+    monkeypatch.setattr("app.api.endpoints.get_aggregate_index", lambda: index)
+
+    response = client.get("/api/aggregates", params={'salesperson': 'Q1'})
+
+    assert response.status_code == 200, "Endpoint should return a 200 status code"
+    data = response.json()
+    assert data['customer_count'] == 2
+    assert data['grids']['rf']['counts'][4][4] == 1
+    assert [item['segment'] for item in data['segments']] == ['Champions', 'VIP Customers']
+
+def test_search_endpoint(monkeypatch):
+    """Test the /api/search endpoint returns ranked customer matches."""
+    import pandas as pd
+    from app.services.search_service import build_search_index
+
+    rfm_df = pd.DataFrame({
+        'customer_code': ['C1', 'C2', 'C3'],
+        'customer_name': ['Everton Tiling', 'Stafford Builders', 'Evergreen Homes'],
+        'suburb': ['Everton Park', 'Stafford', 'Nundah'],
+        'monetary': [100.0, 200.0, 300.0],
+    })
+    index = build_search_index(rfm_df)
+    monkeypatch.setattr("app.api.endpoints.get_search_index", lambda: index)
+
+    response = client.get("/api/search", params={'q': 'everton', 'limit': 5})
+
+    assert response.status_code == 200, "Endpoint should return a 200 status code"
+    data = response.json()
+    assert data['query'] == 'everton'
+    assert data['results'][0]['customer_code'] == 'C1'
+    assert 'C2' not in [result['customer_code'] for result in data['results']]
+    assert client.get("/api/search", params={'q': 'x', 'limit': 500}).status_code == 422
+
+def test_similar_customers_endpoint(monkeypatch):
+    """Test the /api/customers/{code}/similar endpoint returns the nearest customers."""
+    import pandas as pd
+    from app.services.similarity_service import build_similarity_index
+
+    rfm_df = pd.DataFrame({
+        'customer_code': ['C1', 'C2', 'C3', 'C4'],
+        'recency_days': [10, 12, 400, 380],
+        'frequency': [50, 45, 2, 3],
+        'monetary': [5000.0, 4800.0, 100.0, 150.0],
+    })
+    index = build_similarity_index(rfm_df)
+    monkeypatch.setattr("app.api.endpoints.get_similarity_index", lambda: index)
+
+    response = client.get("/api/customers/C3/similar", params={'k': 2})
+
+    assert response.status_code == 200, "Endpoint should return a 200 status code"
+    data = response.json()
+    assert [result['customer_code'] for result in data['results']] == ['C4', 'C2']
+    assert client.get("/api/customers/NOPE/similar").status_code == 404
+
+def test_clusters_endpoint(monkeypatch):
+    """Test the /api/clusters endpoint summarizes clusters against segments."""
+    import pandas as pd
+
+    rfm_df = pd.DataFrame({
+        'customer_code': ['C1', 'C2', 'C3'],
+        'recency_days': [10, 12, 400],
+        'frequency': [50, 40, 2],
+        'monetary': [5000.0, 4000.0, 100.0],
+        'segment': ['Champions', 'Loyal Customers', 'Hibernating'],
+        'cluster_id': [0, 0, 1],
+    })
+    monkeypatch.setattr("app.api.endpoints.get_rfm_data", lambda: rfm_df)
+
+    response = client.get("/api/clusters")
+
+    assert response.status_code == 200, "Endpoint should return a 200 status code"
+    data = response.json()
+    assert [cluster['customer_count'] for cluster in data] == [2, 1]
+    assert data[0]['segments'] == {'Champions': 1, 'Loyal Customers': 1}
+
+def test_geo_endpoint(monkeypatch):
+    """Test the /api/geo endpoint rolls customers up by location."""
+    import pandas as pd
+    from app.services.geo_service import build_geo_index
+
+    rfm_df = pd.DataFrame({
+        'customer_code': ['C1', 'C2', 'C3'],
+        'state': ['QLD', 'QLD', 'NSW'],
+        'postcode': ['4053', '4000', '2800'],
+        'suburb': ['Everton Park', 'Brisbane', 'Orange'],
+        'monetary': [100.0, 300.0, 50.0],
+        'segment': ['Champions', 'At Risk', 'Champions'],
+        'salesperson': ['Q1', 'Q2', 'Q1'],
+    })
+    index = build_geo_index(rfm_df)
+    monkeypatch.setattr("app.api.endpoints.get_geo_index", lambda: index)
+
+    response = client.get("/api/geo", params={'level': 'postcode', 'salesperson': 'Q1'})
+
+    assert response.status_code == 200, "Endpoint should return a 200 status code"
+    data = response.json()
+    assert [(group['state'], group['postcode']) for group in data['groups']] == [('QLD', '4053'), ('NSW', '2800')]
+    assert client.get("/api/geo", params={'level': 'country'}).status_code == 422
+
+def test_health_endpoints(monkeypatch):
+    """Test /healthz always answers and /readyz follows the cache."""
+    assert client.get("/healthz").json() == {"status": "ok"}
+    monkeypatch.setattr("app.main._api_included", False)
+    assert client.get("/readyz").json()['warm_up'] == {'state': 'loading'}, "Not ready until the API is loaded"
+    monkeypatch.setattr("app.main._api_included", True)
+
+    monkeypatch.setattr("app.services.warmup_service.readiness", lambda: {'ready': False, 'data_version': 'v1', 'warm_up': {}})
+    assert client.get("/readyz").status_code == 503
+
+    monkeypatch.setattr("app.services.warmup_service.readiness", lambda: {'ready': True, 'data_version': 'v1', 'warm_up': {}})
+    response = client.get("/readyz")
+    assert response.status_code == 200
+    assert response.json()['data_version'] == 'v1'
+
+def test_probes_answer_before_api_is_loaded():
+    """Test the app imports without pandas or the services, and loads the API on the first API request."""
+    import subprocess
+    import sys
+    script = (
+        "import sys\n"
+        "from fastapi.testclient import TestClient\n"
+        "from app.main import app\n"
+        "client = TestClient(app)\n"
+        "assert client.get('/healthz').status_code == 200\n"
+        "assert client.get('/readyz').status_code == 503\n"
+        "assert 'pandas' not in sys.modules and 'app.api.endpoints' not in sys.modules\n"
+        "assert client.get('/api/refresh-status').status_code == 200\n"
+        "assert 'app.api.endpoints' in sys.modules\n"
+    )
+    result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
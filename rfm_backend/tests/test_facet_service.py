@@ -0,0 +1,55 @@
+"""
+Unit Tests for Facet Index Service
+
+This module tests the facet index used by the dashboard filters, including
+distinct values, per-value counts and cross-filtered counts.
+"""
+
+import pandas as pd
+from app.services.facet_service import build_facet_index
+
+
+def create_rfm_frame():
+    """Create a small RFM result frame for facet testing."""
+    return pd.DataFrame({
+        'customer_code': ['C1', 'C2', 'C3', 'C4', 'C5'],
+        'monetary': [100.0, 200.0, 300.0, 400.0, 500.0],
+        'customer_type': ['Tiler', 'Tiler', 'Builder', 'Builder', None],
+        'salesperson': ['Q1', 'Q2', 'Q1', 'Q1', 'Q2'],
+        'segment': ['Champions', 'Champions', 'At Risk', 'Champions', 'At Risk'],
+        'customer_ranking': ['A', 'B', 'A', 'A', 'B'],
+    })
+
+
+def test_facet_values_and_counts():
+    """Distinct values are sorted and counts/revenue cover the whole dataset."""
+    index = build_facet_index(create_rfm_frame())
+
+    assert index.values['salesperson'] == ['Q1', 'Q2']
+    assert index.values['customer_type'] == ['Builder', 'Tiler'], "Missing values should not become a facet value"
+
+    counts = {item['value']: item for item in index.facet_counts('salesperson')}
+    assert counts['Q1']['customer_count'] == 3
+    assert counts['Q1']['revenue'] == 800.0
+    assert counts['Q2']['customer_count'] == 2
+
+
+def test_cross_filtered_counts():
+    """Counts for one facet are narrowed by the other selections but not by its own."""
+    index = build_facet_index(create_rfm_frame())
+
+    by_salesperson = {item['value']: item['customer_count']
+                      for item in index.facet_counts('salesperson', {'segment': 'Champions'})}
+    assert by_salesperson == {'Q1': 2, 'Q2': 1}
+
+    by_segment = {item['value']: item['customer_count']
+                  for item in index.facet_counts('segment', {'segment': 'Champions', 'salesperson': 'Q1'})}
+    assert by_segment == {'At Risk': 1, 'Champions': 2}, "A facet should ignore its own selection"
+
+
+def test_unknown_filter_value_matches_nothing():
+    """Selecting a value that does not exist yields zero counts."""
+    index = build_facet_index(create_rfm_frame())
+
+    counts = index.facet_counts('segment', {'salesperson': 'Nobody'})
+    assert all(item['customer_count'] == 0 for item in counts)
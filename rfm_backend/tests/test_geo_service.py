@@ -0,0 +1,82 @@
+"""
+Unit Tests for the Geographic Rollup Service
+
+This module checks the bincount rollups against pandas groupby reductions of the same data.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from app.services.geo_service import UNKNOWN_LOCATION, build_geo_index, clean_location
+
+
+@pytest.fixture
+def rfm_df():
+    """Random customers across a few states, postcodes and suburbs."""
+    rng = np.random.default_rng(50)
+    n = 400
+    postcodes = {'4053': ('QLD', 'Everton Park'), '4000': ('QLD', 'Brisbane'), '2800': ('NSW', 'Orange'),
+                 '3000': ('VIC', 'Melbourne')}
+    chosen = rng.choice(list(postcodes), n)
+    return pd.DataFrame({
+        'customer_code': [f'C{i:03d}' for i in range(n)],
+        'state': [postcodes[code][0] for code in chosen],
+        'postcode': chosen,
+        'suburb': [postcodes[code][1] for code in chosen],
+        'monetary': rng.gamma(2, 500, n).round(2),
+        'segment': rng.choice(['Champions', 'At Risk', 'Hibernating'], n),
+        'salesperson': rng.choice(['Q1', 'Q2'], n),
+    })
+
+
+def test_clean_location():
+    """States are upper-cased, suburbs title-cased and blanks become UNKNOWN."""
+    assert clean_location(pd.Series([' qld', None, '']), 'state').tolist() == ['QLD', UNKNOWN_LOCATION, UNKNOWN_LOCATION]
+    assert clean_location(pd.Series(['EVERTON PARK', 'Nan']), 'suburb').tolist() == ['Everton Park', UNKNOWN_LOCATION]
+
+
+def test_invalid_postcodes_roll_up_as_unknown(rfm_df):
+    """Postcodes flagged INVALID by preprocessing are grouped with the missing ones."""
+    assert clean_location(pd.Series(['4053', 'INVALID']), 'postcode').tolist() == ['4053', UNKNOWN_LOCATION]
+    rfm_df.loc[:9, 'postcode'] = 'INVALID'
+    groups = build_geo_index(rfm_df).rollup('postcode')['groups']
+    assert 'INVALID' not in {group['postcode'] for group in groups}
+    assert sum(group['customer_count'] for group in groups if group['postcode'] == UNKNOWN_LOCATION) == 10
+
+
+@pytest.mark.parametrize('level,keys', [('state', ['state']), ('postcode', ['state', 'postcode']),
+                                        ('suburb', ['state', 'postcode', 'suburb'])])
+def test_rollup_matches_groupby(rfm_df, level, keys):
+    """Counts, revenue and segment mix match a pandas groupby under the filters."""
+    result = build_geo_index(rfm_df).rollup(level, {'salesperson': 'Q1'})
+
+    subset = rfm_df[rfm_df['salesperson'] == 'Q1']
+    expected = subset.groupby(keys)['monetary'].agg(['size', 'sum']).sort_values('sum', ascending=False)
+    assert [tuple(group[key] for key in keys) for group in result['groups']] == \
+        [key if isinstance(key, tuple) else (key,) for key in expected.index]
+    assert [group['customer_count'] for group in result['groups']] == expected['size'].tolist()
+    np.testing.assert_allclose([group['revenue'] for group in result['groups']], expected['sum'], atol=0.01)
+
+    first = result['groups'][0]
+    mask = np.logical_and.reduce([subset[key] == first[key] for key in keys])
+    assert first['segments'] == subset[mask]['segment'].value_counts().to_dict()
+    assert result['customer_count'] == len(subset)
+
+
+def test_rollup_state_filter_and_limit(rfm_df):
+    """Rollups can be restricted to one state and truncated."""
+    index = build_geo_index(rfm_df)
+    result = index.rollup('suburb', state='qld', limit=1)
+    assert result['group_count'] == 2
+    assert len(result['groups']) == 1
+    assert result['groups'][0]['state'] == 'QLD'
+    assert index.rollup('state', state='WA')['groups'] == []
+
+
+def test_rollup_missing_levels():
+    """Levels below a missing column are not indexed."""
+    index = build_geo_index(pd.DataFrame({'state': ['QLD', None], 'monetary': [1.0, 2.0], 'segment': ['A', 'B']}))
+    assert index.levels == ['state']
+    assert [group['state'] for group in index.rollup('state')['groups']] == [UNKNOWN_LOCATION, 'QLD']
+    with pytest.raises(ValueError):
+        index.rollup('postcode')
@@ -0,0 +1,95 @@
+"""
+Unit Tests for Request Profiling
+
+This module tests stage timing, profiling of worker pool calls and the opt-in
+profiling middleware.
+"""
+
+import json
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api.endpoints import run_in_worker
+from app.api.profiling_middleware import ProfilingMiddleware, wants_profile
+from app.services.profiling import collecting, stage, timed_stage
+from app.services.worker_pool import WorkerPool
+
+
+@timed_stage
+def busy_stage(n):
+    """A pipeline stage with measurable work."""
+    return sum(i * i for i in range(n))
+
+
+def test_stages_only_recorded_with_collector():
+    """Stages are timed while a collector is bound and ignored otherwise."""
+    assert busy_stage(10) == 285
+
+    with collecting() as collector:
+        busy_stage(1000)
+        busy_stage(1000)
+        with stage("build:rfm"):
+            pass
+
+    assert collector.stages['busy_stage']['calls'] == 2
+    assert set(collector.stages) == {'busy_stage', 'build:rfm'}
+    busy_stage(10)
+    assert collector.stages['busy_stage']['calls'] == 2, "Calls after the block are not recorded"
+
+
+def test_worker_calls_are_profiled():
+    """Work submitted to the pool runs under the submitting request's collector."""
+    pool = WorkerPool(max_workers=1, max_queue=1)
+    try:
+        with collecting() as collector:
+            assert pool.submit(busy_stage, 20000).result() == sum(i * i for i in range(20000))
+        assert collector.stages['busy_stage']['calls'] == 1
+        functions = [hotspot['function'] for hotspot in collector.hotspots()]
+        assert any(function.startswith('busy_stage') for function in functions)
+    finally:
+        pool.shutdown()
+
+
+def test_profiling_middleware(tmp_path):
+    """Opted-in requests get a persisted report and Server-Timing; others are untouched."""
+    app = FastAPI()
+    app.add_middleware(ProfilingMiddleware, profile_dir=tmp_path, top_n=5, token="secret")
+
+    @app.get("/work")
+    async def work():
+        return {'total': await run_in_worker(busy_stage, 20000)}
+
+    client = TestClient(app)
+    response = client.get("/work")
+    assert 'X-Profile-Report' not in response.headers
+    response = client.get("/work", params={'profile': 1})
+    assert 'X-Profile-Report' not in response.headers, "The token is required"
+
+    response = client.get("/work", params={'profile': 1}, headers={'X-Profile-Token': 'secret'})
+    assert response.status_code == 200
+    assert response.json()['total'] == sum(i * i for i in range(20000))
+    assert 'busy_stage;dur=' in response.headers['Server-Timing']
+
+    report = json.loads((tmp_path / response.headers['X-Profile-Report']).read_text())
+    assert report['path'] == '/work'
+    assert report['stages']['busy_stage']['calls'] == 1
+    assert 0 < len(report['hotspots']) <= 5
+
+
+def test_profiling_requires_token_and_keeps_newest_reports(tmp_path):
+    """Without a token nothing is profiled; with one only the newest max_files reports are kept."""
+    from starlette.requests import Request
+    request = Request({'type': 'http', 'query_string': b'profile=1', 'headers': []})
+    assert not wants_profile(request, token=''), "An empty token must not allow any caller"
+
+    app = FastAPI()
+    app.add_middleware(ProfilingMiddleware, profile_dir=tmp_path, top_n=5, token="secret", max_files=2)
+
+    @app.get("/work")
+    async def work():
+        return {'total': busy_stage(10)}
+
+    client = TestClient(app)
+    names = [client.get("/work", params={'profile': 1}, headers={'X-Profile-Token': 'secret'}).headers['X-Profile-Report']
+             for _ in range(3)]
+    assert sorted(path.name for path in tmp_path.glob('*.json')) == names[1:], "The oldest report is deleted"
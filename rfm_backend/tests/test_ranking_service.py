@@ -0,0 +1,66 @@
+"""
+Unit Tests for the Ranking Index Service
+
+This module tests top-N and percentile-rank queries against a brute-force sort.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from app.services.ranking_service import build_ranking_index
+
+
+@pytest.fixture
+def rfm_df():
+    """A small RFM dataset with ties and a missing value."""
+    rng = np.random.default_rng(7)
+    n = 200
+    monetary = rng.integers(0, 50, n).astype(float) * 10
+    monetary[5] = np.nan
+    return pd.DataFrame({
+        'customer_code': [f'C{i:03d}' for i in range(n)],
+        'customer_name': [f'Customer {i}' for i in range(n)],
+        'segment': rng.choice(['Champions', 'At Risk', 'Hibernating'], n),
+        'salesperson': rng.choice(['Q1', 'Q2'], n),
+        'monetary': monetary,
+        'frequency': rng.integers(1, 30, n),
+    })
+
+
+def test_top_matches_sorting(rfm_df):
+    """Top-N overall and within a partition matches a stable sort of the dataset."""
+    index = build_ranking_index(rfm_df)
+
+    top = index.top('monetary', 10)
+    expected = rfm_df.dropna(subset=['monetary']).sort_values('monetary', ascending=False, kind='stable')
+    assert top['customer_code'].tolist() == expected['customer_code'].head(10).tolist()
+    assert top['rank'].tolist() == list(range(1, 11))
+
+    champions = index.top('frequency', 5, partition_by='segment', partition='Champions')
+    expected = rfm_df[rfm_df['segment'] == 'Champions'].sort_values('frequency', ascending=False, kind='stable')
+    assert champions['customer_code'].tolist() == expected['customer_code'].head(5).tolist()
+
+    bottom = index.top('monetary', 3, ascending=True, partition_by='salesperson', partition='Q2')
+    q2 = rfm_df[rfm_df['salesperson'] == 'Q2']['monetary'].dropna()
+    assert bottom['monetary'].tolist() == sorted(q2)[:3], "Missing values should never be ranked"
+
+
+def test_percentile_rank(rfm_df):
+    """Percentile is the share of customers at or below the customer's value."""
+    index = build_ranking_index(rfm_df)
+    row = rfm_df.iloc[42]
+
+    rank = index.percentile_rank('monetary', row['customer_code'])
+    values = rfm_df['monetary'].dropna()
+    assert rank['population'] == len(values)
+    assert rank['rank'] == int((values > row['monetary']).sum()) + 1
+    assert rank['percentile'] == round(100.0 * (values <= row['monetary']).mean(), 2)
+
+    within = index.percentile_rank('monetary', row['customer_code'], partition_by='segment')
+    assert within['partition'] == row['segment']
+    assert within['population'] == rfm_df[rfm_df['segment'] == row['segment']]['monetary'].notna().sum()
+
+    with pytest.raises(ValueError):
+        index.top('unknown_metric', 5)
+    with pytest.raises(KeyError):
+        index.percentile_rank('monetary', 'NOBODY')
@@ -0,0 +1,148 @@
+"""
+Unit Tests for the Refresh Scheduler
+
+This module tests change detection, debouncing, the completeness check and the
+status tracking of the background refresh.
+"""
+
+import os
+import pandas as pd
+import pytest
+from app.services import rfm_service
+from app.services.data_cache import get_cached, get_or_build, invalidate
+from app.services.refresh_scheduler import RefreshScheduler, is_file_complete
+
+
+@pytest.fixture
+def watched_files(tmp_path, monkeypatch):
+    """Point the service at temporary CSV files and stub out the RFM computation."""
+    customer_path = tmp_path / 'customer_data.csv'
+    sales_path = tmp_path / 'sales_data.csv'
+    pd.DataFrame({'customer_code': ['C1'], 'postcode': [4000]}).to_csv(customer_path, index=False)
+    pd.DataFrame({'customer_code': ['C1'], 'amount': [10.0]}).to_csv(sales_path, index=False)
+
+    calls = []
+    monkeypatch.setattr(rfm_service, "CUSTOMER_DATA_PATH", customer_path)
+    monkeypatch.setattr(rfm_service, "SALES_DATA_PATH", sales_path)
+    monkeypatch.setattr(rfm_service, "_published_version", None)
+    monkeypatch.setattr(rfm_service, "compute_rfm_data", lambda: calls.append(1) or pd.DataFrame())
+    invalidate()
+    yield sales_path, calls
+    invalidate()
+
+
+def rewrite(path, content):
+    """Rewrite a file and bump its modification time so the data version changes."""
+    with open(path, 'w') as f:
+        f.write(content)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_initial_refresh_publishes_version(watched_files):
+    """The first poll computes immediately and publishes the data version."""
+    _, calls = watched_files
+    scheduler = RefreshScheduler(debounce_seconds=10)
+
+    assert scheduler.poll(now=0.0) is True
+    assert len(calls) == 1
+    status = scheduler.get_status()
+    assert status['last_success_version'] == rfm_service.read_data_version()
+    assert rfm_service.get_data_version() == status['last_success_version']
+    assert scheduler.poll(now=1.0) is False, "An unchanged file should not trigger a refresh"
+
+
+def test_changes_are_debounced(watched_files):
+    """A change is only picked up once the file has been stable for the debounce interval."""
+    sales_path, calls = watched_files
+    scheduler = RefreshScheduler(debounce_seconds=10)
+    scheduler.poll(now=0.0)
+    old_version = rfm_service.get_data_version()
+
+    rewrite(sales_path, "customer_code,amount\nC1,10.0\nC1,20.0\n")
+    assert scheduler.poll(now=100.0) is False
+    assert scheduler.poll(now=105.0) is False
+    assert rfm_service.get_data_version() == old_version, "Requests keep the previous version until the refresh"
+    assert scheduler.poll(now=111.0) is True
+    assert len(calls) == 2
+
+
+def test_incomplete_file_is_not_loaded(watched_files):
+    """A file without a trailing newline is treated as still being written."""
+    sales_path, calls = watched_files
+    scheduler = RefreshScheduler(debounce_seconds=0)
+    scheduler.poll(now=0.0)
+
+    rewrite(sales_path, "customer_code,amount\nC1,10.0\nC1,2")
+    assert is_file_complete(sales_path) is False
+    scheduler.poll(now=1.0)
+    assert scheduler.poll(now=2.0) is False
+    assert len(calls) == 1
+
+
+def test_failed_refresh_is_recorded(watched_files, monkeypatch):
+    """A failing computation records the reason and keeps the previous version."""
+    sales_path, _ = watched_files
+    scheduler = RefreshScheduler(debounce_seconds=0)
+    scheduler.poll(now=0.0)
+    good_version = rfm_service.get_data_version()
+
+    def failing_compute():
+        raise ValueError("bad data")
+    monkeypatch.setattr(rfm_service, "compute_rfm_data", failing_compute)
+    rewrite(sales_path, "customer_code,amount\nC1,10.0\nC2,5.0\n")
+    scheduler.poll(now=1.0)
+    scheduler.poll(now=2.0)
+
+    status = scheduler.get_status()
+    assert status['last_failure_reason'] == "bad data"
+    assert status['last_success_version'] == good_version
+    assert rfm_service.get_data_version() == good_version
+
+
+def test_failed_refresh_is_retried_with_backoff(watched_files, monkeypatch):
+    """A version that failed to compute is retried after a doubling delay, without a file change."""
+    _, calls = watched_files
+    scheduler = RefreshScheduler(debounce_seconds=0, retry_seconds=10, max_retry_seconds=15)
+    compute = rfm_service.compute_rfm_data
+    monkeypatch.setattr(rfm_service, "compute_rfm_data", lambda: 1 / 0)
+
+    assert scheduler.poll(now=0.0) is True
+    assert scheduler.poll(now=9.0) is False, "The first retry waits retry_seconds"
+    assert scheduler.poll(now=10.0) is True
+    assert scheduler.get_status()['consecutive_failures'] == 2
+    assert scheduler.poll(now=24.0) is False, "The wait doubles, capped at max_retry_seconds"
+
+    monkeypatch.setattr(rfm_service, "compute_rfm_data", compute)
+    assert scheduler.poll(now=25.0) is True
+    assert scheduler.get_status()['consecutive_failures'] == 0
+    assert rfm_service.get_data_version() == scheduler.get_status()['last_success_version']
+    assert len(calls) == 1
+
+
+def test_building_a_new_version_keeps_the_published_one(watched_files):
+    """The cache keeps the served version while the next one is built, and builds see their own version."""
+    get_or_build("rfm", "v1", lambda: "old frame")
+    rfm_service.publish_data_version("v1")
+
+    seen = []
+    get_or_build("rfm", "v2", lambda: seen.append(rfm_service.get_data_version()) or "new frame")
+    assert seen == ["v2"], "Lookups inside a build resolve to the version being built"
+    assert get_cached("rfm", "v1") == "old frame"
+    assert rfm_service.get_rfm_data() == "old frame", "Requests keep the published version until it changes"
+    rfm_service.publish_data_version("v2")
+    assert rfm_service.get_rfm_data() == "new frame"
+
+
+def test_reads_wait_for_the_first_publish(watched_files, monkeypatch):
+    """Once publishing is required, versions are only served after the first publish."""
+    import threading
+    monkeypatch.setattr(rfm_service, "_publish_required", False)
+    monkeypatch.setattr(rfm_service, "_first_publish", threading.Event())
+    rfm_service.require_published_version()
+
+    with pytest.raises(rfm_service.DataNotReadyError):
+        rfm_service.get_data_version(wait=0)
+    scheduler = RefreshScheduler(debounce_seconds=0)
+    scheduler.poll(now=0.0)
+    assert rfm_service.get_data_version(wait=0) == rfm_service.read_data_version()
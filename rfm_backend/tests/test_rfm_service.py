@@ -17,7 +17,8 @@ def mock_customer_data(tmp_path):
     """Create mock customer data for testing."""
     data = {
         'customer_code': ['C1', 'C2', 'C3'],
-        'postcode': [4000, 0, 5000]
+        'postcode': [4000, 0, 5000],
+        'email': ['a@example.com', 'b@example.com', 'c@example.com']
     }
     df = pd.DataFrame(data)
     file_path = tmp_path / 'customer_data.csv'
@@ -101,3 +102,197 @@ def test_calculate_rfm_scores():
     assert rfm_data['recency_score'].between(1, 5).all(), "Recency scores should be between 1 and 5"
     assert rfm_data['frequency_score'].between(1, 5).all(), "Frequency scores should be between 1 and 5"
     assert rfm_data['monetary_score'].between(1, 5).all(), "Monetary scores should be between 1 and 5"
+
+def test_load_data_uses_schema(monkeypatch, mock_customer_data, mock_sales_data):
+    """Test that loading prunes unused columns and applies the documented dtypes."""
+    monkeypatch.setattr("app.services.rfm_service.CUSTOMER_DATA_PATH", str(mock_customer_data))
+    monkeypatch.setattr("app.services.rfm_service.SALES_DATA_PATH", str(mock_sales_data))
+    
+    customer_df, sales_df = load_data()
+    
+    assert 'email' not in customer_df.columns, "Unused customer columns should not be loaded"
+    assert sales_df['date'].dtype == 'datetime64[ns]', "Date column should be parsed on load"
+    assert sales_df['amount'].dtype == 'float64', "Amount column should use the declared dtype"
+    assert customer_df['customer_code'].dtype == object, "Customer codes should be loaded as strings"
+
+def test_load_data_accepts_alphanumeric_invoice_numbers(monkeypatch, mock_customer_data, tmp_path):
+    """Test that invoice numbers such as "INV-001" load as text and count as distinct invoices."""
+    from app.services import rfm_service
+    sales_path = tmp_path / 'alphanumeric_sales.csv'
+    pd.DataFrame({
+        'transaction_number': ['INV-001', 'INV-001', 'INV-002', '1003'],
+        'date': ['2023-01-01', '2023-01-01', '2023-02-01', '2023-01-15'],
+        'customer_code': ['C1', 'C1', 'C1', 'C2'],
+        'amount': [100.0, 40.0, 200.0, 150.0],
+        'cost': [50.0, 20.0, 100.0, 75.0],
+        'profit': [50.0, 20.0, 100.0, 75.0],
+        'branch': ['Branch1'] * 4,
+        'delivery_suburb': ['Suburb1'] * 4,
+        'postcode': [4000, 4000, 4000, 0],
+    }).to_csv(sales_path, index=False)
+    monkeypatch.setattr(rfm_service, "CUSTOMER_DATA_PATH", str(mock_customer_data))
+    monkeypatch.setattr(rfm_service, "SALES_DATA_PATH", str(sales_path))
+    monkeypatch.setattr(rfm_service, "FREQUENCY_MODE", 'invoices')
+    
+    customer_df, sales_df = load_data()
+    
+    assert sales_df['transaction_number'].tolist() == ['INV-001', 'INV-001', 'INV-002', '1003']
+    _, cleaned = preprocess_data(customer_df, sales_df)
+    metrics, _ = rfm_service.aggregate_customer_metrics(cleaned)
+    assert metrics['frequency'].tolist() == [2, 1]
+
+def create_large_sales_data(n_rows=100_000, n_customers=2_000):
+    """Create a synthetic sales frame with negative and unmatched rows for memory testing."""
+    import numpy as np
+    rng = np.random.default_rng(42)
+    customer_codes = np.array([f'C{i:05d}' for i in range(n_customers)], dtype=object)
+    # Draw codes from a slightly larger range so some sales have no matching customer
+    sales_codes = np.array([f'C{i:05d}' for i in rng.integers(0, int(n_customers * 1.05), n_rows)], dtype=object)
+    sales_df = pd.DataFrame({
+        'transaction_number': np.arange(n_rows),
+        'date': pd.Timestamp('2024-01-01') - pd.to_timedelta(rng.integers(0, 700, n_rows), unit='D'),
+        'branch': pd.Categorical(rng.choice(['Branch1', 'Branch2'], n_rows)),
+        'cost': rng.normal(50.0, 10.0, n_rows),
+        'customer_code': sales_codes,
+        'amount': rng.normal(100.0, 60.0, n_rows),
+        'profit': rng.normal(20.0, 5.0, n_rows),
+        'delivery_suburb': pd.Categorical(rng.choice(['Suburb1', 'Suburb2'], n_rows)),
+        'postcode': np.array([str(code) for code in rng.choice([0, 4000, 5000], n_rows)], dtype=object),
+    })
+    customer_df = pd.DataFrame({'customer_code': customer_codes, 'postcode': ['4000'] * n_customers})
+    return customer_df, sales_df
+
+def test_preprocess_data_peak_memory():
+    """Test that preprocessing stays well below three times the size of the sales data."""
+    import tracemalloc
+    customer_df, sales_df = create_large_sales_data()
+    sales_size = sales_df.memory_usage(deep=True).sum()
+    original_postcodes = sales_df['postcode'].copy()
+    
+    tracemalloc.start()
+    try:
+        _, sales_df_cleaned = preprocess_data(customer_df, sales_df)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    
+    assert peak < sales_size, f"Peak allocation {peak} should stay below the sales data size {sales_size}"
+    assert len(sales_df_cleaned) < len(sales_df), "Negative and unmatched rows should be excluded"
+    assert sales_df['postcode'].equals(original_postcodes), "Preprocessing should not modify the input frame"
+
+def test_partitioned_rfm_scores(monkeypatch, segmentation_data):
+    """Test that partitioned RFM scores each partition independently in one run."""
+    from app.services.rfm_service import compute_partitioned_rfm_data
+    customer_df, sales_df = segmentation_data
+    customer_df['state'] = ['QLD'] * 10 + ['NSW'] * 5
+    sales_df['branch'] = ['Brisbane' if i % 2 else 'Sydney' for i in range(len(sales_df))]
+    monkeypatch.setattr("app.services.rfm_service.load_data", lambda: (customer_df.copy(), sales_df.copy()))
+    
+    by_state = compute_partitioned_rfm_data('state', max_workers=2)
+    assert sorted(by_state['partition'].unique()) == ['NSW', 'QLD'], "Each state should be a partition"
+    assert len(by_state) == 15, "Customers belong to exactly one state partition"
+    nsw_only = calculate_rfm_scores(customer_df, sales_df[sales_df['customer_code'].isin(customer_df['customer_code'][10:])])
+    nsw = by_state[by_state['partition'] == 'NSW'].set_index('customer_code')
+    assert (nsw['monetary_score'] == nsw_only.set_index('customer_code').loc[nsw.index, 'monetary_score']).all(), \
+        "Monetary quintiles should be computed within the partition"
+    
+    by_branch = compute_partitioned_rfm_data('branch', max_workers=2)
+    assert set(by_branch['partition']) == {'Brisbane', 'Sydney'}
+    assert not by_branch.duplicated(['partition', 'customer_code']).any(), "One row per customer within a branch"
+    assert by_branch['monetary'].sum() == pytest.approx(sales_df['amount'].sum())
+
+def test_clusters_fitted_on_full_customer_base_only(monkeypatch, segmentation_data):
+    """Test that cluster ids come from one fit over all customers and are not refitted per partition."""
+    from app.services import cluster_model
+    from app.services.rfm_service import calculate_partitioned_rfm_scores
+    customer_df, sales_df = segmentation_data
+    customer_df['state'] = ['QLD'] * 8 + ['NSW'] * 7
+    monkeypatch.setattr(cluster_model, "CLUSTERING_ENABLED", True)
+    monkeypatch.setattr(cluster_model, "CLUSTER_K_RANGE", [2, 3])
+
+    assert 'cluster_id' in calculate_rfm_scores(customer_df, sales_df).columns
+    by_state = calculate_partitioned_rfm_scores(customer_df, sales_df, 'state', max_workers=1)
+    assert 'cluster_id' not in by_state.columns
+
+def test_profitability_metrics(segmentation_data):
+    """Test that profit metrics and profit scores come out of the same aggregation as R/F/M."""
+    customer_df, sales_df = segmentation_data
+    
+    rfm_data = calculate_rfm_scores(customer_df, sales_df).set_index('customer_code')
+    
+    expected_profit = sales_df.groupby('customer_code')['profit'].sum()
+    assert rfm_data['total_profit'].sort_index().tolist() == pytest.approx(expected_profit.sort_index().tolist())
+    assert rfm_data['margin_pct'].tolist() == pytest.approx([30.0] * 15), "Every test sale has a 30% margin"
+    assert rfm_data.loc['CUST001', 'avg_margin_per_transaction'] == pytest.approx(5000 * 0.3 / 25)
+    assert rfm_data['profit_score'].between(1, 5).all(), "Profit scores should be between 1 and 5"
+    assert rfm_data.loc['CUST010', 'profit_score'] == 5, "Highest total profit should score 5"
+
+def test_trend_features():
+    """Test the vectorized trend features over a customer x month spend matrix."""
+    import numpy as np
+    from app.services.rfm_service import trend_features
+    monthly_spend = np.array([
+        [0.0, 10.0, 20.0, 30.0, 40.0, 50.0],  # steady growth
+        [50.0, 0.0, 0.0, 0.0, 10.0, 20.0],    # long gap, then recovering
+        [0.0, 0.0, 0.0, 0.0, 0.0, 0.0],       # no spend in the window
+    ])
+    
+    features = trend_features(monthly_spend)
+    
+    expected_slopes = [np.polyfit(range(6), row, 1)[0] for row in monthly_spend]
+    assert features['trend_slope'].tolist() == pytest.approx(expected_slopes, abs=0.01)
+    assert features['trend_cv'][0] == pytest.approx(monthly_spend[0].std() / monthly_spend[0].mean(), abs=0.001)
+    assert features['trend_cv'][2] == 0.0, "No spend should give a zero coefficient of variation"
+    assert features['months_active'].tolist() == [5, 3, 0]
+    assert features['longest_gap_months'].tolist() == [1, 3, 6]
+    assert features['trend_mom_change'][:2].tolist() == pytest.approx([25.0, 100.0])
+    assert np.isnan(features['trend_mom_change'][2]), "No spend in the previous month leaves the change undefined"
+
+def test_calculate_rfm_scores_trends(segmentation_data):
+    """Test that trend sparklines come out of the customer x month matrix."""
+    customer_df, sales_df = segmentation_data
+    
+    rfm_data = calculate_rfm_scores(customer_df, sales_df).set_index('customer_code')
+    
+    trend_totals = rfm_data['trend_values'].map(sum)
+    recent = sales_df[sales_df['date'] >= sales_df['date'].max() - pd.DateOffset(months=12)]
+    expected = recent.groupby('customer_code')['amount'].sum().reindex(rfm_data.index, fill_value=0.0)
+    assert trend_totals.tolist() == pytest.approx(expected.tolist()), "Trend values should add up to recent spend"
+    assert {'trend_slope', 'trend_cv', 'months_active', 'longest_gap_months', 'trend_mom_change'} <= set(rfm_data.columns)
+
+def test_deduplication_and_invoice_frequency(monkeypatch):
+    """Test that exact duplicate rows are dropped and invoices mode counts distinct transactions."""
+    import numpy as np
+    from app.services import rfm_service
+    monkeypatch.setattr(rfm_service, "SALES_DEDUP_ENABLED", True)
+    customer_df = pd.DataFrame({'customer_code': ['C1', 'C2'], 'postcode': [4000, 4001]})
+    sales_df = pd.DataFrame({
+        'customer_code': ['C1', 'C1', 'C1', 'C1', 'C2'],
+        'date': pd.to_datetime(['2023-01-01', '2023-01-01', '2023-01-01', '2023-02-01', '2023-01-15']),
+        'transaction_number': [1, 1, 1, 2, 3],
+        'amount': [100.0, 100.0, 40.0, 200.0, 150.0],  # invoice 1 has two lines, the first repeated
+        'cost': [50.0, 50.0, 20.0, 100.0, 75.0],
+        'profit': [50.0, 50.0, 20.0, 100.0, 75.0],
+        'branch': ['B1'] * 5,
+        'delivery_suburb': ['S1'] * 5,
+        'postcode': [4000] * 5,
+    })
+    
+    assert rfm_service.find_duplicate_rows(sales_df).tolist() == [False, True, False, False, False]
+    # Rows that differ only in a column RFM does not use are kept apart by the source row key
+    keyed = rfm_service.key_source_rows(sales_df.assign(salesperson=['A', 'B', 'A', 'A', 'A']))
+    assert list(keyed.columns) == [column for column in rfm_service.SALES_COLUMNS if column in sales_df.columns] + ['row_hash']
+    assert not rfm_service.find_duplicate_rows(keyed).any()
+    assert 'row_hash' not in preprocess_data(customer_df, keyed)[1].columns
+    _, cleaned = preprocess_data(customer_df, sales_df)
+    assert len(cleaned) == 4, "The repeated line should be dropped at ingest"
+    
+    lines, _ = rfm_service.aggregate_customer_metrics(cleaned)
+    monkeypatch.setattr(rfm_service, "FREQUENCY_MODE", 'invoices')
+    invoices, _ = rfm_service.aggregate_customer_metrics(cleaned)
+    assert lines['frequency'].tolist() == [3, 1]
+    assert invoices['frequency'].tolist() == [2, 1], "A multi-line invoice should count once"
+    assert invoices['monetary'].tolist() == lines['monetary'].tolist() == [340.0, 150.0]
+    
+    counts = rfm_service.count_distinct(np.array([0, 0, 1, 1, -1]), pd.Series(['a', 'a', 'b', None, 'c']), 3)
+    assert counts.tolist() == [1, 1, 0], "Missing values and ignored rows are not counted"
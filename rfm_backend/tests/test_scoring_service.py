@@ -0,0 +1,55 @@
+"""
+Unit Tests for the Batch Scoring Service
+
+This module tests that external batches are scored against the cut-offs of the
+current RFM dataset exactly as the pipeline scores its own customers.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from app.services.rfm_service import calculate_rfm_scores
+from app.services.scoring_service import build_scoring_model, fit_score_bins, score_batch, score_records
+
+
+@pytest.fixture
+def scored_dataset(segmentation_data):
+    """Score the segmentation test data with the pipeline."""
+    customer_df, sales_df = segmentation_data
+    return calculate_rfm_scores(customer_df, sales_df), sales_df
+
+
+def test_batch_scores_match_pipeline(scored_dataset):
+    """Scoring the dataset's own metrics reproduces its scores and segments."""
+    rfm_data, _ = scored_dataset
+    model = build_scoring_model(rfm_data)
+
+    scored = score_batch(model, rfm_data[['customer_code', 'recency_days', 'frequency', 'monetary']])
+
+    for column in ['recency_score', 'frequency_score', 'monetary_score', 'rfm_score', 'segment']:
+        assert scored[column].tolist() == rfm_data[column].tolist(), f"{column} should match the pipeline"
+
+
+def test_transactions_are_summarized_before_scoring(scored_dataset):
+    """Raw transactions are aggregated per customer against the model's reference date."""
+    rfm_data, sales_df = scored_dataset
+    model = build_scoring_model(rfm_data)
+
+    scored = score_records(model, sales_df[['customer_code', 'date', 'amount']]).set_index('customer_code')
+    expected = rfm_data.set_index('customer_code').loc[scored.index]
+
+    assert scored['recency_days'].tolist() == expected['recency_days'].tolist()
+    assert scored['frequency'].tolist() == expected['frequency'].tolist()
+    assert scored['segment'].tolist() == expected['segment'].tolist()
+
+
+def test_fallback_bins_and_missing_values():
+    """Metrics with few distinct values use per-score maxima; missing inputs score 3."""
+    bins = fit_score_bins(pd.Series([1.0, 1.0, 2.0, 2.0, 2.0, 5.0]), 'Frequency')
+    scores = bins.score(np.array([0.0, 1.0, 1.5, 2.0, 9.0, np.nan]))
+    assert scores.tolist() == [1, 1, 2, 2, 3, 3]
+
+    with pytest.raises(ValueError):
+        score_batch(build_scoring_model(pd.DataFrame({
+            'recency': [-1], 'frequency': [1], 'monetary': [1.0], 'last_sale_date': ['01-01-24']})),
+            pd.DataFrame({'frequency': [1]}))
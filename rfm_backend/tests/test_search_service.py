@@ -0,0 +1,75 @@
+"""
+Unit Tests for the Customer Search Service
+
+This module checks prefix, exact and typo-tolerant matching and the ranking of matches.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from app.services.search_service import build_search_index, normalize_text, trigram_codes
+
+
+@pytest.fixture
+def index():
+    """A handful of customers with overlapping names and suburbs."""
+    rfm_df = pd.DataFrame({
+        'customer_code': ['2020TILE', 'POLI', 'UWE', 'ADH1', 'ADH2', 'CAFE'],
+        'customer_name': ['20/20 Tiling', 'Poli Developments', 'Uwe Berndt Tiling', 'Adheseal Stafford',
+                          'Adheseal Save Account', 'Café Crème'],
+        'suburb': ['Everton Park', 'Everton Park', 'Jimboomba', 'Stafford', None, 'Nundah'],
+        'monetary': [100.0, 900.0, 50.0, 10.0, 20.0, 5.0],
+        'segment': ['Champions'] * 6,
+    })
+    return build_search_index(rfm_df)
+
+
+def codes(results):
+    return [result['customer_code'] for result in results]
+
+
+def test_normalize_text():
+    """Accents, case and punctuation are normalized; missing values become empty."""
+    values = pd.Series(['Café  Crème', '20/20 Tiling', None, 'nan'])
+    assert normalize_text(values).tolist() == ['cafe creme', '20 20 tiling', '', '']
+
+
+def test_trigram_codes_pads_each_text():
+    """Each text yields one trigram per character, padded with spaces."""
+    rows, grams = trigram_codes(np.array(['ab', '', 'abc'], dtype=object))
+    assert rows.tolist() == [0, 0, 2, 2, 2]
+    assert len(np.unique(grams)) == 4
+
+
+def test_prefix_match_ranks_by_monetary(index):
+    """Word prefixes match, and equal scores are ordered by monetary value."""
+    assert codes(index.search('evert')) == ['POLI', '2020TILE']
+    assert set(codes(index.search('tiling'))) >= {'2020TILE', 'UWE'}
+
+
+def test_exact_code_ranks_first(index):
+    """An exact code match ranks above prefix matches."""
+    results = index.search('adh1')
+    assert codes(results)[0] == 'ADH1'
+    assert results[0]['score'] == pytest.approx(3.0)
+
+
+def test_typo_tolerance(index):
+    """Queries with typos match through shared trigrams."""
+    assert codes(index.search('Jimbomba')) == ['UWE']
+    assert codes(index.search('evertn park'))[:2] == ['POLI', '2020TILE']
+
+
+def test_accents_and_missing_values(index):
+    """Accented names match plain queries, and missing suburbs are returned as None."""
+    assert codes(index.search('creme')) == ['CAFE']
+    result = index.search('adheseal save')[0]
+    assert result['customer_code'] == 'ADH2'
+    assert result['suburb'] is None
+
+
+def test_limit_and_empty_query(index):
+    """The limit caps the results, and blank queries match nothing."""
+    assert len(index.search('a', limit=2)) == 2
+    assert index.search('  ') == []
+    assert index.search('qqqq') == []
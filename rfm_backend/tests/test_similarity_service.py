@@ -0,0 +1,71 @@
+"""
+Unit Tests for the Lookalike Customer Service
+
+This module checks the feature vectors and compares the blocked nearest-neighbour
+search with a direct distance computation.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from app.services import similarity_service
+from app.services.similarity_service import build_similarity_index, feature_matrix, trend_matrix
+
+
+@pytest.fixture
+def rfm_df():
+    """Random customers with 12-month trends, some shorter or missing."""
+    rng = np.random.default_rng(48)
+    n = 500
+    df = pd.DataFrame({
+        'customer_code': [f'C{i:03d}' for i in range(n)],
+        'recency_days': rng.integers(0, 700, n),
+        'frequency': rng.integers(1, 200, n),
+        'monetary': rng.gamma(2, 1000, n).round(2),
+        'segment': rng.choice(['Champions', 'At Risk'], n),
+    })
+    df['avg_transaction_spend'] = df['monetary'] / df['frequency']
+    df['trend_values'] = rng.gamma(1, 100, (n, 12)).round(2).tolist()
+    df.at[3, 'trend_values'] = [5.0, 6.0]
+    df.at[4, 'trend_values'] = None
+    return df
+
+
+def test_trend_matrix_aligns_latest_month():
+    """Trends are right-aligned, truncated to the trailing months and zero-filled."""
+    matrix = trend_matrix(pd.Series([[1.0, 2.0], [], None, [1.0, 2.0, 3.0, 4.0, 5.0]]), months=4)
+    assert matrix.tolist() == [[0, 0, 1, 2], [0, 0, 0, 0], [0, 0, 0, 0], [2, 3, 4, 5]]
+
+
+def test_feature_matrix_is_standardized(rfm_df):
+    """Scalar features have zero mean and unit variance; the trend block is down-weighted."""
+    features = feature_matrix(rfm_df)
+    assert features.dtype == np.float32
+    assert features.shape == (len(rfm_df), 4 + similarity_service.TREND_MONTHS)
+    np.testing.assert_allclose(features[:, :4].mean(axis=0), 0, atol=1e-5)
+    np.testing.assert_allclose(features[:, :4].std(axis=0), 1, atol=1e-4)
+    assert np.isfinite(features).all()
+
+
+def test_similar_matches_direct_distances(rfm_df, monkeypatch):
+    """The blocked search returns the same neighbours as a full distance computation."""
+    monkeypatch.setattr(similarity_service, 'BLOCK_SIZE', 64)
+    index = build_similarity_index(rfm_df)
+
+    results = index.similar('C010', k=5)
+
+    vectors = index.vectors.astype('float64')
+    distances = np.sqrt(((vectors - vectors[10]) ** 2).sum(axis=1))
+    distances[10] = np.inf
+    expected = np.argsort(distances, kind='stable')[:5]
+    assert [result['customer_code'] for result in results] == [f'C{i:03d}' for i in expected]
+    np.testing.assert_allclose([result['distance'] for result in results], distances[expected], atol=1e-3)
+    assert 'C010' not in [result['customer_code'] for result in results]
+
+
+def test_similar_unknown_customer_and_small_population(rfm_df):
+    """Unknown customers raise KeyError, and k larger than the population returns everyone else."""
+    index = build_similarity_index(rfm_df.head(3))
+    with pytest.raises(KeyError):
+        index.similar('MISSING')
+    assert len(index.similar('C000', k=10)) == 2
@@ -0,0 +1,172 @@
+"""
+Unit Tests for the Storage Service
+
+This module tests the embedded SQLite backend: chunked ingest, the SQL-pushed
+RFM aggregation and paginated queries over materialized results.
+"""
+
+import pandas as pd
+import pytest
+from app.services import rfm_service
+from app.services.storage_service import StorageEngine
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch, segmentation_data):
+    """Write the segmentation test data to CSV files and open a SQLite store over them."""
+    customer_df, sales_df = segmentation_data
+    # Add rows the pipeline must exclude: a refund and an unknown customer
+    sales_df = pd.concat([sales_df, pd.DataFrame([
+        {'transaction_number': 'TXN999998', 'customer_code': 'CUST001', 'date': pd.Timestamp('2023-12-30'),
+         'amount': -100.0, 'cost': -70.0, 'profit': -30.0},
+        {'transaction_number': 'TXN999999', 'customer_code': 'NOBODY', 'date': pd.Timestamp('2023-12-30'),
+         'amount': 100.0, 'cost': 70.0, 'profit': 30.0},
+    ])], ignore_index=True)
+
+    customer_path = tmp_path / 'customer_data.csv'
+    sales_path = tmp_path / 'sales_data.csv'
+    customer_df.to_csv(customer_path, index=False)
+    sales_df.assign(date=sales_df['date'].dt.strftime('%Y-%m-%d')).to_csv(sales_path, index=False)
+    monkeypatch.setattr(rfm_service, "CUSTOMER_DATA_PATH", customer_path)
+    monkeypatch.setattr(rfm_service, "SALES_DATA_PATH", sales_path)
+    return StorageEngine('sqlite', tmp_path / 'store.db')
+
+
+def test_ingest_is_skipped_for_same_version(engine):
+    """Ingest loads the files once per data version."""
+    assert engine.ingest('v1', chunk_size=50) is True
+    assert engine.ingest('v1') is False
+    assert len(engine.load_sales()) == 175
+
+
+def test_reingest_is_atomic_for_concurrent_readers(engine):
+    """Queries during a reload see the full old or new tables, and racing ingests load once."""
+    import threading
+    from contextlib import closing
+    engine.ingest('v1', chunk_size=10)
+    counts, errors, done = [], [], threading.Event()
+
+    def read():
+        while not done.is_set():
+            try:
+                with closing(engine.connect()) as conn:
+                    counts.append(conn.execute("SELECT COUNT(*) FROM sales").fetchone()[0])
+            except Exception as e:
+                errors.append(e)
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    try:
+        for version in ['v2', 'v3', 'v4']:
+            engine.ingest(version, chunk_size=10)
+    finally:
+        done.set()
+        reader.join()
+    assert not errors
+    assert counts and set(counts) == {175}
+
+    results = []
+    racers = [threading.Thread(target=lambda: results.append(engine.ingest('v5', chunk_size=10))) for _ in range(2)]
+    for racer in racers:
+        racer.start()
+    for racer in racers:
+        racer.join()
+    assert sorted(results) == [False, True], "The second ingest should find the version already loaded"
+
+
+def test_sql_aggregation_matches_pandas(engine):
+    """The SQL-pushed aggregation returns the same metrics as the pandas pipeline."""
+    engine.ingest('v1', chunk_size=50)
+    sql_metrics, sql_reference = engine.aggregate_customer_metrics()
+
+    customer_df, sales_df = rfm_service.preprocess_data(*rfm_service.load_data())
+    pandas_metrics, pandas_reference = rfm_service.aggregate_customer_metrics(sales_df)
+
+    assert sql_reference == pandas_reference
+    pd.testing.assert_frame_equal(
+        sql_metrics.reset_index(drop=True), pandas_metrics.reset_index(drop=True), check_dtype=False)
+
+
+def test_compute_and_query_results(engine):
+    """Scored results are materialized and can be filtered and paginated."""
+    rfm_data = engine.compute_rfm_data()
+    assert len(rfm_data) == 15
+
+    total, items = engine.query_results({'segment': 'Champions'}, limit=10, offset=0)
+    assert total == 1
+    assert items[0]['customer_code'] == 'CUST001'
+
+    total, page = engine.query_results({}, limit=5, offset=5, sort='monetary', descending=True)
+    assert total == 15
+    expected = rfm_data.sort_values(['monetary', 'customer_code'], ascending=[False, True])['customer_code'].tolist()[5:10]
+    assert [item['customer_code'] for item in page] == expected
+
+
+def test_sort_by_missing_column_is_rejected(engine, monkeypatch):
+    """Sorting by an optional column the results do not have is a ValueError, not a SQL error."""
+    from app.services import storage_service
+    rfm_data = engine.compute_rfm_data()
+    assert 'churn_probability' not in rfm_data.columns
+    with pytest.raises(ValueError, match="churn_probability"):
+        engine.query_results({}, limit=5, offset=0, sort='churn_probability')
+    # Clustering is disabled by default, so there is no cluster_id column either
+    assert 'cluster_id' not in rfm_data.columns
+    with pytest.raises(ValueError, match="cluster_id"):
+        engine.query_results({}, limit=5, offset=0, sort='cluster_id')
+
+    monkeypatch.setattr(storage_service, "STORAGE_BACKEND", 'csv')
+    monkeypatch.setattr(rfm_service, "get_rfm_data", lambda: rfm_data)
+    with pytest.raises(ValueError, match="churn_probability"):
+        storage_service.query_rfm_results({}, limit=5, offset=0, sort='churn_probability')
+    total, _ = storage_service.query_rfm_results({}, limit=5, offset=0, sort='frequency')
+    assert total == 15
+
+
+def test_ingest_drops_duplicates_and_counts_invoices(engine, monkeypatch):
+    """Repeated source rows are dropped at ingest and invoices mode counts distinct transactions in SQL."""
+    from app.services import storage_service
+    monkeypatch.setattr(rfm_service, "SALES_DEDUP_ENABLED", True)
+    monkeypatch.setattr(storage_service, "SALES_DEDUP_ENABLED", True)
+    sales_path = rfm_service.SALES_DATA_PATH
+    sales = pd.read_csv(sales_path)
+    sales['salesperson'] = 'SP1'
+    # Repeat two rows, and give two other rows the same transaction number
+    sales = pd.concat([sales, sales.iloc[[0, 1]]], ignore_index=True)
+    sales.loc[3, 'transaction_number'] = sales.loc[2, 'transaction_number']
+    # A row that differs only in a column the store does not keep is not a repeat
+    sales = pd.concat([sales, sales.iloc[[4]].assign(salesperson='SP2')], ignore_index=True)
+    sales.to_csv(sales_path, index=False)
+
+    engine.ingest('v2', chunk_size=50)
+    assert len(engine.load_sales()) == 176, "Exact repeats across chunks should be dropped"
+
+    monkeypatch.setattr(storage_service, "FREQUENCY_MODE", 'invoices')
+    monkeypatch.setattr(rfm_service, "FREQUENCY_MODE", 'invoices')
+    sql_metrics, _ = engine.aggregate_customer_metrics()
+    _, sales_df = rfm_service.preprocess_data(*rfm_service.load_data())
+    pandas_metrics, _ = rfm_service.aggregate_customer_metrics(sales_df)
+    assert len(sales_df) == 174
+    assert sql_metrics['frequency'].tolist() == pandas_metrics['frequency'].tolist()
+    assert sql_metrics['frequency'].sum() == 172, "Lines of one invoice should count once"
+
+
+def test_sqlite_backend_runs_full_pipelines(engine, tmp_path, monkeypatch):
+    """Partitioned scoring and churn training read the full sales schema back from the store."""
+    from app.services import churn_model, storage_service
+    monkeypatch.setattr(rfm_service, "STORAGE_BACKEND", 'sqlite')
+    monkeypatch.setattr(storage_service, "STORAGE_BACKEND", 'sqlite')
+    monkeypatch.setattr(storage_service, "STORAGE_PATH", engine.path)
+    customers = pd.read_csv(rfm_service.CUSTOMER_DATA_PATH)
+    customers['state'] = (['QLD', 'NSW'] * len(customers))[:len(customers)]
+    customers.to_csv(rfm_service.CUSTOMER_DATA_PATH, index=False)
+
+    customer_df, sales_df = rfm_service.load_data()
+    assert set(rfm_service.SALES_COLUMNS) <= set(sales_df.columns)
+
+    for partition_by in ['branch', 'state']:
+        partitioned = rfm_service.compute_partitioned_rfm_data(partition_by, max_workers=1)
+        assert partitioned['customer_code'].nunique() == 15
+
+    model_path = tmp_path / 'churn_model.json'
+    churn_model.main(['--horizon-days', '60', '--snapshots', '2', '--output', str(model_path)])
+    assert model_path.exists()
@@ -0,0 +1,71 @@
+"""
+Unit Tests for the Startup Warm-up
+
+This module checks that warm-up serves the batch artifacts for the current data
+version without recomputing, and that readiness follows the cache.
+"""
+
+import pandas as pd
+import pytest
+from app import cli
+from app.services import refresh_scheduler, rfm_service, warmup_service
+from app.services.data_cache import invalidate
+
+
+@pytest.fixture
+def current_files(source_files, monkeypatch):
+    """Point the service at the test CSVs with an empty cache."""
+    customer_path, sales_path = source_files
+    monkeypatch.setattr(rfm_service, "CUSTOMER_DATA_PATH", customer_path)
+    monkeypatch.setattr(rfm_service, "SALES_DATA_PATH", sales_path)
+    monkeypatch.setattr(rfm_service, "_published_version", None)
+    monkeypatch.setattr(refresh_scheduler, "_warmers", [])
+    monkeypatch.setattr(warmup_service, "status", dict(warmup_service.status))
+    monkeypatch.setattr(refresh_scheduler.scheduler, "status", dict(refresh_scheduler.scheduler.status))
+    invalidate()
+    yield customer_path, sales_path
+    invalidate()
+
+
+def test_warm_up_loads_snapshot(current_files, tmp_path, monkeypatch):
+    """A batch run for the current version is served without running the pipeline."""
+    customer_path, sales_path = current_files
+    cli.run(customer_path, sales_path, tmp_path / 'artifacts', 'csv')
+    assert warmup_service.readiness()['ready'] is False
+
+    def fail():
+        raise AssertionError("The pipeline should not run when a snapshot exists")
+    monkeypatch.setattr(rfm_service, "compute_rfm_data", fail)
+    warmup_service.warm_up(tmp_path / 'artifacts')
+
+    report = warmup_service.readiness()
+    assert report['ready'] is True
+    assert report['warm_up']['source'] == 'snapshot'
+    rfm_data = rfm_service.get_rfm_data()
+    assert isinstance(rfm_data['trend_values'].iloc[0], list)
+    assert rfm_data['customer_code'].map(type).eq(str).all()
+
+
+def test_warm_up_computes_without_snapshot(current_files, tmp_path):
+    """Without a batch run for the version, warm-up computes the frame."""
+    warmup_service.warm_up(tmp_path / 'no-artifacts')
+
+    report = warmup_service.readiness()
+    assert report['ready'] is True
+    assert report['warm_up']['source'] == 'computed'
+    assert isinstance(rfm_service.get_rfm_data(), pd.DataFrame)
+
+
+def test_snapshot_with_other_settings_is_not_served(current_files, tmp_path, monkeypatch):
+    """A batch run computed with different scoring settings is ignored for the same data version."""
+    customer_path, sales_path = current_files
+    monkeypatch.setattr(rfm_service, "SALES_DEDUP_ENABLED", True)
+    cli.run(customer_path, sales_path, tmp_path / 'artifacts', 'csv')
+    version = rfm_service.read_data_version()
+    assert warmup_service.load_snapshot(version, tmp_path / 'artifacts') is not None
+
+    monkeypatch.setattr(rfm_service, "SALES_DEDUP_ENABLED", False)
+    assert warmup_service.load_snapshot(version, tmp_path / 'artifacts') is None
+    monkeypatch.setattr(rfm_service, "SALES_DEDUP_ENABLED", True)
+    monkeypatch.setattr(rfm_service, "FREQUENCY_MODE", 'invoices')
+    assert warmup_service.load_snapshot(version, tmp_path / 'artifacts') is None
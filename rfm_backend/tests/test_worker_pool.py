@@ -0,0 +1,43 @@
+"""
+Unit Tests for the Worker Pool
+
+This module tests the queue-depth limit of the worker pool used to offload
+CPU-bound request work.
+"""
+
+import threading
+import pytest
+from app.services.worker_pool import WorkerPool, WorkerPoolFull
+
+
+def test_pool_rejects_beyond_queue_depth():
+    """Calls beyond the running plus queued limit are rejected without blocking."""
+    pool = WorkerPool(max_workers=1, max_queue=1)
+    release = threading.Event()
+    try:
+        running = pool.submit(release.wait, 5)
+        queued = pool.submit(lambda: 'queued')
+        assert pool.in_flight == 2
+
+        with pytest.raises(WorkerPoolFull):
+            pool.submit(lambda: 'rejected')
+
+        release.set()
+        assert running.result(timeout=5) is True
+        assert queued.result(timeout=5) == 'queued'
+    finally:
+        release.set()
+        pool.shutdown(wait=True)
+
+
+def test_slots_are_released_after_failures():
+    """A failing call frees its slot and surfaces its exception through the future."""
+    pool = WorkerPool(max_workers=1, max_queue=0)
+    try:
+        def failing():
+            raise ValueError("boom")
+        with pytest.raises(ValueError):
+            pool.submit(failing).result(timeout=5)
+        assert pool.submit(lambda: 42).result(timeout=5) == 42
+    finally:
+        pool.shutdown(wait=True)
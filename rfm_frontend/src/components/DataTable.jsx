@@ -106,13 +106,19 @@ function DataTable({ data }) {
     setSortConfig({ key, direction })
   }
 
+  // Columns rendered from several fields sort by a single numeric field
+  const sortFields = {
+    trend: 'trend_slope'
+  }
+
   // Enhanced sorting function with proper type handling
   const sortedData = () => {
     if (!sortConfig.key) return data
 
+    const sortField = sortFields[sortConfig.key] || sortConfig.key
     return [...data].sort((a, b) => {
-      let aValue = a[sortConfig.key]
-      let bValue = b[sortConfig.key]
+      let aValue = a[sortField]
+      let bValue = b[sortField]
       
       // Handle null/undefined values
       if (aValue == null && bValue == null) return 0